@@ -2,6 +2,10 @@
 Marketplace ElasticSearch Indexer.
 
 Currently creates the indexes and re-indexes apps and feed elements.
+
+With `--incremental`, only reindexes the objects that changed since the last
+run into the current indexes. With `--resume`, finishes a reindexation that
+failed, skipping the chunks that were already indexed.
 """
 import itertools
 import logging
@@ -15,10 +19,12 @@ from celery import chain, chord, task
 
 from django.conf import settings
 from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
 
 import mkt.feed.indexers as f_indexers
 from lib.es.models import Reindexing
 from mkt.extensions.indexers import ExtensionIndexer
+from mkt.search.utils import update_search_generation
 from mkt.site.utils import chunked, timestamp_index
 from mkt.webapps.indexers import HomescreenIndexer, WebappIndexer
 from mkt.websites.indexers import WebsiteIndexer
@@ -135,6 +141,12 @@ def post_index(new_index, old_index, alias, index_name, settings):
             {'remove': {'index': old_index, 'alias': alias}}
         )
     ES.indices.update_aliases(body=dict(actions=actions))
+    update_search_generation()
+
+    # Everything that changed after the reindexation started was indexed in
+    # both indexes, incremental reindexations can start from there.
+    for reindexing in Reindexing.objects.filter(alias=alias):
+        Reindexing.set_high_water_mark(alias, reindexing.start_date)
 
     _print('Unflagging the database.', alias)
     Reindexing.unflag_reindexing(alias=alias)
@@ -164,14 +176,55 @@ def run_indexing(index, index_name, ids):
     """
     indexer = INDEXER_MAP[index_name]
     indexer.run_indexing(ids, ES, index=index)
+    # Mark the chunk as done, in case the reindexation has to be resumed.
+    Reindexing.add_chunk(index, ids)
 
 
-def chunk_indexing(indexer, chunk_size):
-    """Chunk the items to index."""
-    chunks = list(indexer.get_indexable().values_list('id', flat=True))
+def chunk_indexing(indexer, chunk_size, reindexing=None):
+    """
+    Chunk the items to index, skipping the ones that were already indexed
+    if resuming `reindexing`.
+    """
+    chunks = list(indexer.get_indexable().order_by('id')
+                                         .values_list('id', flat=True))
+    if reindexing:
+        indexed = reindexing.get_indexed(chunks)
+        chunks = [id_ for id_ in chunks if id_ not in indexed]
     return chunked(chunks, chunk_size), len(chunks)
 
 
+def incremental_indexing(indexer, alias):
+    """
+    Index the items that changed since the last time, into the current
+    indexes of the alias.
+    """
+    since = Reindexing.get_high_water_mark(alias)
+    if since is None:
+        raise CommandError('No reindexation of {alias} recorded, an '
+                           'incremental reindexation needs a full one first.'
+                           .format(alias=alias))
+    # Things that change while this runs will be picked up the next time.
+    now = timezone.now()
+    ids = sorted(indexer.get_modified_ids(since))
+    _print('Indexing {total} items changed since {since}'.format(
+        total=len(ids), since=since), alias)
+    for chunk in chunked(ids, indexer.chunk_size):
+        for index in Reindexing.get_indices(alias):
+            indexer.run_indexing(chunk, ES, index=index)
+    Reindexing.set_high_water_mark(alias, now)
+
+
+def get_index_settings(old_index):
+    """Returns the current settings of an index, if it exists."""
+    if old_index:
+        try:
+            return (ES.indices.get_settings(index=old_index).get(
+                old_index, {}).get('settings', {}))
+        except elasticsearch.NotFoundError:
+            pass
+    return {}
+
+
 class Command(BaseCommand):
     help = 'Reindex all ES indexes'
     option_list = BaseCommand.option_list + (
@@ -185,6 +238,14 @@ class Command(BaseCommand):
                     help=('Bypass the database flag that says '
                           'another indexation is ongoing'),
                     default=False),
+        make_option('--incremental', action='store_true',
+                    help=('Only reindex what changed since the last '
+                          'reindexation, in the current indexes'),
+                    default=False),
+        make_option('--resume', action='store_true',
+                    help=('Resume the ongoing reindexation, skipping the '
+                          'chunks that were indexed already'),
+                    default=False),
     )
 
     def handle(self, *args, **kwargs):
@@ -196,6 +257,8 @@ class Command(BaseCommand):
         index_choice = kwargs.get('index', None)
         prefix = kwargs.get('prefix', '')
         force = kwargs.get('force', False)
+        incremental = kwargs.get('incremental', False)
+        resume = kwargs.get('resume', False)
 
         if index_choice:
             # If we only want to reindex a subset of indexes.
@@ -207,7 +270,16 @@ class Command(BaseCommand):
         else:
             INDEXES = INDEXERS
 
-        if Reindexing.is_reindexing() and not force:
+        if incremental:
+            # Incremental reindexations are done right away, in the current
+            # indexes.
+            for INDEXER in INDEXES:
+                incremental_indexing(
+                    INDEXER, ES_INDEXES[INDEXER.get_mapping_type_name()])
+            _print('Incremental reindexation done.\n')
+            return
+
+        if Reindexing.is_reindexing() and not (force or resume):
             raise CommandError('Indexation already occuring - use --force to '
                                'bypass')
         elif force:
@@ -218,7 +290,15 @@ class Command(BaseCommand):
             chunk_size = INDEXER.chunk_size
             alias = ES_INDEXES[index_name]
 
-            chunks, total = chunk_indexing(INDEXER, chunk_size)
+            reindexing = None
+            if resume:
+                try:
+                    reindexing = Reindexing.objects.get(alias=alias)
+                except Reindexing.DoesNotExist:
+                    raise CommandError('No reindexation of {alias} to resume.'
+                                       .format(alias=alias))
+
+            chunks, total = chunk_indexing(INDEXER, chunk_size, reindexing)
             if not total:
                 _print('No items to queue.', alias)
             else:
@@ -227,25 +307,23 @@ class Command(BaseCommand):
                        .format(total=total, n=total_chunks, size=chunk_size),
                        alias)
 
-            # Get the old index if it exists.
-            try:
-                aliases = ES.indices.get_alias(name=alias).keys()
-            except elasticsearch.NotFoundError:
-                aliases = []
-            old_index = aliases[0] if aliases else None
+            if reindexing:
+                # Keep indexing into the new index of the reindexation.
+                old_index = reindexing.old_index
+                new_index = reindexing.new_index
+            else:
+                # Get the old index if it exists.
+                try:
+                    aliases = ES.indices.get_alias(name=alias).keys()
+                except elasticsearch.NotFoundError:
+                    aliases = []
+                old_index = aliases[0] if aliases else None
 
-            # Create a new index, using the index name with a timestamp.
-            new_index = timestamp_index(prefix + alias)
+                # Create a new index, using the index name with a timestamp.
+                new_index = timestamp_index(prefix + alias)
 
             # See how the index is currently configured.
-            if old_index:
-                try:
-                    s = (ES.indices.get_settings(index=old_index).get(
-                        old_index, {}).get('settings', {}))
-                except elasticsearch.NotFoundError:
-                    s = {}
-            else:
-                s = {}
+            s = get_index_settings(old_index)
             num_replicas = s.get('number_of_replicas',
                                  settings.ES_DEFAULT_NUM_REPLICAS)
             num_shards = s.get('number_of_shards',
@@ -263,7 +341,10 @@ class Command(BaseCommand):
                                        'refresh_interval': '5s'})
 
             # Ship it.
-            if not total:
+            if reindexing and not total:
+                # Everything was indexed already, only finish the job.
+                post_task.apply_async()
+            elif not total:
                 # If there's no data we still create the index and alias.
                 chain(pre_task, post_task).apply_async()
             else:
@@ -273,9 +354,13 @@ class Command(BaseCommand):
                 if settings.CELERY_ALWAYS_EAGER:
                     # Eager mode and chords don't get along. So we serialize
                     # the tasks as a workaround.
-                    index_tasks.insert(0, pre_task)
+                    if not reindexing:
+                        index_tasks.insert(0, pre_task)
                     index_tasks.append(post_task)
                     chain(*index_tasks).apply_async()
+                elif reindexing:
+                    # The new index already exists.
+                    chord(header=index_tasks, body=post_task).apply_async()
                 else:
                     chain(pre_task, chord(header=index_tasks,
                                           body=post_task)).apply_async()
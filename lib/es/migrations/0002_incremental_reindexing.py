@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('es', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HighWaterMark',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('alias', models.CharField(unique=True, max_length=255)),
+                ('date', models.DateTimeField()),
+            ],
+            options={
+                'db_table': 'zadmin_reindexing_high_water_mark',
+            },
+            bases=(models.Model,),
+        ),
+        migrations.CreateModel(
+            name='ReindexingChunk',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('first_id', models.PositiveIntegerField()),
+                ('last_id', models.PositiveIntegerField()),
+                ('reindexing', models.ForeignKey(related_name='chunks', to='es.Reindexing')),
+            ],
+            options={
+                'db_table': 'zadmin_reindexing_chunk',
+            },
+            bases=(models.Model,),
+        ),
+    ]
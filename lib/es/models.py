@@ -1,3 +1,5 @@
+import bisect
+
 from django.db import models
 from django.utils import timezone
 
@@ -47,3 +49,62 @@ class Reindexing(models.Model):
                     if idx is not None]
         except Reindexing.DoesNotExist:
             return [alias]
+
+    @classmethod
+    def add_chunk(cls, index, ids):
+        """
+        Mark down that the objects `ids`, a chunk of the sorted ids being
+        reindexed, have been indexed into the new index `index`.
+        """
+        for reindexing in cls.objects.filter(new_index=index):
+            reindexing.chunks.create(first_id=min(ids), last_id=max(ids))
+
+    def get_indexed(self, ids):
+        """Return the ids of `ids` that are already in the new index."""
+        ranges = sorted(self.chunks.values_list('first_id', 'last_id'))
+        firsts = [first for first, last in ranges]
+        indexed = set()
+        for id_ in ids:
+            # The last chunk starting before this id is the only one that
+            # can hold it, chunks don't overlap.
+            position = bisect.bisect_right(firsts, id_) - 1
+            if position >= 0 and id_ <= ranges[position][1]:
+                indexed.add(id_)
+        return indexed
+
+    @classmethod
+    def get_high_water_mark(cls, alias):
+        """
+        Return the date from which the objects of an alias have to be
+        reindexed, or None if it hasn't been fully indexed yet.
+        """
+        try:
+            return HighWaterMark.objects.get(alias=alias).date
+        except HighWaterMark.DoesNotExist:
+            return None
+
+    @classmethod
+    def set_high_water_mark(cls, alias, date):
+        """Mark down that the objects of an alias are indexed up to `date`."""
+        HighWaterMark.objects.update_or_create(alias=alias,
+                                               defaults={'date': date})
+
+
+class ReindexingChunk(models.Model):
+    """A chunk of the objects of a reindexing that is done, used to resume
+    reindexings that failed."""
+    reindexing = models.ForeignKey(Reindexing, related_name='chunks')
+    first_id = models.PositiveIntegerField()
+    last_id = models.PositiveIntegerField()
+
+    class Meta:
+        db_table = 'zadmin_reindexing_chunk'
+
+
+class HighWaterMark(models.Model):
+    """The date up to which the objects of an alias have been indexed."""
+    alias = models.CharField(max_length=255, unique=True)
+    date = models.DateTimeField()
+
+    class Meta:
+        db_table = 'zadmin_reindexing_high_water_mark'
@@ -1,7 +1,9 @@
+from datetime import datetime, timedelta
+
 from nose.tools import eq_
 
 import mkt.site.tests
-from lib.es.models import Reindexing
+from lib.es.models import Reindexing, ReindexingChunk
 
 
 class TestReindexing(mkt.site.tests.TestCase):
@@ -61,3 +63,26 @@ class TestReindexing(mkt.site.tests.TestCase):
 
         # Doesn't clash on other aliases.
         self.assertSetEqual(Reindexing.get_indices('other'), ['other'])
+
+    def test_chunks(self):
+        Reindexing.objects.create(alias='foo', new_index='bar',
+                                  old_index='baz')
+        Reindexing.add_chunk('bar', [1, 2, 3])
+        Reindexing.add_chunk('bar', [7, 8])
+        # Chunks of other indexes are ignored.
+        Reindexing.add_chunk('other', [4, 5])
+        reindexing = Reindexing.objects.get(alias='foo')
+        eq_(reindexing.get_indexed(range(10)), set([1, 2, 3, 7, 8]))
+
+        # The chunks go away with the reindexing.
+        Reindexing.unflag_reindexing(alias='foo')
+        eq_(ReindexingChunk.objects.count(), 0)
+
+    def test_high_water_mark(self):
+        eq_(Reindexing.get_high_water_mark('foo'), None)
+        date = datetime(2016, 1, 1)
+        Reindexing.set_high_water_mark('foo', date)
+        eq_(Reindexing.get_high_water_mark('foo'), date)
+        Reindexing.set_high_water_mark('foo', date + timedelta(hours=1))
+        eq_(Reindexing.get_high_water_mark('foo'), date + timedelta(hours=1))
+        eq_(Reindexing.get_high_water_mark('other'), None)
@@ -1,4 +1,11 @@
+import csv
 import logging
+import os
+import socket
+import struct
+import time
+from array import array
+from bisect import bisect_right
 
 import requests
 from django_statsd.clients import statsd
@@ -25,14 +32,95 @@ def is_public(ip):
     return True
 
 
+def ip_to_int(value):
+    """Converts a dotted IPv4 address, or an integer string, to an int."""
+    if value.isdigit():
+        return int(value)
+    return struct.unpack('!L', socket.inet_aton(value))[0]
+
+
+class IPRangeTable(object):
+    """
+    Country IP ranges loaded from the CSV file at `path`, sorted and stored in
+    arrays searched with bisect.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.mtime = os.path.getmtime(path)
+        ranges = []
+        with open(path) as f:
+            for row in csv.reader(f):
+                # The legacy GeoIP format is start IP, end IP, start number,
+                # end number, country code, country name.
+                fields = row[2:5] if len(row) >= 5 else row[:3]
+                try:
+                    start, end, code = fields
+                    ranges.append((ip_to_int(start), ip_to_int(end),
+                                   code.lower()))
+                except (ValueError, socket.error):
+                    # Headers, comments and blank lines.
+                    continue
+        ranges.sort()
+        self.codes = sorted(set(code for start, end, code in ranges))
+        code_ids = dict((code, i) for i, code in enumerate(self.codes))
+        self.starts = array('L', (start for start, end, code in ranges))
+        self.ends = array('L', (end for start, end, code in ranges))
+        self.code_ids = array('H', (code_ids[code]
+                                    for start, end, code in ranges))
+
+    def __len__(self):
+        return len(self.starts)
+
+    def lookup(self, address):
+        """Returns the country code of `address`, or None."""
+        try:
+            ip = ip_to_int(address)
+        except (ValueError, socket.error):
+            return None
+        i = bisect_right(self.starts, ip) - 1
+        if i >= 0 and ip <= self.ends[i]:
+            return self.codes[self.code_ids[i]]
+        return None
+
+
 class GeoIP:
-    """Call to geodude server to resolve an IP to Geo Info block."""
+    """
+    Resolve an IP to a country code from the local IP range table, or with a
+    call to geodude server.
+    """
 
     def __init__(self, settings):
         self.timeout = float(getattr(settings, 'GEOIP_DEFAULT_TIMEOUT', .2))
         self.url = getattr(settings, 'GEOIP_URL', '')
         self.default_val = getattr(settings, 'GEOIP_DEFAULT_VAL',
                                    regions.RESTOFWORLD.slug).lower()
+        self.db_path = getattr(settings, 'GEOIP_DB_PATH', '')
+        self.db_check_interval = getattr(settings, 'GEOIP_DB_CHECK_INTERVAL',
+                                         60)
+        self._table, self._checked = None, 0
+
+    def get_table(self):
+        """
+        Returns the IP range table, loading it again when the file changed.
+        The file is checked at most every `db_check_interval` seconds, and the
+        table previously loaded is kept if it can't be read.
+        """
+        now = time.time()
+        if now - self._checked < self.db_check_interval:
+            return self._table
+        self._checked = now
+        try:
+            mtime = os.path.getmtime(self.db_path)
+            if self._table is None or mtime != self._table.mtime:
+                with statsd.timer('z.geoip.load'):
+                    self._table = IPRangeTable(self.db_path)
+                log.info('Loaded {0} IP ranges from {1}'
+                         .format(len(self._table), self.db_path))
+        except (IOError, OSError) as e:
+            statsd.incr('z.geoip.load_error')
+            log.error('Error loading IP ranges: {0}'.format(str(e)))
+        return self._table
 
     def lookup(self, address):
         """Resolve an IP address to a block of geo information.
@@ -40,8 +128,18 @@ class GeoIP:
         If a given address is unresolvable or the geoip server is not defined,
         return the default as defined by the settings, or "restofworld".
 
+        When the IP range table is defined, the geoip server is only called
+        for the addresses it doesn't contain.
+
         """
         public_ip = is_public(address)
+        if self.db_path and public_ip:
+            table = self.get_table()
+            country_code = table.lookup(address) if table else None
+            if country_code:
+                statsd.incr('z.geoip.local.success')
+                return country_code
+            statsd.incr('z.geoip.local.miss')
         if self.url and public_ip:
             with statsd.timer('z.geoip'):
                 res = None
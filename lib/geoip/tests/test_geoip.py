@@ -1,3 +1,5 @@
+import os
+import tempfile
 from random import randint
 
 import mock
@@ -9,9 +11,11 @@ import mkt.site.tests
 from lib.geoip import GeoIP
 
 
-def generate_settings(url='', default='restofworld', timeout=0.2):
+def generate_settings(url='', default='restofworld', timeout=0.2,
+                      db_path=''):
     return mock.Mock(GEOIP_URL=url, GEOIP_DEFAULT_VAL=default,
-                     GEOIP_DEFAULT_TIMEOUT=timeout)
+                     GEOIP_DEFAULT_TIMEOUT=timeout, GEOIP_DB_PATH=db_path,
+                     GEOIP_DB_CHECK_INTERVAL=0)
 
 
 class GeoIPTest(mkt.site.tests.TestCase):
@@ -86,3 +90,76 @@ class GeoIPTest(mkt.site.tests.TestCase):
             result = geoip.lookup(ip)
             assert not mock_post.called
             eq_(result, 'restofworld')
+
+
+class GeoIPTableTest(mkt.site.tests.TestCase):
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix='.csv')
+        os.close(fd)
+        self.write('"1.0.0.0","1.0.0.255","16777216","16777471","AU",'
+                   '"Australia"\n'
+                   '"2.0.0.0","2.255.255.255","33554432","50331647","FR",'
+                   '"France"\n')
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def write(self, data, mtime=None):
+        with open(self.path, 'w') as f:
+            f.write(data)
+        if mtime:
+            os.utime(self.path, (mtime, mtime))
+
+    @mock.patch('requests.post')
+    def test_lookup(self, mock_post):
+        geoip = GeoIP(generate_settings(url='localhost', db_path=self.path))
+        eq_(geoip.lookup('1.0.0.1'), 'au')
+        eq_(geoip.lookup('2.2.2.2'), 'fr')
+        assert not mock_post.called
+
+    @mock.patch('requests.post')
+    def test_short_format(self, mock_post):
+        self.write('start,end,country\n2.0.0.0,2.0.0.255,BR\n')
+        geoip = GeoIP(generate_settings(db_path=self.path))
+        eq_(geoip.lookup('2.0.0.2'), 'br')
+        eq_(geoip.lookup('2.0.1.2'), 'restofworld')
+
+    @mock.patch('requests.post')
+    def test_missing(self, mock_post):
+        geoip = GeoIP(generate_settings(db_path=self.path))
+        for ip in ('0.1.1.1', '1.0.1.0', '3.3.3.3'):
+            eq_(geoip.lookup(ip), 'restofworld')
+        assert not mock_post.called
+
+    @mock.patch('requests.post')
+    def test_missing_fallback(self, mock_post):
+        mock_post.return_value = mock.Mock(status_code=200, json=lambda: {
+            'country_code': 'US',
+        })
+        geoip = GeoIP(generate_settings(url='localhost', db_path=self.path))
+        eq_(geoip.lookup('3.3.3.3'), 'us')
+        mock_post.assert_called_with('localhost/country.json',
+                                     timeout=0.2, data={'ip': '3.3.3.3'})
+
+    @mock.patch('requests.post')
+    def test_private_ip(self, mock_post):
+        self.write('10.0.0.0,10.255.255.255,US\n')
+        geoip = GeoIP(generate_settings(db_path=self.path))
+        eq_(geoip.lookup('10.0.0.1'), 'restofworld')
+
+    def test_reload(self):
+        geoip = GeoIP(generate_settings(db_path=self.path))
+        eq_(geoip.lookup('1.0.0.1'), 'au')
+        self.write('1.0.0.0,1.0.0.255,NZ\n',
+                   mtime=os.path.getmtime(self.path) + 10)
+        eq_(geoip.lookup('1.0.0.1'), 'nz')
+
+    def test_reload_error(self):
+        geoip = GeoIP(generate_settings(db_path=self.path))
+        eq_(geoip.lookup('1.0.0.1'), 'au')
+        os.rename(self.path, self.path + '.old')
+        try:
+            eq_(geoip.lookup('1.0.0.1'), 'au')
+        finally:
+            os.rename(self.path + '.old', self.path)
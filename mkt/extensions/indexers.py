@@ -118,6 +118,9 @@ class ExtensionIndexer(BaseIndexer):
         cls.attach_language_specific_analyzers(
             mapping, cls.fields_with_language_analyzers)
 
+        # Add search-as-you-type sub-fields.
+        cls.attach_autocomplete_mappings(mapping, ('name',))
+
         return mapping
 
     @classmethod
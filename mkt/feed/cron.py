@@ -0,0 +1,17 @@
+import commonware.log
+import cronjobs
+
+from mkt.feed.views import FeedView
+
+
+cron_log = commonware.log.getLogger('mkt.feed.cron')
+
+
+@cronjobs.register
+def build_feed_documents():
+    """
+    Rebuild the pre-built feed documents of every region and carrier, in case
+    feed items were indexed after the last rebuild.
+    """
+    cron_log.info('Building feed documents')
+    FeedView().build_feed_documents()
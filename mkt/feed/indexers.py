@@ -21,7 +21,20 @@ def get_slug_multifield():
     }
 
 
-class FeedAppIndexer(BaseIndexer):
+class BaseFeedIndexer(BaseIndexer):
+    """
+    Base class of the feed indexers. Whatever they write changes the feed,
+    so once it's searchable the cached feed responses are invalidated.
+    """
+
+    @classmethod
+    def search_changed(cls, es=None, index=None):
+        from mkt.feed.models import update_feed_generation
+        super(BaseFeedIndexer, cls).search_changed(es=es, index=index)
+        update_feed_generation()
+
+
+class FeedAppIndexer(BaseFeedIndexer):
     @classmethod
     def get_model(cls):
         """Returns the Django model this MappingType relates to"""
@@ -96,7 +109,7 @@ class FeedAppIndexer(BaseIndexer):
         return doc
 
 
-class FeedBrandIndexer(BaseIndexer):
+class FeedBrandIndexer(BaseFeedIndexer):
     @classmethod
     def get_model(cls):
         from mkt.feed.models import FeedBrand
@@ -136,7 +149,7 @@ class FeedBrandIndexer(BaseIndexer):
         }
 
 
-class FeedCollectionIndexer(BaseIndexer):
+class FeedCollectionIndexer(BaseFeedIndexer):
     @classmethod
     def get_model(cls):
         from mkt.feed.models import FeedCollection
@@ -215,7 +228,7 @@ class FeedCollectionIndexer(BaseIndexer):
         return doc
 
 
-class FeedShelfIndexer(BaseIndexer):
+class FeedShelfIndexer(BaseFeedIndexer):
     @classmethod
     def get_model(cls):
         from mkt.feed.models import FeedShelf
@@ -293,7 +306,7 @@ class FeedShelfIndexer(BaseIndexer):
         return doc
 
 
-class FeedItemIndexer(BaseIndexer):
+class FeedItemIndexer(BaseFeedIndexer):
 
     chunk_size = 1000
 
@@ -11,8 +11,10 @@ Current content types able to be attached to FeedItem:
 - `FeedCollection` (via the `collection` field)
 """
 import os
+import uuid
 
 from django.conf import settings
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
 from django.db import models
 from django.db.models.signals import post_delete
@@ -457,6 +459,45 @@ def delete_search_index(sender, instance, **kw):
     instance.get_indexer().unindex(instance.id)
 
 
+# The cache key holding the current generation of the feed. Cached feed
+# responses include the generation in their key, so changing it invalidates
+# all of them at once.
+FEED_GENERATION_KEY = 'feed:generation'
+
+# Set while a rebuild of the feed documents is scheduled.
+FEED_DOCUMENTS_PENDING_KEY = 'feed:documents:pending'
+
+
+def get_feed_generation():
+    generation = cache.get(FEED_GENERATION_KEY)
+    if generation is None:
+        cache.add(FEED_GENERATION_KEY, uuid.uuid4().hex, None)
+        generation = cache.get(FEED_GENERATION_KEY)
+    return generation
+
+
+def update_feed_generation(documents=True):
+    """
+    Invalidate the cached feed responses. Called by the feed indexers once
+    what they wrote is searchable, see mkt.feed.indexers.BaseFeedIndexer:
+    doing it when the feed is saved would let requests made before the
+    changes are indexed cache the old feed under the new generation.
+
+    When the feed is served from the feed documents, they are rebuilt first
+    and the generation is only changed once they are stored, see
+    FeedView.build_feed_documents(). Pass documents=False to change it
+    right away.
+    """
+    if documents and settings.FEED_DOCUMENTS:
+        # Rebuild the feed documents once for a batch of changes.
+        delay = settings.FEED_DOCUMENTS_DELAY
+        if cache.add(FEED_DOCUMENTS_PENDING_KEY, 1, delay * 2):
+            from mkt.feed.tasks import build_feed_documents
+            build_feed_documents.apply_async(countdown=delay)
+        return
+    cache.set(FEED_GENERATION_KEY, uuid.uuid4().hex, None)
+
+
 # Save translations when saving instance with translated fields.
 models.signals.pre_save.connect(
     save_signal, sender=FeedApp,
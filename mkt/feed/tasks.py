@@ -1,8 +1,11 @@
 import logging
 
+from django.core.cache import cache
+
 from post_request_task.task import task
 
-from mkt.feed.models import FeedApp, FeedCollection
+from mkt.feed.models import (FEED_DOCUMENTS_PENDING_KEY, FeedApp,
+                             FeedCollection)
 
 log = logging.getLogger('z.feed')
 
@@ -31,3 +34,12 @@ def _migrate_collection_colors(ids, model):
             obj.update(color=color)
             log.info('Migrated %s:%s from %s to %s' %
                      (model, unicode(obj.id), obj.background_color, color))
+
+
+@task
+def build_feed_documents():
+    """Rebuild the pre-built feed documents, see FeedView."""
+    # Imported here to avoid loading the views when importing the tasks.
+    from mkt.feed.views import FeedView
+    cache.delete(FEED_DOCUMENTS_PENDING_KEY)
+    FeedView().build_feed_documents()
@@ -3,6 +3,7 @@ import json
 import os
 
 from django.core.urlresolvers import reverse
+from django.test.utils import override_settings
 from django.utils.text import slugify
 
 import mock
@@ -10,6 +11,7 @@ from elasticsearch_dsl.search import Search
 from mpconstants import collection_colors as coll_colors
 from nose.tools import eq_, ok_
 from post_request_task import task as post_request_task
+from rest_framework.response import Response
 
 import mkt
 import mkt.carriers
@@ -18,9 +20,9 @@ import mkt.regions
 from mkt.api.tests.test_oauth import RestOAuth
 from mkt.constants import applications
 from mkt.feed.models import (FeedApp, FeedBrand, FeedCollection, FeedItem,
-                             FeedShelf)
+                             FeedShelf, get_feed_generation)
 from mkt.feed.tests.test_models import FeedAppMixin, FeedTestMixin
-from mkt.feed.views import FeedView
+from mkt.feed.views import FeedView, NO_SHELF_CARRIER
 from mkt.fireplace.tests.test_views import assert_fireplace_app
 from mkt.operators.models import OperatorPermission
 from mkt.site.fixtures import fixture
@@ -1410,6 +1412,107 @@ class TestFeedView(BaseTestFeedESView, BaseTestFeedItemViewSet):
         eq_(data['objects'][0]['item_type'],
             feed.FEED_TYPE_SHELF)
 
+    @override_settings(FEED_CACHE_TIMEOUT=60)
+    def test_cached(self):
+        self.feed_item_factory()
+        res, data = self._get()
+        with mock.patch.object(FeedView, '_get') as _get:
+            cached_res, cached_data = self._get()
+        ok_(not _get.called)
+        eq_(cached_res.status_code, 200)
+        eq_(cached_data, data)
+
+    @override_settings(FEED_CACHE_TIMEOUT=60)
+    def test_cached_per_carrier(self):
+        feed_items = self.feed_factory()
+        self._get()
+        res, data = self._get(carrier=None)
+        eq_(len(data['objects']), len(feed_items) - 1)  # No shelf.
+
+    @override_settings(FEED_CACHE_TIMEOUT=60)
+    def test_cache_invalidated(self):
+        self.feed_item_factory()
+        self._get()
+        self.feed_item_factory()
+        res, data = self._get()
+        eq_(len(data['objects']), 2)
+
+    @override_settings(FEED_CACHE_TIMEOUT=60)
+    def test_cache_invalidated_once_indexed(self):
+        feed_item = self.feed_item_factory()
+        self._get()
+        post_request_task._start_queuing_tasks()
+        feed_item.app.update(pullquote_attribution='Someone')
+        # Requests made before the change is indexed still get the old feed,
+        # they must not keep it cached once it is indexed.
+        res = self.anon.get(self.url, {'carrier': self.carrier,
+                                       'region': self.region})
+        ok_(json.loads(res.content)['objects'][0]['app']
+            ['pullquote_attribution'] != 'Someone')
+        res, data = self._get()
+        eq_(data['objects'][0]['app']['pullquote_attribution'], 'Someone')
+
+    @override_settings(FEED_CACHE_TIMEOUT=60, FEED_CACHE_LOCK_TIMEOUT=0)
+    @mock.patch('mkt.feed.views.cache.add')
+    def test_cache_locked(self, add_mock):
+        # Another request is building the response and doesn't finish in
+        # time, the response is built without being cached.
+        add_mock.return_value = False
+        self.feed_item_factory()
+        self._get()
+        with mock.patch.object(FeedView, '_get') as _get:
+            _get.return_value = Response({})
+            self._get()
+        ok_(_get.called)
+
+    @override_settings(FEED_DOCUMENTS=True)
+    @mock.patch('mkt.feed.tasks.build_feed_documents')
+    def test_feed_document(self, build_mock):
+        feed_items = self.feed_factory()
+        self._refresh()
+        FeedView().build_feed_documents()
+        with mock.patch.object(FeedView, 'get_es_feed_query') as query:
+            res, data = self._get()
+        ok_(not query.called)
+        eq_(res.status_code, 200)
+        eq_(len(data['objects']), len(feed_items))
+        eq_(data['meta']['total_count'], len(feed_items))
+
+    @override_settings(FEED_DOCUMENTS=True)
+    @mock.patch('mkt.feed.tasks.build_feed_documents')
+    def test_feed_document_rebuilt_in_place(self, build_mock):
+        feed_items = self.feed_factory()
+        self._refresh()
+        FeedView().build_feed_documents()
+        generation = get_feed_generation()
+        region = mkt.regions.RESTOFWORLD.id
+        # Editing the feed schedules a rebuild, the previous documents and
+        # cached responses are served until then.
+        self.feed_item_factory()
+        self._refresh()
+        ok_(build_mock.apply_async.called)
+        eq_(get_feed_generation(), generation)
+        document = FeedView().get_feed_document(region, None, None)
+        eq_(document['items']['hits']['total'], len(feed_items) - 1)
+        FeedView().build_feed_documents()
+        ok_(get_feed_generation() != generation)
+        document = FeedView().get_feed_document(region, None, None)
+        eq_(document['items']['hits']['total'], len(feed_items))
+
+    @override_settings(FEED_DOCUMENTS=True)
+    @mock.patch('mkt.feed.tasks.build_feed_documents')
+    def test_feed_document_carrier_without_shelf(self, build_mock):
+        self.feed_factory()
+        self._refresh()
+        FeedView().build_feed_documents()
+        view = FeedView()
+        region = mkt.regions.RESTOFWORLD.id
+        # The shelf made by feed_factory() is for the carrier with id 1.
+        carrier = [c.id for c in mkt.carriers.CARRIERS if c.id != 1][0]
+        ok_(view.get_feed_document(region, carrier, None))
+        eq_(view.get_feed_document(region, carrier, None),
+            view.get_feed_document(region, NO_SHELF_CARRIER, None))
+
     def test_websites(self):
         self.feed_factory()
         self.featured_mow_factory(n_row=6, n_www=5)
@@ -1,4 +1,5 @@
 import StringIO
+import time
 from datetime import datetime
 import hashlib
 import uuid
@@ -11,6 +12,7 @@ from django.utils.translation import ugettext as _
 
 
 from django.conf import settings
+from django.core.cache import cache
 from django.core.files.base import File
 from django.db.models import Q
 from django.db.transaction import non_atomic_requests
@@ -23,6 +25,7 @@ from django_statsd.clients import statsd
 from elasticsearch_dsl import filter as es_filter
 from elasticsearch_dsl import function as es_function
 from elasticsearch_dsl import query, Search, SF
+from elasticsearch_dsl.result import Response as ESResponse
 
 from rest_framework import generics, response, status, viewsets
 from rest_framework.exceptions import ParseError, PermissionDenied
@@ -46,6 +49,7 @@ from mkt.feed.indexers import FeedItemIndexer
 from mkt.operators.models import OperatorPermission
 from mkt.search.filters import (DeviceTypeFilter, ProfileFilter,
                                 PublicContentFilter, RegionFilter)
+from mkt.search.utils import msearch
 from mkt.site.storage_utils import public_storage
 from mkt.site.utils import get_file_response
 from mkt.webapps.indexers import WebappIndexer
@@ -53,7 +57,8 @@ from mkt.webapps.models import Webapp
 from mkt.websites.indexers import WebsiteIndexer
 from mkt.websites.serializers import ESWebsiteSerializer
 
-from .models import FeedApp, FeedBrand, FeedCollection, FeedItem, FeedShelf
+from .models import (FeedApp, FeedBrand, FeedCollection, FeedItem, FeedShelf,
+                     get_feed_generation, update_feed_generation)
 from .permissions import FeedPermission
 from .serializers import (FeedAppESSerializer, FeedAppSerializer,
                           FeedBrandESSerializer, FeedBrandSerializer,
@@ -798,6 +803,21 @@ class FeedElementSearchView(BaseFeedESView):
         return response.Response(res, status=status.HTTP_200_OK)
 
 
+# The cache key holding the list of carriers that have a feed document.
+FEED_DOCUMENT_CARRIERS_KEY = 'feed:document:carriers'
+
+# The maximum number of feed items in a feed document.
+FEED_DOCUMENT_MAX_ITEMS = 100
+
+# Carriers without a shelf all get the same feed, the feed of a carrier that
+# doesn't exist, with this id.
+NO_SHELF_CARRIER = -1
+
+
+def feed_document_key(region, carrier, original_region):
+    return 'feed:document:%s:%s:%s' % (region, carrier, original_region)
+
+
 class FeedView(MarketplaceView, BaseFeedESView, generics.GenericAPIView):
     """
     THE feed view. It hits ES with:
@@ -884,10 +904,11 @@ class FeedView(MarketplaceView, BaseFeedESView, generics.GenericAPIView):
         """
         return int(datetime.now().strftime('%Y%m%d'))
 
-    def get_featured_websites(self):
+    def get_featured_websites_query(self):
         """
-        Get up to 11 featured MOWs for the request's region. If less than 11
-        are available, make up the difference with globally-featured MOWs.
+        Return the ES query for up to 11 featured MOWs for the request's
+        region. If less than 11 are available, make up the difference with
+        globally-featured MOWs.
         """
         REGION_TAG = 'featured-website-%s' % self.request.REGION.slug
         region_filter = es_filter.Term(tags=REGION_TAG)
@@ -902,7 +923,14 @@ class FeedView(MarketplaceView, BaseFeedESView, generics.GenericAPIView):
             ],
         )
         es = Search(using=WebsiteIndexer.get_es())[:11]
-        results = es.query(mow_query).execute().hits
+        return es.query(mow_query)
+
+    def get_featured_websites(self):
+        """
+        Get up to 11 featured MOWs for the request's region, see
+        get_featured_websites_query().
+        """
+        results = self.get_featured_websites_query().execute().hits
         return ESWebsiteSerializer(results, many=True).data
 
     def _check_empty_feed(self, items, rest_of_world):
@@ -945,13 +973,19 @@ class FeedView(MarketplaceView, BaseFeedESView, generics.GenericAPIView):
         if q.get('carrier') and q['carrier'] in mkt.carriers.CARRIER_MAP:
             carrier = mkt.carriers.CARRIER_MAP[q['carrier']].id
 
-        # Fetch FeedItems.
-        sq = self.get_es_feed_query(FeedItemIndexer.search(using=es),
-                                    region=region, carrier=carrier,
-                                    original_region=original_region)
-        # The paginator triggers the ES request.
-        with statsd.timer('mkt.feed.view.feed_query'):
-            feed_items = self.paginate_queryset(sq)
+        # Fetch FeedItems, from the pre-built feed document if there is one.
+        document = self.get_feed_document(region, carrier, original_region)
+        if document is None:
+            sq = self.get_es_feed_query(FeedItemIndexer.search(using=es),
+                                        region=region, carrier=carrier,
+                                        original_region=original_region)
+            # The paginator triggers the ES request.
+            with statsd.timer('mkt.feed.view.feed_query'):
+                feed_items = self.paginate_queryset(sq)
+        else:
+            hits = ESResponse(document['items']).hits
+            self.paginator.count_override = hits.total
+            feed_items = self.paginate_queryset(list(hits))
         feed_ok = self._check_empty_feed(feed_items, rest_of_world)
         if feed_ok != 1:
             return self._handle_empty_feed(feed_ok, region, request, args,
@@ -968,12 +1002,31 @@ class FeedView(MarketplaceView, BaseFeedESView, generics.GenericAPIView):
             feed.FEED_TYPE_SHELF: {},
         }
 
-        # Fetch feed elements to attach to FeedItems later.
+        # Fetch feed elements to attach to FeedItems later. The featured
+        # websites don't depend on anything, fetch them in the same request.
         apps = []
-        sq = self.get_es_feed_element_query(
-            Search(using=es, index=self.get_feed_element_index()), feed_items)
-        with statsd.timer('mkt.feed.view.feed_element_query'):
-            feed_elements = sq.execute().hits
+        if document is None:
+            sq = self.get_es_feed_element_query(
+                Search(using=es, index=self.get_feed_element_index()),
+                feed_items)
+            with statsd.timer('mkt.feed.view.msearch'):
+                feed_elements, websites = msearch(es, [
+                    (self.get_feed_element_index(), sq),
+                    (None, self.get_featured_websites_query())])
+            # Keep track of how long each query took in ES.
+            statsd.timing('mkt.feed.view.feed_element_query',
+                          feed_elements.took)
+            statsd.timing('mkt.feed.view.feed_website_query', websites.took)
+            feed_elements = feed_elements.hits
+        else:
+            with statsd.timer('mkt.feed.view.feed_website_query'):
+                websites = self.get_featured_websites_query().execute()
+            # Only keep the feed elements of the current page.
+            page = set((item['item_type'], item[item['item_type']])
+                       for item in feed_items)
+            feed_elements = [
+                feed_elm for feed_elm in ESResponse(document['elements']).hits
+                if (feed_elm['item_type'], feed_elm['id']) in page]
         for feed_elm in feed_elements:
             # Store the feed elements to attach to FeedItems later.
             feed_element_map[feed_elm['item_type']][feed_elm['id']] = feed_elm
@@ -1005,17 +1058,150 @@ class FeedView(MarketplaceView, BaseFeedESView, generics.GenericAPIView):
             return self._handle_empty_feed(feed_ok, region, request, args,
                                            kwargs)
 
-        with statsd.timer('mkt.feed.view.feed_website_query'):
-            websites = self.get_featured_websites()
-
         return response.Response({
             'meta': meta,
             'objects': feed_items,
-            'websites': websites
+            'websites': ESWebsiteSerializer(websites.hits, many=True).data
         }, status=status.HTTP_200_OK)
 
+    def get_feed_document(self, region, carrier, original_region):
+        """
+        Return the pre-built feed document for a region and carrier, or None
+        if there isn't an up to date one. See build_feed_documents().
+        """
+        if not settings.FEED_DOCUMENTS:
+            return None
+
+        if carrier is None:
+            # Without a carrier, the original region doesn't matter.
+            original_region = None
+        key = feed_document_key(region, carrier, original_region)
+        no_shelf_key = feed_document_key(region, NO_SHELF_CARRIER,
+                                         original_region)
+        cached = cache.get_many([FEED_DOCUMENT_CARRIERS_KEY, key,
+                                 no_shelf_key])
+        carriers = cached.get(FEED_DOCUMENT_CARRIERS_KEY)
+        if carriers is None:
+            return None
+        if carrier is not None and carrier not in carriers:
+            key = no_shelf_key
+        document = cached.get(key)
+        # Documents only hold the first FEED_DOCUMENT_MAX_ITEMS feed items,
+        # longer feeds are queried.
+        if (document is None or
+                document['items']['hits']['total'] > FEED_DOCUMENT_MAX_ITEMS):
+            statsd.incr('mkt.feed.view.document.miss')
+            return None
+        statsd.incr('mkt.feed.view.document.hit')
+        return document
+
+    def build_feed_document(self, es, region, carrier=None,
+                            original_region=None):
+        """
+        Return the raw ES responses of the feed items and feed elements of a
+        region and carrier, to be stored and served by get_feed_document().
+        """
+        sq = self.get_es_feed_query(FeedItemIndexer.search(using=es),
+                                    region=region, carrier=carrier,
+                                    original_region=original_region)
+        items = es.search(index=FeedItemIndexer.get_index(),
+                          body=sq[0:FEED_DOCUMENT_MAX_ITEMS].to_dict())
+        elements = {'hits': {'hits': [], 'total': 0}}
+        hits = ESResponse(items).hits
+        if hits:
+            sq = self.get_es_feed_element_query(Search(using=es), hits)
+            elements = es.search(index=self.get_feed_element_index(),
+                                 body=sq.to_dict())
+        return {'items': items, 'elements': elements}
+
+    def build_feed_documents(self):
+        """
+        Build and store the feed documents of every region and carrier, so
+        that the feed can be served without querying for the feed items and
+        feed elements.
+
+        Carriers without a shelf all get the same feed, stored under
+        NO_SHELF_CARRIER. The documents are replaced in place, requests keep
+        getting the previous ones while they are built. The cached feed
+        responses are invalidated once they are stored.
+        """
+        es = FeedItemIndexer.get_es()
+        carriers = sorted(set(
+            FeedItem.objects.filter(item_type=feed.FEED_TYPE_SHELF)
+                            .values_list('carrier', flat=True)))
+        rest_of_world = mkt.regions.RESTOFWORLD.id
+
+        documents = {}
+        for region in mkt.regions.ALL_REGION_IDS:
+            for carrier in [None, NO_SHELF_CARRIER] + carriers:
+                documents[feed_document_key(region, carrier, None)] = (
+                    self.build_feed_document(es, region, carrier))
+                if carrier is not None and region != rest_of_world:
+                    # The fallback to the rest of world feed.
+                    key = feed_document_key(rest_of_world, carrier, region)
+                    documents[key] = self.build_feed_document(
+                        es, rest_of_world, carrier, original_region=region)
+
+        documents[FEED_DOCUMENT_CARRIERS_KEY] = carriers
+        cache.set_many(documents, None)
+        update_feed_generation(documents=False)
+        log.info('Built {0} feed documents'.format(len(documents) - 1))
+
+    def get_cache_key(self, request):
+        """
+        Return the key of the cached response for this request. The query
+        string covers the region, carrier, pagination and filtering
+        parameters.
+        """
+        parts = [
+            get_feed_generation(),
+            getattr(request, 'API_VERSION', ''),
+            request.REGION.slug,
+            getattr(request, 'LANG', ''),
+            self._get_daily_seed(),
+            sorted(request.query_params.lists()),
+        ]
+        return 'feed:view:%s' % hashlib.md5(repr(parts)).hexdigest()
+
+    def _get_cached(self, request, *args, **kwargs):
+        """
+        Return the response from the cache, building and caching it if it's
+        not there. Only one request builds a given response at a time, the
+        others wait for it for up to FEED_CACHE_LOCK_TIMEOUT seconds.
+        """
+        key = self.get_cache_key(request)
+        cached = cache.get(key)
+        if cached is None and not cache.add(
+                key + ':lock', 1, settings.FEED_CACHE_LOCK_TIMEOUT):
+            # Another request is building it, wait for it.
+            with statsd.timer('mkt.feed.view.cache.wait'):
+                deadline = time.time() + settings.FEED_CACHE_LOCK_TIMEOUT
+                while cached is None and time.time() < deadline:
+                    time.sleep(0.05)
+                    cached = cache.get(key)
+            if cached is None:
+                # Give up waiting, build it without caching it.
+                statsd.incr('mkt.feed.view.cache.miss')
+                return self._get(request, *args, **kwargs)
+
+        if cached is not None:
+            statsd.incr('mkt.feed.view.cache.hit')
+            data, status_code = cached
+            return response.Response(data, status=status_code)
+
+        statsd.incr('mkt.feed.view.cache.miss')
+        try:
+            res = self._get(request, *args, **kwargs)
+            cache.set(key, (res.data, res.status_code),
+                      settings.FEED_CACHE_TIMEOUT)
+        finally:
+            cache.delete(key + ':lock')
+        return res
+
     def get(self, request, *args, **kwargs):
         with statsd.timer('mkt.feed.view'):
+            if settings.FEED_CACHE_TIMEOUT:
+                return self._get_cached(request, *args, **kwargs)
             return self._get(request, *args, **kwargs)
 
 
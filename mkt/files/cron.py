@@ -1,9 +1,7 @@
-import hashlib
 import os
 from datetime import datetime
 
 from django.conf import settings
-from django.core.cache import cache
 
 import commonware.log
 import cronjobs
@@ -32,17 +30,9 @@ def cleanup_extracted_file():
             for subroot, dirs, files in walk_storage(full):
                 for f in files:
                     private_storage.delete(os.path.join(subroot, f))
-            # Nuke out the file and diff caches when the file gets removed.
-            id = os.path.basename(path)
-            try:
-                int(id)
-            except ValueError:
-                continue
-
-            key = hashlib.md5()
-            key.update(str(id))
-            cache.delete('%s:memoize:%s:%s' % (settings.CACHE_PREFIX,
-                                               'file-viewer', key.hexdigest()))
+            index_path = full + '.json'
+            if private_storage.exists(index_path):
+                private_storage.delete(index_path)
 
 
 @cronjobs.register
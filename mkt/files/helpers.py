@@ -1,4 +1,5 @@
 import codecs
+import hashlib
 import json
 import mimetypes
 import os
@@ -8,11 +9,11 @@ from collections import OrderedDict
 from django.conf import settings
 from django.core.urlresolvers import reverse
 from django.template.defaultfilters import filesizeformat
-from django.utils.encoding import smart_unicode
+from django.utils.encoding import smart_str, smart_unicode
 
 import commonware.log
 import jinja2
-from cache_nuggets.lib import memoize, Message
+from cache_nuggets.lib import Message
 from jingo import register
 from django.utils.translation import ugettext as _
 from appvalidator.testcases.packagelayout import (
@@ -20,11 +21,11 @@ from appvalidator.testcases.packagelayout import (
     blacklisted_magic_numbers as blocked_magic_numbers)
 
 import mkt
-from mkt.files.utils import extract_zip, get_md5
+from mkt.files.utils import extract_zip
 from mkt.site.storage_utils import (copy_stored_file, local_storage,
                                     private_storage, public_storage,
-                                    storage_is_remote, walk_storage)
-from mkt.site.utils import env
+                                    walk_storage)
+from mkt.site.utils import env, rm_local_tmp_dir
 
 
 # Allow files with a shebang through.
@@ -70,6 +71,11 @@ class FileViewer(object):
     Provide access to a storage-managed file by copying it locally and
     extracting info from it. `src` is a storage-managed path and `dest` is a
     local temp path.
+
+    Extractions are keyed by the hash of the package when it's known, so
+    files with identical packages share them. The metadata of the extracted
+    files is computed while extracting them and kept in an index next to
+    them, `index_path`, from which the file tree is built.
     """
 
     def __init__(self, file_obj):
@@ -78,8 +84,10 @@ class FileViewer(object):
         self.src = (file_obj.guarded_file_path
                     if file_obj.status == mkt.STATUS_DISABLED
                     else file_obj.file_path)
-        self.dest = os.path.join(settings.TMP_PATH, 'file_viewer',
-                                 str(file_obj.pk))
+        key = (file_obj.hash.split(':')[-1] if file_obj.hash
+               else str(file_obj.pk))
+        self.dest = os.path.join(settings.TMP_PATH, 'file_viewer', key)
+        self.index_path = self.dest + '.json'
         self._files, self.selected = None, None
 
     def __str__(self):
@@ -87,11 +95,12 @@ class FileViewer(object):
 
     def _extraction_cache_key(self):
         return ('%s:file-viewer:extraction-in-progress:%s' %
-                (settings.CACHE_PREFIX, self.file.id))
+                (settings.CACHE_PREFIX, os.path.basename(self.dest)))
 
     def extract(self):
         """
-        Will make all the directories and expand the files.
+        Will make all the directories and expand the files, and write the
+        index of their metadata.
         Raises error on nasty files.
         """
         if self.file.status in mkt.LISTED_STATUSES:
@@ -100,20 +109,34 @@ class FileViewer(object):
             storage = private_storage
         try:
             tempdir = extract_zip(storage.open(self.src))
-            # Move extracted files into persistent storage.
-            for root, subdirs, files in os.walk(tempdir):
-                storage_root = root.replace(tempdir, self.dest, 1)
-                for fname in files:
-                    file_src = os.path.join(root, fname)
-                    file_dest = os.path.join(storage_root, fname)
-                    copy_stored_file(file_src, file_dest,
-                                     src_storage=local_storage,
-                                     dst_storage=private_storage)
+            try:
+                # Move extracted files into persistent storage, reading each
+                # of them once while it's local to get its metadata.
+                index = {}
+                for root, subdirs, files in os.walk(tempdir):
+                    storage_root = root.replace(tempdir, self.dest, 1)
+                    for dirname in subdirs:
+                        dir_dest = os.path.join(storage_root, dirname)
+                        index[self._get_short(dir_dest)] = (
+                            self._get_directory_info(dir_dest))
+                    for fname in files:
+                        file_src = os.path.join(root, fname)
+                        file_dest = os.path.join(storage_root, fname)
+                        index[self._get_short(file_dest)] = (
+                            self._get_file_info(file_src, local_storage))
+                        copy_stored_file(file_src, file_dest,
+                                         src_storage=local_storage,
+                                         dst_storage=private_storage)
+                self._write_index(index)
+            finally:
+                rm_local_tmp_dir(tempdir)
         except Exception, err:
             task_log.error('Error (%s) extracting %s' % (err, self.src))
             raise
 
     def cleanup(self):
+        if private_storage.exists(self.index_path):
+            private_storage.delete(self.index_path)
         try:
             for root, dirs, files in walk_storage(
                     self.dest, storage=private_storage):
@@ -127,24 +150,100 @@ class FileViewer(object):
 
     def is_extracted(self):
         """If the file has been extracted or not."""
-        return (private_storage.exists(
-            os.path.join(self.dest, 'manifest.webapp')) and
-            not Message(self._extraction_cache_key()).get())
+        # Extractions made before there was an index don't have one.
+        return ((private_storage.exists(self.index_path) or
+                 private_storage.exists(
+                     os.path.join(self.dest, 'manifest.webapp'))) and
+                not Message(self._extraction_cache_key()).get())
+
+    def _get_short(self, path):
+        """The path of an extracted file, relative to `dest`."""
+        return smart_unicode(path[len(self.dest) + 1:], errors='replace')
+
+    def _get_mimetype(self, filename):
+        mime, encoding = mimetypes.guess_type(filename)
+        if not mime and filename == 'manifest.webapp':
+            mime = 'application/x-web-app-manifest+json'
+        return mime
+
+    def _get_directory_info(self, path):
+        return {
+            'binary': False,
+            'directory': True,
+            'md5': '',
+            'mimetype': self._get_mimetype(os.path.basename(path)),
+            'modified': 0,
+            'size': 0,
+        }
+
+    def _get_file_info(self, path, storage):
+        """Returns the metadata of a file, reading it once."""
+        md5, size, head = hashlib.md5(), 0, None
+        with storage.open(path, 'rb') as f:
+            while True:
+                data = f.read(2 ** 20)
+                if not data:
+                    break
+                if head is None:
+                    head = data[:4]
+                md5.update(data)
+                size += len(data)
+        mime = self._get_mimetype(os.path.basename(path))
+        return {
+            'binary': self._is_binary(mime, path, head or ''),
+            'directory': False,
+            'md5': md5.hexdigest(),
+            'mimetype': mime,
+            'modified': time.mktime(storage.modified_time(path).timetuple()),
+            'size': size,
+        }
+
+    def _write_index(self, index):
+        with private_storage.open(self.index_path, 'w') as f:
+            json.dump(index, f)
+
+    def _read_index(self):
+        if not private_storage.exists(self.index_path):
+            return None
+        with private_storage.open(self.index_path, 'r') as f:
+            return json.load(f)
+
+    def build_index(self):
+        """
+        Builds and writes the index from the extracted files in storage, for
+        extractions made before there was an index or changed since.
+        """
+        index = {}
+
+        def iterate(path):
+            path_dirs, path_files = private_storage.listdir(path)
+            for dirname in path_dirs:
+                full = os.path.join(path, dirname)
+                index[self._get_short(full)] = self._get_directory_info(full)
+                iterate(full)
+            for filename in path_files:
+                full = os.path.join(path, filename)
+                index[self._get_short(full)] = self._get_file_info(
+                    full, private_storage)
 
-    def _is_binary(self, mimetype, path):
-        """Uses the filename to see if the file can be shown in HTML or not."""
+        iterate(self.dest)
+        self._write_index(index)
+        self._files = None
+        return index
+
+    def _is_binary(self, mimetype, path, head):
+        """
+        Uses the filename and the first bytes of the file, `head`, to see if
+        the file can be shown in HTML or not.
+        """
         # Re-use the blocked data from amo-validator to spot binaries.
         ext = os.path.splitext(path)[1][1:]
         if ext in blocked_extensions:
             return True
 
-        # S3 will return false for storage.exists() for directory paths, so
-        # os.path call is safe here.
-        if private_storage.exists(path) and not os.path.isdir(path):
-            with private_storage.open(path, 'r') as rfile:
-                bytes = tuple(map(ord, rfile.read(4)))
-            if any(bytes[:len(x)] == x for x in blocked_magic_numbers):
-                return True
+        bytes = tuple(map(ord, head))
+        if any(bytes[:len(x)] == x for x in blocked_magic_numbers):
+            return True
 
         if mimetype:
             major, minor = mimetype.split('/')
@@ -304,53 +403,43 @@ class FileViewer(object):
                 return short
         return 'plain'
 
-    @memoize(prefix='file-viewer', time=60 * 60)
     def _get_files(self):
-        all_files, res = [], OrderedDict()
-
-        # Not using os.path.walk so we get just the right order.
-        def iterate(path):
-            path_dirs, path_files = private_storage.listdir(path)
-            for dirname in sorted(path_dirs):
-                full = os.path.join(path, dirname)
-                all_files.append(full)
-                iterate(full)
-
-            for filename in sorted(path_files):
-                full = os.path.join(path, filename)
-                all_files.append(full)
-
-        iterate(self.dest)
-
-        for path in all_files:
-            filename = smart_unicode(os.path.basename(path), errors='replace')
-            short = smart_unicode(path[len(self.dest) + 1:], errors='replace')
-            mime, encoding = mimetypes.guess_type(filename)
-            if not mime and filename == 'manifest.webapp':
-                mime = 'application/x-web-app-manifest+json'
-            if storage_is_remote():
-                # S3 doesn't have directories, so we check for names with this
-                # prefix and call it a directory if there are some.
-                subdirs, subfiles = private_storage.listdir(path)
-                directory = bool(subdirs or subfiles)
-            else:
-                directory = os.path.isdir(path)
-
+        index = self._read_index()
+        if index is None:
+            index = self.build_index()
+
+        # Directories first, then files, sorted by name at each level.
+        children = {}
+        for short, info in index.items():
+            dirs, files = children.setdefault(os.path.dirname(short),
+                                              ([], []))
+            (dirs if info['directory'] else files).append(short)
+
+        def iterate(parent):
+            dirs, files = children.get(parent, ([], []))
+            for short in sorted(dirs):
+                yield short
+                for child in iterate(short):
+                    yield child
+            for short in sorted(files):
+                yield short
+
+        res = OrderedDict()
+        for short in iterate(u''):
+            info = index[short]
+            filename = os.path.basename(short)
             res[short] = {
-                'binary': self._is_binary(mime, path),
+                'binary': info['binary'],
                 'depth': short.count(os.sep),
-                'directory': directory,
+                'directory': info['directory'],
                 'filename': filename,
-                'full': path,
-                'md5': get_md5(path) if not directory else '',
-                'mimetype': mime or 'application/octet-stream',
+                'full': os.path.join(self.dest, smart_str(short)),
+                'md5': info['md5'],
+                'mimetype': info['mimetype'] or 'application/octet-stream',
                 'syntax': self.get_syntax(filename),
-                'modified': (
-                    time.mktime(
-                        private_storage.modified_time(path).timetuple())
-                    if not directory else 0),
+                'modified': info['modified'],
                 'short': short,
-                'size': private_storage.size(path) if not directory else 0,
+                'size': info['size'],
                 'truncated': self.truncate(filename),
                 'url': reverse('mkt.files.list',
                                args=[self.file.id, 'file', short]),
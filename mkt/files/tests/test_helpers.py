@@ -5,11 +5,10 @@ import zipfile
 
 from django import forms
 from django.conf import settings
-from django.core.cache import cache
 from django.core.urlresolvers import reverse
 
 from mock import Mock, patch
-from nose.tools import eq_
+from nose.tools import eq_, ok_
 
 from mkt.files.helpers import FileViewer, DiffHelper
 from mkt.files.utils import SafeUnzip
@@ -28,6 +27,7 @@ def get_file(x):
 def make_file(pk, file_path, **kwargs):
     obj = Mock()
     obj.id = pk
+    obj.hash = ''
     for k, v in kwargs.items():
         setattr(obj, k, v)
     obj.file_path = file_path
@@ -136,7 +136,7 @@ class TestFileHelper(TestCase):
             # django-storages doesn't support empty files).
             with private_storage.open(subdir, 'w') as f:
                 f.write('.')
-        cache.clear()
+        self.viewer.build_index()
         files = self.viewer.get_files().keys()
         rt = files.index(u'chrome')
         eq_(files[rt:rt + 3], [u'chrome', u'chrome/foo', u'dictionaries'])
@@ -175,11 +175,30 @@ class TestFileHelper(TestCase):
         eq_(res, '')
         assert self.viewer.selected['msg'].startswith('That file no')
 
-    @patch('mkt.files.helpers.get_md5')
-    def test_delete_mid_tree(self, get_md5):
-        get_md5.side_effect = IOError('ow')
+    def test_delete_mid_tree(self):
         self.viewer.extract()
-        eq_({}, self.viewer.get_files())
+        # Without an index, the tree is built from the files in storage.
+        private_storage.delete(self.viewer.index_path)
+        with patch.object(self.viewer, '_get_file_info') as get_file_info:
+            get_file_info.side_effect = IOError('ow')
+            eq_({}, self.viewer.get_files())
+
+    def test_extract_index(self):
+        self.viewer.extract()
+        ok_(private_storage.exists(self.viewer.index_path))
+        with patch('mkt.files.helpers.private_storage.listdir') as listdir:
+            files = self.viewer.get_files()
+        ok_(not listdir.called)
+        eq_(files['install.js']['size'],
+            private_storage.size(os.path.join(self.viewer.dest,
+                                              'install.js')))
+        eq_(files['dictionaries']['directory'], True)
+
+    def test_extract_shared(self):
+        self.viewer.file.hash = 'sha256:abc'
+        viewer = FileViewer(self.viewer.file)
+        eq_(os.path.basename(viewer.dest), 'abc')
+        ok_(viewer._extraction_cache_key().endswith(':abc'))
 
 
 class TestDiffHelper(TestCase, MktPaths):
@@ -234,6 +253,7 @@ class TestDiffHelper(TestCase, MktPaths):
         self.helper.extract()
         private_storage.delete(os.path.join(self.helper.left.dest,
                                             'index.html'))
+        self.helper.left.build_index()
         eq_('index.html' in self.helper.get_deleted_files(), True)
 
     def test_diffable_one_binary_same(self):
@@ -245,7 +265,7 @@ class TestDiffHelper(TestCase, MktPaths):
     def test_diffable_one_binary_diff(self):
         self.helper.extract()
         self.change(self.helper.left.dest, 'asd')
-        cache.clear()
+        self.helper.left.build_index()
         self.helper.select('main.js')
         self.helper.left.selected['binary'] = True
         assert self.helper.is_binary()
@@ -254,7 +274,8 @@ class TestDiffHelper(TestCase, MktPaths):
         self.helper.extract()
         self.change(self.helper.left.dest, 'asd')
         self.change(self.helper.right.dest, 'asd123')
-        cache.clear()
+        self.helper.left.build_index()
+        self.helper.right.build_index()
         self.helper.select('main.js')
         self.helper.left.selected['binary'] = True
         self.helper.right.selected['binary'] = True
@@ -271,7 +292,7 @@ class TestDiffHelper(TestCase, MktPaths):
         self.helper.extract()
         self.change(self.helper.left.dest, 'asd',
                     filename='META-INF/ids.json')
-        cache.clear()
+        self.helper.left.build_index()
         files = self.helper.get_files()
         eq_(files['META-INF/ids.json']['diff'], True)
         eq_(files['META-INF']['diff'], True)
@@ -240,6 +240,7 @@ class TestFileViewer(FilesBase, mkt.site.tests.WebappTestCase):
         dest = os.path.join(self.file_viewer.dest, name)
         with private_storage.open(dest, 'w') as f:
             f.write(contents)
+        self.file_viewer.build_index()
 
     def test_files_xss(self):
         self.file_viewer.extract()
@@ -266,9 +267,6 @@ class TestFileViewer(FilesBase, mkt.site.tests.WebappTestCase):
     def test_content_xss(self):
         self.file_viewer.extract()
         for name in ['file.txt', 'file.html', 'file.htm']:
-            # If you are adding files, you need to clear out the memcache
-            # file listing.
-            cache.clear()
             self.add_file(name, '<script>alert("foo")</script>')
             res = self.client.get(self.file_url(name))
             doc = pq(res.content)
@@ -375,6 +373,7 @@ class TestDiffViewer(FilesBase, mkt.site.tests.WebappTestCase):
         dest = os.path.join(file_obj.dest, name)
         with private_storage.open(dest, 'w') as f:
             f.write(contents)
+        file_obj.build_index()
 
     def file_url(self, file=None):
         args = [self.files[0].pk, self.files[1].pk]
@@ -419,6 +418,7 @@ class TestDiffViewer(FilesBase, mkt.site.tests.WebappTestCase):
         self.file_viewer.extract()
         private_storage.delete(os.path.join(self.file_viewer.right.dest,
                                             'script.js'))
+        self.file_viewer.right.build_index()
         res = self.client.get(self.file_url(not_binary))
         doc = pq(res.content)
         eq_(len(doc('pre')), 3)
@@ -429,6 +429,7 @@ class TestDiffViewer(FilesBase, mkt.site.tests.WebappTestCase):
         filename = os.path.join(self.file_viewer.left.dest, 'script.js')
         with private_storage.open(filename, 'w') as f:
             f.write('MZ')
+        self.file_viewer.left.build_index()
         res = self.client.get(self.file_url(not_binary))
         assert 'This file is not viewable online' in res.content
 
@@ -437,6 +438,7 @@ class TestDiffViewer(FilesBase, mkt.site.tests.WebappTestCase):
         filename = os.path.join(self.file_viewer.right.dest, 'script.js')
         with private_storage.open(filename, 'w') as f:
             f.write('MZ')
+        self.file_viewer.right.build_index()
         assert not self.file_viewer.is_diffable()
         res = self.client.get(self.file_url(not_binary))
         assert 'This file is not viewable online' in res.content
@@ -445,6 +447,7 @@ class TestDiffViewer(FilesBase, mkt.site.tests.WebappTestCase):
         self.file_viewer.extract()
         private_storage.delete(os.path.join(self.file_viewer.left.dest,
                                             not_binary))
+        self.file_viewer.left.build_index()
         res = self.client.get(self.file_url(not_binary))
         doc = pq(res.content)
         eq_(doc('h4:last').text(), 'Deleted files:')
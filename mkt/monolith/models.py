@@ -1,8 +1,19 @@
+import atexit
 import datetime
 import hashlib
 import json
+import logging
+import os
+from collections import deque
+from threading import Event, Lock, Thread
 
-from django.db import models
+from django.conf import settings
+from django.db import close_old_connections, models
+
+from django_statsd.clients import statsd
+
+
+log = logging.getLogger('z.monolith')
 
 
 class MonolithRecord(models.Model):
@@ -21,16 +32,88 @@ class MonolithRecord(models.Model):
         db_table = 'monolith_record'
 
 
+def _get_user_identity(request):
+    ip = request.META.get('REMOTE_ADDR', '')
+    ua = request.META.get('User-Agent', '')
+    session_key = request.session.session_key or ''
+
+    return '-'.join(map(str, (ip, ua, session_key)))
+
+
 def get_user_hash(request):
     """Get a hash identifying an user.
 
     It's a hash of session key, ip and user agent
     """
-    ip = request.META.get('REMOTE_ADDR', '')
-    ua = request.META.get('User-Agent', '')
-    session_key = request.session.session_key or ''
+    return hashlib.sha1(_get_user_identity(request)).hexdigest()
 
-    return hashlib.sha1('-'.join(map(str, (ip, ua, session_key)))).hexdigest()
+
+class RecordBuffer(object):
+    """A bounded buffer of records saved in batches by a background thread.
+
+    Records are added on the request thread, and a thread started in each
+    process saves them with bulk_create() every MONOLITH_FLUSH_INTERVAL
+    seconds, or as soon as there are MONOLITH_BATCH_SIZE of them. Users are
+    hashed by that thread too. When MONOLITH_BUFFER_SIZE records are waiting,
+    new ones are dropped and counted.
+    """
+
+    def __init__(self):
+        self.records = deque()
+        self.lock = Lock()
+        self.full = Event()
+        self.pid = None
+
+    def add(self, record):
+        with self.lock:
+            if len(self.records) >= settings.MONOLITH_BUFFER_SIZE:
+                statsd.incr('monolith.record.dropped')
+                return False
+            self.records.append(record)
+            full = len(self.records) >= settings.MONOLITH_BATCH_SIZE
+            # Forked processes don't inherit the thread of their parent.
+            if self.pid != os.getpid():
+                self.pid = os.getpid()
+                thread = Thread(target=self.run, name='monolith-flusher')
+                thread.daemon = True
+                thread.start()
+        if full:
+            self.full.set()
+        return True
+
+    def run(self):
+        while True:
+            self.full.wait(settings.MONOLITH_FLUSH_INTERVAL)
+            self.full.clear()
+            try:
+                self.flush()
+            except Exception:
+                log.exception('Failed to save monolith records')
+
+    def flush(self):
+        """Save all the records waiting in the buffer."""
+        while True:
+            with self.lock:
+                batch = [self.records.popleft() for i in
+                         range(min(len(self.records),
+                                   settings.MONOLITH_BATCH_SIZE))]
+            if not batch:
+                return
+            for record in batch:
+                record.user_hash = hashlib.sha1(
+                    record._user_identity).hexdigest()
+            close_old_connections()
+            try:
+                MonolithRecord.objects.bulk_create(batch)
+            except Exception:
+                statsd.incr('monolith.record.failed', len(batch))
+                raise
+            statsd.incr('monolith.record.saved', len(batch))
+
+
+record_buffer = RecordBuffer()
+# Save what's left when the process exits.
+atexit.register(record_buffer.flush)
 
 
 def record_stat(key, request, **data):
@@ -46,6 +129,9 @@ def record_stat(key, request, **data):
     :para: data:
         The data you want to store. You can pass the data to this function as
         named arguments.
+
+    Unless MONOLITH_BUFFER_SIZE is 0, the record is saved later, see
+    RecordBuffer.
     """
     if '__recorded' in data:
         recorded = data.pop('__recorded')
@@ -55,6 +141,15 @@ def record_stat(key, request, **data):
     if not data:
         raise ValueError('You should at least define one value')
 
+    if settings.MONOLITH_BUFFER_SIZE:
+        # The user is hashed when the record is saved, user_hash stays empty
+        # until then.
+        record = MonolithRecord(key=key, recorded=recorded,
+                                value=json.dumps(data))
+        record._user_identity = _get_user_identity(request)
+        record_buffer.add(record)
+        return record
+
     record = MonolithRecord(key=key, user_hash=get_user_hash(request),
                             recorded=recorded, value=json.dumps(data))
     record.save()
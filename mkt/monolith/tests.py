@@ -8,12 +8,15 @@ from nose.tools import eq_, ok_
 
 from django.core.urlresolvers import reverse
 from django.test import client
+from django.test.utils import override_settings
 
 from mkt.api.tests.test_oauth import RestOAuth
-from mkt.monolith.models import MonolithRecord, record_stat
-from mkt.monolith.views import daterange
+from mkt.monolith.models import (get_user_hash, MonolithRecord, RecordBuffer,
+                                 record_stat)
+from mkt.monolith.views import _get_query_result, daterange
+from mkt.ratings.models import Review
 from mkt.site.fixtures import fixture
-from mkt.site.tests import TestCase
+from mkt.site.tests import app_factory, TestCase, user_factory
 
 
 class RequestFactory(client.RequestFactory):
@@ -64,6 +67,24 @@ class TestModels(TestCase):
         with self.assertRaises(ValueError):
             record_stat('app.install', self.request)
 
+    @override_settings(MONOLITH_BUFFER_SIZE=2)
+    @mock.patch('mkt.monolith.models.statsd')
+    @mock.patch('mkt.monolith.models.Thread')
+    def test_record_stat_buffered(self, thread, statsd):
+        buffer_ = RecordBuffer()
+        with mock.patch('mkt.monolith.models.record_buffer', buffer_):
+            records = [record_stat('app.install', self.request, value=value)
+                       for value in range(3)]
+        eq_(MonolithRecord.objects.count(), 0)
+        eq_(records[0].user_hash, '')
+        ok_(thread.return_value.start.called)
+        statsd.incr.assert_called_with('monolith.record.dropped')
+
+        buffer_.flush()
+        records = MonolithRecord.objects.order_by('id')
+        eq_([json.loads(r.value)['value'] for r in records], [0, 1])
+        eq_(records[0].user_hash, get_user_hash(self.request))
+
 
 class TestMonolithResource(RestOAuth):
     fixtures = fixture('user_2519')
@@ -214,6 +235,81 @@ class TestMonolithResource(RestOAuth):
         eq_(data['meta']['limit'], 2)
 
 
+class TestGetQueryResult(TestCase):
+
+    def setUp(self):
+        super(TestGetQueryResult, self).setUp()
+        self.app = app_factory()
+        self.day = datetime.date(2013, 2, 12)
+
+    def review(self, days, rating=5, app=None):
+        review = Review.objects.create(addon=app or self.app,
+                                       user=user_factory(), rating=rating)
+        Review.objects.filter(pk=review.pk).update(
+            created=datetime.datetime.combine(
+                self.day + datetime.timedelta(days=days),
+                datetime.time(13, 37)))
+
+    def results(self, key, days):
+        return [(d['recorded'], d['value']['app-id'], d['value']['count'])
+                for d in _get_query_result(
+                    key, self.day, self.day + datetime.timedelta(days=days))]
+
+    def test_slice(self):
+        other_app = app_factory()
+        self.review(0)
+        self.review(0)
+        self.review(0, app=other_app)
+        self.review(2)
+        self.review(4)
+        day = lambda n: self.day + datetime.timedelta(days=n)
+        eq_(self.results('apps_ratings', 4),
+            [(day(0), self.app.pk, 2), (day(0), other_app.pk, 1),
+             (day(2), self.app.pk, 1)])
+
+    def test_total(self):
+        self.review(-1, rating=5)
+        self.review(1, rating=2)
+        self.review(1, rating=2)
+        day = lambda n: self.day + datetime.timedelta(days=n)
+        eq_(self.results('apps_average_rating', 3),
+            [(day(0), self.app.pk, 5.0), (day(1), self.app.pk, 3.0),
+             (day(2), self.app.pk, 3.0)])
+
+    def test_total_null_ratings(self):
+        other_app = app_factory()
+        self.review(-1, rating=None)
+        self.review(1, rating=None)
+        self.review(1, rating=4)
+        self.review(0, rating=None, app=other_app)
+        day = lambda n: self.day + datetime.timedelta(days=n)
+        eq_(self.results('apps_average_rating', 2),
+            [(day(0), self.app.pk, None), (day(0), other_app.pk, None),
+             (day(1), self.app.pk, 4.0), (day(1), other_app.pk, None)])
+
+    def test_number_of_queries(self):
+        self.review(0)
+        with self.assertNumQueries(1):
+            self.results('apps_ratings', 365)
+        with self.assertNumQueries(2):
+            self.results('apps_average_rating', 365)
+
+    def test_past_days_cached(self):
+        self.review(0)
+        results = self.results('apps_ratings', 3)
+        self.review(0)
+        with self.assertNumQueries(0):
+            eq_(self.results('apps_ratings', 3), results)
+
+    def test_today_not_cached(self):
+        self.day = datetime.date.today()
+        self.review(0)
+        self.results('apps_ratings', 1)
+        self.review(0)
+        eq_(self.results('apps_ratings', 1),
+            [(self.day, self.app.pk, 2)])
+
+
 class TestDateRange(TestCase):
 
     def setUp(self):
@@ -1,7 +1,9 @@
 import datetime
 import logging
+from collections import defaultdict
 
-from django.db.models import Avg, Count
+from django.core.cache import cache
+from django.db.models import Count, DateField, F, Func, Sum
 from rest_framework import status
 from rest_framework.exceptions import ParseError
 from rest_framework.generics import ListAPIView
@@ -22,31 +24,31 @@ log = logging.getLogger('z.monolith')
 
 # TODO: Move the stats that can be calculated on the fly from
 # apps/stats/tasks.py here.
+#
+# Each stat is computed by grouping `qs` by day and app: 'slice' stats report
+# the aggregate over each day, 'total' stats the aggregate over everything
+# created up to the end of each day.
 STATS = {
     'apps_ratings': {
-        'qs': Review.objects
-        .filter(editorreview=0)
-        .values('addon')
-        .annotate(count=Count('addon')).order_by(),
+        'qs': Review.objects.filter(editorreview=0),
+        'aggregate': 'count',
         'type': 'slice',
         'field_map': {
             'count': 'count',
             'app-id': 'addon'},
     },
     'apps_average_rating': {
-        'qs': Review.objects
-        .filter(editorreview=0)
-        .values('addon')
-        .annotate(avg=Avg('rating')).order_by(),
+        'qs': Review.objects.filter(editorreview=0),
+        'aggregate': 'avg',
+        'field': 'rating',
         'type': 'total',
         'field_map': {
             'count': 'avg',
             'app-id': 'addon'},
     },
     'apps_abuse_reports': {
-        'qs': AbuseReport.objects
-        .values('addon')
-        .annotate(count=Count('addon')).order_by(),
+        'qs': AbuseReport.objects.all(),
+        'aggregate': 'count',
         'type': 'slice',
         'field_map': {
             'count': 'count',
@@ -60,14 +62,85 @@ def daterange(start, end):
         yield start + datetime.timedelta(n)
 
 
+def _aggregate(stat, qs, by_day=True):
+    """
+    Group `qs` by app, and by day unless `by_day` is False, with the number
+    of rows and the sum of the averaged field of each group. Counts and sums
+    can be added up across days, unlike averages. For averages, only the
+    rows where the field is not NULL are counted, like Avg() does.
+    """
+    app_field = stat['field_map']['app-id']
+    if stat['aggregate'] == 'avg':
+        aggregates = {'n': Count(stat['field']), 'sum': Sum(stat['field'])}
+    else:
+        aggregates = {'n': Count(app_field)}
+    if by_day:
+        qs = qs.annotate(day=Func(F('created'), function='DATE',
+                                  output_field=DateField()))
+        qs = qs.values('day', app_field)
+    else:
+        qs = qs.values(app_field)
+    return qs.annotate(**aggregates).order_by()
+
+
+def _compute_days(key, start, end):
+    """
+    Return the results of the stat for each day from `start` to `end`, in a
+    single query for the range, plus one for what came before it for 'total'
+    stats.
+    """
+    stat = STATS[key]
+    app_field = stat['field_map']['app-id']
+    rows_by_day = defaultdict(list)
+    for row in _aggregate(stat, stat['qs'].filter(created__gte=start,
+                                                  created__lt=end)):
+        day = row['day']
+        if isinstance(day, datetime.datetime):
+            day = day.date()
+        rows_by_day[day].append(row)
+
+    # The running totals by app, for 'total' stats.
+    totals = {}
+    if stat['type'] == 'total':
+        for row in _aggregate(stat, stat['qs'].filter(created__lt=start),
+                              by_day=False):
+            totals[row[app_field]] = [row['n'], row.get('sum') or 0]
+
+    def value(n, sum_):
+        if stat['aggregate'] == 'avg':
+            return float(sum_) / n if n else None
+        return n
+
+    results = {}
+    for day in daterange(start, end):
+        if stat['type'] == 'total':
+            for row in rows_by_day[day]:
+                total = totals.setdefault(row[app_field], [0, 0])
+                total[0] += row['n']
+                total[1] += row.get('sum') or 0
+            values = [(app, value(n, sum_))
+                      for app, (n, sum_) in totals.items()]
+        else:
+            values = [(row[app_field], value(row['n'], row.get('sum')))
+                      for row in rows_by_day[day]]
+        results[day] = [{
+            'key': key,
+            'recorded': day,
+            'user_hash': None,
+            'value': {'count': count, 'app-id': app}}
+            for app, count in sorted(values)]
+    return results
+
+
+def _get_cache_key(key, day):
+    return 'monolith:%s:%s' % (key, day.isoformat())
+
+
 def _get_query_result(key, start, end):
     # To do on-the-fly queries we have to produce results as if they
-    # were calculated daily, which means we need to iterate over each
-    # day in the range and perform an aggregation on this date.
-
-    data = []
+    # were calculated daily. Past days never change, their results are
+    # cached, the other days are computed together.
     today = datetime.date.today()
-    stat = STATS[key]
 
     # Choose start and end dates that make sense if none provided.
     if not start:
@@ -75,28 +148,22 @@ def _get_query_result(key, start, end):
     if not end:
         end = today
 
-    for day in daterange(start, end):
-        if stat['type'] == 'total':
-            # If it's a totalling queryset, we want to filter by the
-            # end date until the beginning of time to get the total
-            # objects up until this point in time.
-            date_filtered = stat['qs'].filter(
-                created__lt=(day + datetime.timedelta(days=1)))
-        else:
-            # Otherwise, we want to filter by both start/end to get
-            # counts on a specific day.
-            date_filtered = stat['qs'].filter(
-                created__gte=day,
-                created__lt=(day + datetime.timedelta(days=1)))
-
-        data.extend([{
-            'key': key,
-            'recorded': day,
-            'user_hash': None,
-            'value': {'count': d.get(stat['field_map']['count']),
-                      'app-id': d.get(stat['field_map']['app-id'])}}
-                     for d in date_filtered])
+    days = list(daterange(start, end))
+    cached = cache.get_many([_get_cache_key(key, day) for day in days
+                             if day < today])
+    results = dict((day, cached[_get_cache_key(key, day)]) for day in days
+                   if _get_cache_key(key, day) in cached)
+    missing = [day for day in days if day not in results]
+    if missing:
+        computed = _compute_days(key, missing[0],
+                                 missing[-1] + datetime.timedelta(days=1))
+        cache.set_many(dict((_get_cache_key(key, day), computed[day])
+                            for day in computed if day < today), None)
+        results.update(computed)
 
+    data = []
+    for day in days:
+        data.extend(results[day])
     return data
 
 
@@ -107,8 +107,10 @@ class Price(ModelBase):
         # however we might need to think about this for the long term.
         provider = (provider or
                     ALL_PROVIDERS[settings.DEFAULT_PAYMENT_PROVIDER].provider)
-        if not hasattr(Price, '_currencies'):
+        currencies = getattr(Price, '_currencies', None)
+        if currencies is None:
             Price.transformer([])
+            currencies = Price._currencies
 
         lookup = price_key({
             'tier': self.id, 'carrier': carrier,
@@ -116,7 +118,7 @@ class Price(ModelBase):
         })
 
         try:
-            price_currency = Price._currencies[lookup]
+            price_currency = currencies[lookup]
         except KeyError:
             return None
 
@@ -285,6 +287,23 @@ def update_price_currency(sender, instance, **kw):
         index_webapps.delay(ids)
 
 
+@receiver(models.signals.post_save, sender=Price,
+          dispatch_uid='save_price_clear_currencies')
+@receiver(models.signals.post_delete, sender=Price,
+          dispatch_uid='delete_price_clear_currencies')
+@receiver(models.signals.post_save, sender=PriceCurrency,
+          dispatch_uid='save_price_currency_clear_currencies')
+@receiver(models.signals.post_delete, sender=PriceCurrency,
+          dispatch_uid='delete_price_currency_clear_currencies')
+def clear_price_currencies(sender, **kw):
+    """
+    Drop the table of price currencies kept by Price, it's loaded again on
+    the next price lookup.
+    """
+    if hasattr(Price, '_currencies'):
+        del Price._currencies
+
+
 class AddonPurchase(ModelBase):
     addon = models.ForeignKey('webapps.Webapp')
     type = models.PositiveIntegerField(default=mkt.CONTRIB_PURCHASE,
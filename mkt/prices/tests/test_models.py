@@ -100,6 +100,15 @@ class TestPrice(mkt.site.tests.TestCase):
         with self.assertNumQueries(0):
             eq_(price.get_price_locale(regions=[RESTOFWORLD.id]), u'$0.99')
 
+    def test_currencies_cleared(self):
+        price = Price.objects.get(pk=1)
+        price.get_price(regions=[RESTOFWORLD.id])
+        ok_(hasattr(Price, '_currencies'))
+        pk = price.get_price_currency(region=RESTOFWORLD.id).pk
+        PriceCurrency.objects.get(pk=pk).update(price=Decimal('1.99'))
+        ok_(not hasattr(Price, '_currencies'))
+        eq_(price.get_price(regions=[RESTOFWORLD.id]), Decimal('1.99'))
+
     def test_get_tier_price(self):
         eq_(Price.objects.get(pk=2).get_price_locale(regions=[BRA.id]),
             'R$1.01')
@@ -1,7 +1,10 @@
 # -*- coding: utf-8 -*-
 import calendar
+import json
+import threading
 import time
 import uuid
+from multiprocessing.pool import ThreadPool
 from urllib import urlencode
 
 from django.db import connection
@@ -44,6 +47,7 @@ class ReceiptTest(mkt.site.tests.TestCase):
                                                  webapp=self.app)
         self.inapp.save()  # generates a GUID
         self.user = UserProfile.objects.get(pk=999)
+        verify.key_registry.reload()
 
     def sample_app_receipt(self):
         return create_receipt_data(self.app, self.user, 'some-uuid')
@@ -381,6 +385,251 @@ class TestVerify(ReceiptTest):
         assert ('Cache-Control', 'no-cache') in hdrs, 'No cache header needed'
 
 
+@mock.patch.object(utils.settings, 'WEBAPPS_RECEIPT_KEY',
+                   mkt.site.tests.MktPaths.sample_key())
+class TestReceiptCache(ReceiptTest):
+
+    def setUp(self):
+        super(TestReceiptCache, self).setUp()
+        self.receipt = create_receipt(self.app, self.user, 'some-uuid')
+
+    @mock.patch('services.verify.crack_receipt')
+    def test_cached(self, crack_receipt):
+        crack_receipt.return_value = self.sample_app_receipt()
+        eq_(verify.decode_receipt(self.receipt), crack_receipt.return_value)
+        eq_(verify.decode_receipt(self.receipt), crack_receipt.return_value)
+        eq_(crack_receipt.call_count, 1)
+
+    def test_cached_copy(self):
+        verify.decode_receipt(self.receipt)['exp'] = 'changed'
+        ok_(verify.decode_receipt(self.receipt)['exp'] != 'changed')
+
+    @mock.patch('services.verify.crack_receipt')
+    def test_expired_not_cached(self, crack_receipt):
+        data = self.sample_app_receipt()
+        data['exp'] = calendar.timegm(time.gmtime()) - 1000
+        crack_receipt.return_value = data
+        verify.decode_receipt(self.receipt)
+        verify.decode_receipt(self.receipt)
+        eq_(crack_receipt.call_count, 2)
+
+    @mock.patch('services.verify.crack_receipt')
+    def test_invalid_cached(self, crack_receipt):
+        crack_receipt.side_effect = verify.VerificationError
+        for x in range(2):
+            with self.assertRaises(verify.VerificationError):
+                verify.decode_receipt(self.receipt)
+        eq_(crack_receipt.call_count, 1)
+
+    @mock.patch.object(utils.settings,
+                       'SERVICES_RECEIPT_CACHE_INVALID_TIMEOUT', 10)
+    @mock.patch('services.verify.time')
+    @mock.patch('services.verify.crack_receipt')
+    def test_invalid_expires(self, crack_receipt, time_mock):
+        crack_receipt.side_effect = verify.VerificationError
+        time_mock.return_value = 1000
+        with self.assertRaises(verify.VerificationError):
+            verify.decode_receipt(self.receipt)
+        eq_(verify.receipt_cache.get(self.receipt), (False, None))
+        time_mock.return_value = 1010
+        eq_(verify.receipt_cache.get(self.receipt), None)
+
+    @mock.patch('services.verify.crack_receipt')
+    def test_lru(self, crack_receipt):
+        crack_receipt.return_value = self.sample_app_receipt()
+        cache = verify.ReceiptCache(2, 60)
+        with mock.patch.object(verify, 'receipt_cache', cache):
+            for receipt in ('a', 'b', 'a', 'c'):
+                verify.decode_receipt(receipt)
+            eq_(len(cache.entries), 2)
+            ok_(cache.get('a'))
+            eq_(cache.get('b'), None)
+
+
+class TestKeyRegistry(ReceiptTest):
+
+    def setUp(self):
+        super(TestKeyRegistry, self).setUp()
+        self.registry = verify.KeyRegistry()
+
+    @mock.patch.object(utils.settings, 'SIGNING_VALID_ISSUERS', ['a.com'])
+    @mock.patch('services.verify.receipts.certs.ReceiptVerifier')
+    def test_verifier(self, receipt_verifier):
+        verifier = self.registry.verifier()
+        eq_(self.registry.verifier(), verifier)
+        receipt_verifier.assert_called_once_with(valid_issuers=['a.com'])
+
+    @mock.patch('services.verify.receipts.certs.ReceiptVerifier')
+    def test_verifier_issuers_changed(self, receipt_verifier):
+        self.registry.verifier()
+        with mock.patch.object(utils.settings, 'SIGNING_VALID_ISSUERS',
+                               ['b.com']):
+            self.registry.verifier()
+        eq_(receipt_verifier.call_count, 2)
+
+    @mock.patch.object(utils.settings, 'WEBAPPS_RECEIPT_KEY',
+                       mkt.site.tests.MktPaths.sample_key())
+    @mock.patch('services.verify.jwt.rsa_load')
+    def test_key(self, rsa_load):
+        eq_(self.registry.key(), rsa_load.return_value)
+        self.registry.key()
+        eq_(rsa_load.call_count, 1)
+
+    @mock.patch.object(utils.settings, 'WEBAPPS_RECEIPT_KEY',
+                       mkt.site.tests.MktPaths.sample_key())
+    @mock.patch('services.verify.os.stat')
+    @mock.patch('services.verify.jwt.rsa_load')
+    def test_key_changed(self, rsa_load, stat):
+        stat.return_value.st_mtime = 1
+        self.registry.key()
+        verify.receipt_cache.set('receipt', (True, {}))
+        stat.return_value.st_mtime = 2
+        self.registry.key()
+        eq_(rsa_load.call_count, 2)
+        eq_(verify.receipt_cache.get('receipt'), None)
+
+    def test_offload(self):
+        eq_(verify.offload(lambda x, y=0: x + y, 1, y=2), 3)
+
+    def test_offload_threadpool(self):
+        threadpool = mock.Mock()
+        func = mock.Mock()
+        with mock.patch.object(verify, 'threadpool', threadpool):
+            eq_(verify.offload(func, 1, y=2), threadpool.apply.return_value)
+        threadpool.apply.assert_called_with(func, (1,), {'y': 2})
+        ok_(not func.called)
+
+    @mock.patch('services.verify.jwt.rsa_load')
+    def test_reload(self, rsa_load):
+        self.registry.key()
+        self.registry.reload()
+        self.registry.key()
+        eq_(rsa_load.call_count, 2)
+
+
+@mock.patch.object(settings, 'SITE_URL', 'http://foo.com/')
+@mock.patch.object(settings, 'WEBAPPS_RECEIPT_URL', '/verifyme/')
+class TestBatchVerify(ReceiptTest):
+
+    @mock.patch.object(verify, 'decode_receipt')
+    def verify_batch(self, receipts_data, decode_receipt):
+        decode_receipt.side_effect = receipts_data
+        batch = verify.BatchVerify(
+            [''] * len(receipts_data),
+            RequestFactory().get('/verifyme/').META
+        )
+        batch.cursor = connection.cursor()
+        return batch.check_full()
+
+    def test_batch(self):
+        AddonPurchase.objects.create(addon=self.app, user=self.user,
+                                     uuid='some-uuid')
+        contribution = Contribution.objects.create(
+            addon=self.app, inapp_product=self.inapp,
+            type=mkt.CONTRIB_REFUND, user=self.user)
+        wrong_user = self.sample_app_receipt()
+        wrong_user['user']['value'] = 'ugh'
+        wrong_type = self.sample_app_receipt()
+        wrong_type['typ'] = 'anything'
+
+        res = self.verify_batch([
+            self.sample_app_receipt(), wrong_user, wrong_type,
+            self.sample_inapp_receipt(contribution)])
+        eq_([r['status'] for r in res],
+            ['ok', 'invalid', 'invalid', 'refunded'])
+        eq_(res[1]['reason'], 'NO_PURCHASE')
+        eq_(res[2]['reason'], 'WRONG_TYPE')
+
+    def test_batch_queries(self):
+        AddonPurchase.objects.create(addon=self.app, user=self.user,
+                                     uuid='some-uuid')
+        contribution = Contribution.objects.create(
+            addon=self.app, inapp_product=self.inapp,
+            type=mkt.CONTRIB_PURCHASE, user=self.user)
+        receipts = ([self.sample_app_receipt() for x in range(3)] +
+                    [self.sample_inapp_receipt(contribution)
+                     for x in range(3)])
+        with self.assertNumQueries(2):
+            res = self.verify_batch(receipts)
+        eq_([r['status'] for r in res], ['ok'] * 6)
+
+    def test_batch_no_purchases(self):
+        with self.assertNumQueries(0):
+            eq_(self.verify_batch([]), [])
+
+
+@mock.patch.object(utils.settings, 'SIGNING_SERVER_ACTIVE', True)
+@mock.patch.object(settings, 'SITE_URL', 'http://foo.com/')
+@mock.patch.object(settings, 'WEBAPPS_RECEIPT_URL', '/verifyme/')
+@mock.patch('services.verify.format_date_time', lambda t: 'now')
+class TestThreadPool(ReceiptTest):
+    """
+    The gevent entry point checks the signatures in a thread pool, the
+    responses have to be the same as without it.
+    """
+
+    def setUp(self):
+        super(TestThreadPool, self).setUp()
+        self.threads = set()
+        receipt_verifier = mock.patch(
+            'services.verify.receipts.certs.ReceiptVerifier')
+        receipt_verifier.start().return_value.verify.side_effect = (
+            self.check_signature)
+        self.addCleanup(receipt_verifier.stop)
+        # Use the test database cursor.
+        connect = mock.patch.object(verify, 'connect', lambda: connection)
+        connect.start()
+        self.addCleanup(connect.stop)
+
+    def check_signature(self, receipt):
+        self.threads.add(threading.current_thread())
+        return not receipt.endswith('bad')
+
+    def get_responses(self, bodies):
+        responses = []
+        for body in bodies:
+            verify.receipt_cache.clear()
+            req = RequestFactory().post('/verifyme/', body,
+                                        content_type='application/json')
+            data = {}
+
+            def start_response(status, wsgi_headers):
+                data['status'], data['headers'] = status, wsgi_headers
+
+            data['body'] = verify.application(req.META, start_response)
+            responses.append(data)
+        return responses
+
+    def test_same_responses(self):
+        AddonPurchase.objects.create(addon=self.app, user=self.user,
+                                     uuid='some-uuid')
+        receipts = ['jwt_public_key~' + create_receipt(self.app, self.user,
+                                                       purchase_uuid)
+                    for purchase_uuid in ('some-uuid', 'other-uuid')]
+        receipts.append(receipts[0] + 'bad')
+        bodies = receipts + [json.dumps(receipts)]
+
+        expected = self.get_responses(bodies)
+        eq_([json.loads(data['body'][0]) for data in expected], [
+            {'status': 'ok'},
+            {'status': 'invalid', 'reason': 'NO_PURCHASE'},
+            {'status': 'invalid', 'reason': 'ERROR_DECODING'},
+            [{'status': 'ok'},
+             {'status': 'invalid', 'reason': 'NO_PURCHASE'},
+             {'status': 'invalid', 'reason': 'ERROR_DECODING'}]])
+        eq_(self.threads, set([threading.current_thread()]))
+
+        self.threads.clear()
+        threadpool = ThreadPool(2)
+        try:
+            with mock.patch.object(verify, 'threadpool', threadpool):
+                eq_(self.get_responses(bodies), expected)
+        finally:
+            threadpool.close()
+        ok_(self.threads)
+        ok_(threading.current_thread() not in self.threads)
+
+
 class TestBase(mkt.site.tests.TestCase):
 
     def create(self, data, request=None):
@@ -456,3 +705,32 @@ class TestServices(mkt.site.tests.TestCase):
         eq_(data['headers']['Access-Control-Allow-Headers'],
             'content-type, x-fxpay-version')
         eq_(data['headers']['Content-Length'], '0')
+
+    @mock.patch('services.utils.statsd')
+    @mock.patch('services.utils.mypool')
+    def test_connect_timed(self, mypool, statsd):
+        eq_(utils.connect(), mypool.connect.return_value)
+        statsd.timer.assert_called_with('services.pool.connect')
+
+    def post(self, body):
+        req = RequestFactory().post('/verify', body,
+                                    content_type='application/json')
+        data = {}
+
+        def start_response(status, wsgi_headers):
+            data['status'] = status
+
+        data['body'] = verify.application(req.META, start_response)[0]
+        return data
+
+    @mock.patch('services.verify.BatchVerify.check_full')
+    def test_batch(self, check_full):
+        check_full.return_value = [{'status': 'ok'}, {'status': 'ok'}]
+        data = self.post(json.dumps(['receipt-1', 'receipt-2']))
+        eq_(data['status'], '200 OK')
+        eq_(json.loads(data['body']), check_full.return_value)
+
+    def test_batch_invalid(self):
+        for body in ('[', json.dumps([1]), json.dumps(['r'] * 101),
+                     json.dumps([u'r\xe9ceipt'])):
+            eq_(self.post(body)['status'], '400 Bad Request')
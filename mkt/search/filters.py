@@ -1,3 +1,6 @@
+import json
+import re
+
 from django.conf import settings
 from django.utils import translation
 
@@ -11,12 +14,49 @@ from mkt.constants.applications import get_device_id
 from mkt.features.utils import load_feature_profile
 
 
+# Placeholders for the parameters of the compiled search queries, see
+# SearchQueryFilter.compile_query(). The NUL characters make sure they can't
+# collide with anything else in a query.
+QUERY_PLACEHOLDER = u'\x00q\x00'
+REGION_PLACEHOLDER = u'\x00region\x00'
+
+
+class CompiledQuery(query.Query):
+    """
+    A query serialized once with placeholders for its parameters, rendered
+    for each request by substituting them in the JSON instead of building
+    elasticsearch_dsl objects again.
+    """
+    name = 'compiled_query'
+
+    def __init__(self, parts, values):
+        super(CompiledQuery, self).__init__()
+        # Not _params, DslBase keeps the query parameters there.
+        self._parts = parts
+        self._values = values
+
+    def _clone(self):
+        # Never modified once created.
+        return self
+
+    def to_dict(self):
+        return json.loads(u''.join(self._values.get(part, part)
+                                   for part in self._parts))
+
+
 class SearchQueryFilter(BaseFilterBackend):
     """
     A django-rest-framework filter backend that scores the given ES queryset
     with a should query based on the search query found in the current
     request's query parameters.
     """
+    # The compiled queries, by shape, see compile_query().
+    _compiled = {}
+
+    # The fields with autocomplete sub-fields, see
+    # BaseIndexer.attach_autocomplete_mappings().
+    autocomplete_fields = ('name', 'short_name', 'title')
+
     def _get_locale_analyzer(self, lang):
         analyzer = mkt.SEARCH_LANGUAGE_TO_ANALYZER.get(lang)
         if (analyzer in mkt.SEARCH_ANALYZER_PLUGINS and
@@ -24,26 +64,34 @@ class SearchQueryFilter(BaseFilterBackend):
             analyzer = None
         return analyzer
 
-    def filter_queryset(self, request, queryset, view):
-
-        q = request.GET.get('q', '').lower()
-        lang = translation.get_language()
-        analyzer = self._get_locale_analyzer(lang)
+    def build_query(self, q, analyzer, region_id, autocomplete=False,
+                    single_word=None, numeric=None):
+        """
+        Return the `function_score` query for `q`. `single_word` and `numeric`
+        default to what `q` is, they are passed when building a query with
+        placeholders.
 
-        if not q:
-            return queryset
+        In autocomplete mode, the prefix and fuzzy queries on every field are
+        replaced by match queries on the autocomplete and shingle sub-fields
+        of a few fields, which are much cheaper.
+        """
+        if single_word is None:
+            single_word = ' ' not in q
+        if numeric is None:
+            numeric = q.isnumeric()
 
         should = []
         rules = [
             (query.Match, {'query': q, 'boost': 3, 'analyzer': 'standard'}),
             (query.Match, {'query': q, 'boost': 4, 'type': 'phrase',
                            'slop': 1}),
-            (query.Prefix, {'value': q, 'boost': 1.5}),
         ]
+        if not autocomplete:
+            rules.append((query.Prefix, {'value': q, 'boost': 1.5}))
 
         # Only add fuzzy queries if q is a single word. It doesn't make sense
         # to do a fuzzy query for multi-word queries.
-        if ' ' not in q:
+        if single_word and not autocomplete:
             rules.append(
                 (query.Fuzzy, {'value': q, 'boost': 2, 'prefix_length': 1}))
 
@@ -54,6 +102,18 @@ class SearchQueryFilter(BaseFilterBackend):
                           'title', 'url_tokenized'):
                 should.append(k(**{field: v}))
 
+        if autocomplete:
+            # Prefixes are indexed in the autocomplete sub-fields, and typos
+            # are caught by a single fuzzy match against the shingles.
+            for field in self.autocomplete_fields:
+                should.append(query.Match(**{
+                    '%s.autocomplete' % field: {
+                        'query': q, 'boost': 1.5, 'operator': 'and'}}))
+                should.append(query.Match(**{
+                    '%s.shingle' % field: {
+                        'query': q, 'boost': 2, 'fuzziness': 'AUTO',
+                        'prefix_length': 1}}))
+
         # Exact matches need to be queried against a non-analyzed field. Let's
         # do a term query on `name.raw` for an exact match against the item
         # name and give it a good boost since this is likely what the user
@@ -64,7 +124,7 @@ class SearchQueryFilter(BaseFilterBackend):
         # Do the same for GUID searches.
         should.append(query.Term(**{'guid': {'value': q, 'boost': 10}}))
         # If query is numeric, check if it is an ID.
-        if q.isnumeric():
+        if numeric:
             should.append(query.Term(**{'id': {'value': q, 'boost': 10}}))
 
         if analyzer:
@@ -92,7 +152,7 @@ class SearchQueryFilter(BaseFilterBackend):
 
         # Add searches on tag field.
         should.append(query.Term(tags={'value': q}))
-        if ' ' not in q:
+        if single_word and not autocomplete:
             should.append(query.Fuzzy(tags={'value': q, 'prefix_length': 1}))
 
         # The list of functions applied to our `function_score` query.
@@ -101,18 +161,61 @@ class SearchQueryFilter(BaseFilterBackend):
         ]
 
         # Add a boost for the preferred region, if it exists.
-        region = get_region_from_request(request)
-        if region:
+        if region_id is not None:
             functions.append({
-                'filter': {'term': {'preferred_regions': region.id}},
+                'filter': {'term': {'preferred_regions': region_id}},
                 # TODO: When we upgrade to Elasticsearch 1.4, change this
                 # to 'weight'.
                 'boost_factor': 4,
             })
 
-        return queryset.query('function_score',
-                              query=query.Bool(should=should),
-                              functions=functions)
+        return query.Q('function_score', query=query.Bool(should=should),
+                       functions=functions)
+
+    def compile_query(self, q, analyzer, region_id, autocomplete=False):
+        """
+        Return the query for `q` as a CompiledQuery. The query only depends
+        on the parameters through a few choices (single word or not, numeric
+        or not, analyzer, region or not, mode), it's built and serialized once
+        for each of those shapes.
+        """
+        single_word = ' ' not in q
+        numeric = q.isnumeric()
+        shape = (single_word, numeric, analyzer, region_id is not None,
+                 autocomplete)
+        parts = self._compiled.get(shape)
+        if parts is None:
+            skeleton = self.build_query(
+                QUERY_PLACEHOLDER, analyzer,
+                REGION_PLACEHOLDER if region_id is not None else None,
+                autocomplete=autocomplete, single_word=single_word,
+                numeric=numeric)
+            placeholders = (json.dumps(QUERY_PLACEHOLDER),
+                            json.dumps(REGION_PLACEHOLDER))
+            parts = re.split('(%s)' % '|'.join(map(re.escape, placeholders)),
+                             json.dumps(skeleton.to_dict()))
+            self._compiled[shape] = parts
+        return CompiledQuery(parts, {
+            json.dumps(QUERY_PLACEHOLDER): json.dumps(q),
+            json.dumps(REGION_PLACEHOLDER): json.dumps(region_id)})
+
+    def filter_queryset(self, request, queryset, view):
+
+        q = request.GET.get('q', '').lower()
+        lang = translation.get_language()
+        analyzer = self._get_locale_analyzer(lang)
+
+        if not q:
+            return queryset
+
+        # Views used for search-as-you-type ask for the autocomplete mode,
+        # which needs indexes built with the autocomplete sub-fields.
+        autocomplete = (settings.SEARCH_AUTOCOMPLETE and
+                        getattr(view, 'autocomplete', False))
+        region = get_region_from_request(request)
+        return queryset.query(
+            self.compile_query(q, analyzer, region.id if region else None,
+                               autocomplete=autocomplete))
 
 
 class SearchFormFilter(BaseFilterBackend):
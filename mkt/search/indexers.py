@@ -4,14 +4,15 @@ import sys
 from django.conf import settings
 
 import elasticsearch
-from elasticsearch import helpers
 from elasticsearch_dsl import Search
 from post_request_task.task import task
 
 import mkt
 from lib.es.models import Reindexing
 from mkt.constants.regions import MATURE_REGION_IDS
-from mkt.search.utils import get_boost
+from mkt.search.queue import IndexingTask
+from mkt.search.utils import (bulk_index, get_boost,
+                              update_search_generation)
 from mkt.site.decorators import use_master
 from mkt.translations.utils import to_language
 
@@ -27,6 +28,9 @@ class BaseIndexer(object):
     - get_mapping(cls)
     - extract_document(cls, pk=None, obj=None)
 
+    and can implement extract_documents(cls, objs) to extract the documents
+    of several objects at once.
+
     """
     _es = {}
 
@@ -34,8 +38,8 @@ class BaseIndexer(object):
     or sorting."""
     hidden_fields = ()
 
-    # How many documents do we use when bulk indexing. The goal is to send
-    # about 2.5mb of data to Elasticsearch during bulk indexing.
+    # How many objects are indexed by each reindexing task. The size of the
+    # bulk requests sent to Elasticsearch is set by ES_BULK_MAX_BYTES.
     chunk_size = 500
 
     @classmethod
@@ -80,19 +84,24 @@ class BaseIndexer(object):
         index = index or cls.get_index()
         es.index(index=index, doc_type=cls.get_mapping_type_name(),
                  body=document, id=id_)
+        cls.search_changed(es=es, index=index)
 
     @classmethod
     def bulk_index(cls, documents, id_field='id', es=None, index=None):
-        """Index of a bunch of documents."""
+        """
+        Index of a bunch of documents. `documents` can be any iterable, they
+        are sent while it's consumed, see mkt.search.utils.bulk_index().
+        """
         es = es or cls.get_es()
         index = index or cls.get_index()
         type = cls.get_mapping_type_name()
 
-        actions = [
-            {'_index': index, '_type': type, '_id': d['id'], '_source': d}
-            for d in documents]
+        actions = (
+            {'_index': index, '_type': type, '_id': d[id_field], '_source': d}
+            for d in documents)
 
-        helpers.bulk(es, actions)
+        bulk_index(es, actions)
+        cls.search_changed(es=es, index=index)
 
     @classmethod
     def index_ids(cls, ids, no_delay=False):
@@ -113,6 +122,17 @@ class BaseIndexer(object):
         es = es or cls.get_es()
         index = index or cls.get_index()
         es.delete(index=index, doc_type=cls.get_mapping_type_name(), id=id_)
+        cls.search_changed(es=es, index=index)
+
+    @classmethod
+    def search_changed(cls, es=None, index=None):
+        """
+        Called once documents were written. Refresh the index first, so that
+        the cached search results are only invalidated once the changes are
+        searchable.
+        """
+        cls.refresh_index(es=es, index=index)
+        update_search_generation()
 
     @classmethod
     def refresh_index(cls, es=None, index=None):
@@ -201,6 +221,39 @@ class BaseIndexer(object):
             'filter': ['lowercase'],
         }
 
+        # Analyzers for search-as-you-type, see attach_autocomplete_mappings().
+        # Every prefix of every word is indexed, so that a prefix can be
+        # matched with a plain match query instead of a prefix query.
+        filters['autocomplete_edge_ngram'] = {
+            'type': 'edgeNGram',
+            'min_gram': 1,
+            'max_gram': 20,
+        }
+        analyzers['autocomplete'] = {
+            'type': 'custom',
+            'tokenizer': 'icu_tokenizer',
+            'filter': ['icu_folding', 'icu_normalizer', 'lowercase',
+                       'autocomplete_edge_ngram'],
+        }
+        analyzers['autocomplete_search'] = {
+            'type': 'custom',
+            'tokenizer': 'icu_tokenizer',
+            'filter': ['icu_folding', 'icu_normalizer', 'lowercase'],
+        }
+        # Words and groups of consecutive words, to match queries with typos
+        # against a single field with a fuzzy match query.
+        filters['autocomplete_shingle'] = {
+            'type': 'shingle',
+            'min_shingle_size': 2,
+            'max_shingle_size': 3,
+        }
+        analyzers['shingle'] = {
+            'type': 'custom',
+            'tokenizer': 'icu_tokenizer',
+            'filter': ['icu_folding', 'icu_normalizer', 'lowercase',
+                       'autocomplete_shingle'],
+        }
+
         for lang, stemmer in mkt.STEMMER_MAP.items():
             filters['%s_stem_filter' % lang] = {
                 'type': 'stemmer',
@@ -249,11 +302,29 @@ class BaseIndexer(object):
             index=cls.get_index(), body={'mappings': cls.get_mapping(),
                                          'settings': cls.get_settings()})
 
+    @classmethod
+    def extract_documents(cls, objs):
+        """
+        Extracts the ElasticSearch index documents for a list of objects.
+        Indexers that can fetch the data of several objects at once override
+        this.
+        """
+        return [cls.extract_document(obj.id, obj=obj) for obj in objs]
+
     @classmethod
     def get_indexable(cls):
         """Returns base queryset that is able to be indexed."""
         return cls.get_model().objects.order_by('-id')
 
+    @classmethod
+    def get_modified_ids(cls, since):
+        """
+        Returns the ids of the things to be indexed that changed since the
+        given date, used by incremental reindexing.
+        """
+        return cls.get_indexable().filter(modified__gte=since).values_list(
+            'id', flat=True)
+
     @classmethod
     @task
     def unindexer(cls, ids=None, _all=False, index=None):
@@ -300,20 +371,20 @@ class BaseIndexer(object):
             len(ids), cls.get_model()._meta.model_name))
 
         # Fetch QS given the IDs.
-        docs = []
         qs = cls.get_model().objects.filter(id__in=ids)
 
-        # For each object, extract document.
-        for obj in qs:
-            try:
-                docs.append(cls.extract_document(obj.id, obj=obj))
-            except Exception as e:
-                sys.stdout.write('Failed to index {0} {1}: {2}\n'.format(
-                    cls.get_model()._meta.model_name, obj.id, e))
+        # For each object, extract document. Documents are sent to ES while
+        # the next ones are extracted.
+        def docs():
+            for obj in qs:
+                try:
+                    yield cls.extract_document(obj.id, obj=obj)
+                except Exception as e:
+                    sys.stdout.write('Failed to index {0} {1}: {2}\n'.format(
+                        cls.get_model()._meta.model_name, obj.id, e))
 
         # Index.
-        if docs:
-            cls.bulk_index(docs, es=ES, index=index or cls.get_index())
+        cls.bulk_index(docs(), es=ES, index=index or cls.get_index())
 
     @classmethod
     def attach_boost_mapping(cls, mapping):
@@ -351,6 +422,33 @@ class BaseIndexer(object):
             })
         return mapping
 
+    @classmethod
+    def attach_autocomplete_mappings(cls, mapping, field_names):
+        """
+        For each field in field_names, attach "<field_name>.autocomplete" and
+        "<field_name>.shingle" sub-fields to the ES mapping, indexed with the
+        autocomplete and shingle analyzers.
+
+        These sub-fields are used by the search filtering code in autocomplete
+        mode instead of prefix and fuzzy queries on the fields themselves.
+        """
+        properties = mapping[cls.get_mapping_type_name()]['properties']
+        for field_name in field_names:
+            properties[field_name].setdefault('fields', {}).update({
+                'autocomplete': {
+                    'type': 'string',
+                    'analyzer': 'autocomplete',
+                    'search_analyzer': 'autocomplete_search',
+                    'position_offset_gap': 100,
+                },
+                'shingle': {
+                    'type': 'string',
+                    'analyzer': 'shingle',
+                    'position_offset_gap': 100,
+                },
+            })
+        return mapping
+
     @classmethod
     def attach_language_specific_analyzers(cls, mapping, field_names):
         """
@@ -414,23 +512,31 @@ class BaseIndexer(object):
         return mapping
 
     @classmethod
-    def extract_popularity_trending_boost(cls, obj):
+    def extract_popularity_trending_boost(cls, obj, trending=None,
+                                          popularity=None):
+        """
+        `trending` and `popularity` can be passed as dicts of values by region
+        when they have already been fetched, to avoid querying them.
+        """
         # 0 is a special region when considering popularity/trending, it's the
         # one holding the global value.
         ALL_REGIONS_ID = 0
 
-        def get_dict(obj, prop):
+        def get_dict(obj, prop, values):
             if obj.is_dummy_content_for_qa():
                 return {}
+            if values is not None:
+                return values
             qs = getattr(obj, prop).filter(
                 region__in=MATURE_REGION_IDS + [ALL_REGIONS_ID])
             return dict(qs.values_list('region', 'value'))
 
+        trending = get_dict(obj, 'trending', trending)
+        popularity = get_dict(obj, 'popularity', popularity)
         extend = {
-            'boost': get_boost(obj),
+            'boost': get_boost(obj,
+                               popularity=popularity.get(ALL_REGIONS_ID, 0)),
         }
-        trending = get_dict(obj, 'trending')
-        popularity = get_dict(obj, 'popularity')
 
         # Global popularity.
         extend['trending'] = trending.get(ALL_REGIONS_ID, 0)
@@ -499,7 +605,7 @@ class BaseIndexer(object):
         return extend_with_me
 
 
-@task(acks_late=True)
+@task(base=IndexingTask, acks_late=True)
 @use_master
 def index(ids, indexer, **kw):
     """
@@ -513,7 +619,7 @@ def index(ids, indexer, **kw):
     indices = Reindexing.get_indices(indexer.get_index())
 
     es = indexer.get_es(urls=settings.ES_URLS)
-    for obj in indexer.get_indexable().filter(id__in=ids):
-        doc = indexer.extract_document(obj.id, obj)
+    objs = list(indexer.get_indexable().filter(id__in=ids))
+    for obj, doc in zip(objs, indexer.extract_documents(objs)):
         for idx in indices:
             indexer.index(doc, id_=obj.id, es=es, index=idx)
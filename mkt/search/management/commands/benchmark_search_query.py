@@ -0,0 +1,51 @@
+import json
+import timeit
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+
+import mkt
+from mkt.search.filters import SearchQueryFilter
+
+
+class Command(BaseCommand):
+    """
+    Usage:
+
+        python manage.py benchmark_search_query [--number=10000]
+
+    Compares building and serializing the search query with elasticsearch_dsl
+    objects to rendering the compiled query, for a few kinds of queries, and
+    checks that both give the same query. Does not need Elasticsearch.
+    """
+    help = 'Benchmark the compiled search query against the DSL build.'
+    option_list = BaseCommand.option_list + (
+        make_option('--number', action='store', type='int', default=10000,
+                    help='How many queries to build for each case.'),
+    )
+
+    def handle(self, *args, **kwargs):
+        number = kwargs['number']
+        filter_ = SearchQueryFilter()
+        region_id = mkt.regions.FRA.id
+        cases = [
+            (u'word', 'english'),
+            (u'several words', 'english'),
+            (u'1234', None),
+        ]
+        for q, analyzer in cases:
+            if (filter_.build_query(q, analyzer, region_id).to_dict() !=
+                    filter_.compile_query(q, analyzer, region_id).to_dict()):
+                raise CommandError('The compiled query for %r differs.' % q)
+            build = timeit.timeit(
+                lambda: json.dumps(
+                    filter_.build_query(q, analyzer, region_id).to_dict()),
+                number=number)
+            compiled = timeit.timeit(
+                lambda: json.dumps(
+                    filter_.compile_query(q, analyzer, region_id).to_dict()),
+                number=number)
+            self.stdout.write(
+                '%-15s dsl: %.1fus  compiled: %.1fus  (x%.1f)' % (
+                    repr(q), build * 1e6 / number, compiled * 1e6 / number,
+                    build / compiled))
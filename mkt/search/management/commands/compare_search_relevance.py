@@ -0,0 +1,83 @@
+from optparse import make_option
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.test.client import RequestFactory
+from django.test.utils import override_settings
+
+import mkt
+from mkt.search.views import SearchView
+
+
+class Command(BaseCommand):
+    """
+    Usage:
+
+        python manage.py compare_search_relevance [--file=queries.txt]
+            [--size=10] [--region=restofworld] [query ...]
+
+    Runs each query against the apps index with the default scoring and with
+    the autocomplete mode of SearchQueryFilter, and reports how many of the
+    default top results the autocomplete mode also returns, whether it keeps
+    the same first result, and how long Elasticsearch took for each. The
+    indexes need to have been built with the autocomplete sub-fields.
+    """
+    help = 'Compare the autocomplete search mode to the default scoring.'
+    option_list = BaseCommand.option_list + (
+        make_option('--file', action='store', default=None,
+                    help='A file with one query per line.'),
+        make_option('--size', action='store', type='int', default=10,
+                    help='How many results to compare for each query.'),
+        make_option('--region', action='store', default='restofworld',
+                    help='The slug of the region to search in.'),
+    )
+
+    def get_results(self, q, region, size, autocomplete):
+        request = RequestFactory().get('/', {'q': q})
+        request.user = AnonymousUser()
+        request.REGION = region
+        view = type('ComparedSearchView', (SearchView,),
+                    {'autocomplete': autocomplete})
+        queryset = view().get_queryset()
+        for backend in view.filter_backends:
+            queryset = backend().filter_queryset(request, queryset, view)
+        results = queryset[:size].execute()
+        return [hit.id for hit in results], results.took
+
+    def handle(self, *args, **kwargs):
+        queries = list(args)
+        if kwargs['file']:
+            with open(kwargs['file']) as f:
+                queries.extend(line.decode('utf-8').strip() for line in f)
+        queries = [q for q in queries if q]
+        if not queries:
+            raise CommandError('No queries to compare.')
+        region = mkt.regions.REGIONS_DICT.get(kwargs['region'])
+        if region is None:
+            raise CommandError('Unknown region: %s' % kwargs['region'])
+        size = kwargs['size']
+
+        overlaps, same_first, took = [], 0, [0, 0]
+        with override_settings(SEARCH_AUTOCOMPLETE=True):
+            for q in queries:
+                default, default_took = self.get_results(q, region, size,
+                                                         False)
+                autocomplete, autocomplete_took = self.get_results(
+                    q, region, size, True)
+                overlap = (len(set(default) & set(autocomplete)) /
+                           float(len(default)) if default else 1.0)
+                overlaps.append(overlap)
+                same_first += default[:1] == autocomplete[:1]
+                took[0] += default_took
+                took[1] += autocomplete_took
+                self.stdout.write(
+                    u'%-30s overlap@%d: %.2f  first: %s  took: %dms / %dms' %
+                    (q, size, overlap,
+                     'same' if default[:1] == autocomplete[:1] else 'diff',
+                     default_took, autocomplete_took))
+
+        self.stdout.write(
+            u'%d queries, mean overlap@%d: %.2f, same first result: %d, '
+            u'mean took: %.1fms / %.1fms' % (
+                len(queries), size, sum(overlaps) / len(overlaps), same_first,
+                took[0] / float(len(queries)), took[1] / float(len(queries))))
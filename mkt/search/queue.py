@@ -0,0 +1,115 @@
+"""
+Coalescing queue for the indexing tasks.
+
+Saving an app several times in a request or a task (a review action, a price
+change, a content rating update...) used to index it as many times. Instead,
+the ids passed to `.delay()` of tasks using `IndexingTask` as their base are
+collected for the duration of the request or task, deduplicated, and sent as
+a single task for each set of extra arguments when it finishes.
+
+Across processes, ids already waiting to be indexed are skipped for
+`settings.INDEXING_DEBOUNCE` seconds: tasks are sent with that countdown and
+the ids are released when the task starts, so the task sees every change
+made in the meantime.
+"""
+from collections import defaultdict
+from threading import local
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.signals import (got_request_exception, request_finished,
+                                 request_started)
+
+from celery.signals import task_postrun, task_prerun
+from django_statsd.clients import statsd
+from post_request_task.task import PostRequestTask
+
+
+_queue = local()
+
+
+def _get_stack():
+    if not hasattr(_queue, 'stack'):
+        _queue.stack = []
+    return _queue.stack
+
+
+def _pending_key(task, id_, args):
+    return 'index:pending:%s:%s:%s' % (
+        task.name, ':'.join(getattr(arg, '__name__', str(arg))
+                            for arg in args), id_)
+
+
+def start_collecting(**kwargs):
+    """Start collecting ids, until the matching send_collected() call."""
+    _get_stack().append(defaultdict(set))
+
+
+def start_request(**kwargs):
+    """Start collecting ids for a request. Requests aren't nested, this also
+    drops whatever a previous request that failed left behind."""
+    _queue.stack = []
+    start_collecting()
+
+
+def discard_collected(**kwargs):
+    """Drop the ids collected by a request that failed."""
+    _queue.stack = []
+
+
+def send_collected(**kwargs):
+    """Send the tasks for the ids collected since start_collecting()."""
+    stack = _get_stack()
+    if not stack:
+        return
+    for (task, args), ids in stack.pop().items():
+        send(task, ids, args)
+
+
+def send(task, ids, args=()):
+    """
+    Send `task` for the ids that aren't already waiting to be indexed by
+    another one.
+    """
+    debounce = settings.INDEXING_DEBOUNCE
+    ids = sorted(set(ids))
+    if debounce:
+        keys = dict((_pending_key(task, id_, args), id_) for id_ in ids)
+        pending = cache.get_many(keys.keys())
+        cache.set_many(dict((key, 1) for key in keys if key not in pending),
+                       debounce * 2)
+        statsd.incr('search.queue.debounced', len(pending))
+        ids = sorted(id_ for key, id_ in keys.items() if key not in pending)
+    if ids:
+        task.apply_async(args=[ids] + list(args), countdown=debounce or None)
+
+
+class IndexingTask(PostRequestTask):
+    """
+    Base class for the tasks taking a list of ids to index as their first
+    argument, to coalesce their `.delay()` calls.
+    """
+    abstract = True
+
+    def delay(self, ids, *args, **kwargs):
+        stack = _get_stack()
+        if kwargs:
+            return super(IndexingTask, self).delay(ids, *args, **kwargs)
+        elif stack:
+            stack[-1][(self, args)].update(ids)
+        else:
+            send(self, ids, args)
+
+    def __call__(self, ids, *args, **kwargs):
+        if settings.INDEXING_DEBOUNCE:
+            # Changes made from now on need another run of the task.
+            cache.delete_many([_pending_key(self, id_, args) for id_ in ids])
+        return super(IndexingTask, self).__call__(ids, *args, **kwargs)
+
+
+request_started.connect(start_request, dispatch_uid='index_queue_start')
+request_finished.connect(send_collected, dispatch_uid='index_queue_send')
+got_request_exception.connect(discard_collected,
+                              dispatch_uid='index_queue_discard')
+task_prerun.connect(start_collecting, dispatch_uid='index_queue_task_start')
+task_postrun.connect(send_collected, dispatch_uid='index_queue_task_send')
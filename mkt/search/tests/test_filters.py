@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 import json
 
+import mock
 from nose.tools import eq_, ok_
 from rest_framework.exceptions import ParseError
 
@@ -17,7 +18,7 @@ from mkt.search.filters import (DeviceTypeFilter, HomescreenFilter,
                                 RegionFilter, SearchQueryFilter, SortingFilter,
                                 ValidAppsFilter)
 from mkt.search.forms import TARAKO_CATEGORIES_MAPPING
-from mkt.search.views import SearchView
+from mkt.search.views import SearchView, SuggestionsView
 from mkt.site.tests import TestCase
 from mkt.webapps.indexers import WebappIndexer
 
@@ -99,6 +100,51 @@ class TestQueryFilter(FilterTestsBase):
                                                        'type': 'phrase'}}}
                 in should)
 
+    def test_compiled_query(self):
+        filter_ = SearchQueryFilter()
+        for q in (u'term', u'search terms', u'1234', u'"quoted\\',
+                  u'pr\xf3ba'):
+            for analyzer in (None, 'english', 'polish'):
+                for region_id in (None, mkt.regions.FRA.id):
+                    for autocomplete in (False, True):
+                        eq_(filter_.compile_query(
+                            q, analyzer, region_id,
+                            autocomplete=autocomplete).to_dict(),
+                            filter_.build_query(
+                                q, analyzer, region_id,
+                                autocomplete=autocomplete).to_dict())
+
+    def test_compiled_once_per_shape(self):
+        filter_ = SearchQueryFilter()
+        filter_._compiled = {}
+        filter_.compile_query(u'term', 'english', None)
+        with mock.patch.object(filter_, 'build_query') as build_query:
+            filter_.compile_query(u'other', 'english', None)
+            ok_(not build_query.called)
+            filter_.compile_query(u'other terms', 'english', None)
+            ok_(build_query.called)
+
+    @override_settings(SEARCH_AUTOCOMPLETE=True)
+    def test_autocomplete(self):
+        self.view_class = SuggestionsView
+        qs = self._filter(data={'q': 'term'})
+        should = (qs['query']['function_score']['query']['bool']['should'])
+        ok_({'match': {'name.autocomplete': {'query': 'term', 'boost': 1.5,
+                                             'operator': 'and'}}}
+            in should)
+        ok_({'match': {'name.shingle': {'query': 'term', 'boost': 2,
+                                        'fuzziness': 'AUTO',
+                                        'prefix_length': 1}}}
+            in should)
+        qs_str = json.dumps(qs)
+        ok_('prefix"' not in qs_str)
+        ok_('fuzzy' not in qs_str)
+
+    def test_autocomplete_disabled(self):
+        self.view_class = SuggestionsView
+        qs = self._filter(data={'q': 'term'})
+        ok_('autocomplete' not in json.dumps(qs))
+
 
 class TestFormFilter(FilterTestsBase):
 
@@ -1,7 +1,9 @@
+import mock
 from nose.tools import eq_
 
 from mkt.search.indexers import BaseIndexer
 from mkt.site.tests import TestCase
+from mkt.webapps.indexers import WebappIndexer
 
 
 class TestBaseIndexer(TestCase):
@@ -13,3 +15,20 @@ class TestBaseIndexer(TestCase):
         es1 = self.indexer().get_es()
         es2 = self.indexer().get_es()
         eq_(id(es1), id(es2))
+
+    @mock.patch('mkt.search.indexers.update_search_generation')
+    @mock.patch('mkt.search.indexers.bulk_index')
+    def test_generation_updated_once_refreshed(self, bulk_index,
+                                               update_search_generation):
+        es = mock.Mock()
+        calls = mock.Mock()
+        calls.attach_mock(es, 'es')
+        calls.attach_mock(bulk_index, 'bulk_index')
+        calls.attach_mock(update_search_generation, 'update')
+        WebappIndexer.index({'id': 1}, id_=1, es=es, index='index')
+        WebappIndexer.bulk_index([{'id': 1}], es=es, index='index')
+        WebappIndexer.unindex(1, es=es, index='index')
+        eq_([call[0] for call in calls.mock_calls], [
+            'es.index', 'es.indices.refresh', 'update',
+            'bulk_index', 'es.indices.refresh', 'update',
+            'es.delete', 'es.indices.refresh', 'update'])
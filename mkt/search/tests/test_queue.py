@@ -0,0 +1,70 @@
+from django.test.utils import override_settings
+
+import mock
+from nose.tools import eq_, ok_
+
+from mkt.search import queue
+from mkt.site.tests import TestCase
+from mkt.webapps.indexers import WebappIndexer
+from mkt.webapps.tasks import index_webapps
+
+
+@mock.patch.object(index_webapps, 'apply_async')
+class TestIndexingQueue(TestCase):
+
+    def tearDown(self):
+        queue.discard_collected()
+        super(TestIndexingQueue, self).tearDown()
+
+    def test_not_collecting(self, apply_async):
+        index_webapps.delay([1])
+        apply_async.assert_called_once_with(args=[[1]], countdown=None)
+
+    def test_coalesced(self, apply_async):
+        queue.start_request()
+        index_webapps.delay([3, 1])
+        index_webapps.delay([1])
+        index_webapps.delay([2])
+        ok_(not apply_async.called)
+        queue.send_collected()
+        apply_async.assert_called_once_with(args=[[1, 2, 3]], countdown=None)
+
+    def test_nested(self, apply_async):
+        queue.start_request()
+        index_webapps.delay([1])
+        # A task running inside the request sends its own ids.
+        queue.start_collecting()
+        index_webapps.delay([2])
+        queue.send_collected()
+        apply_async.assert_called_once_with(args=[[2]], countdown=None)
+        queue.send_collected()
+        eq_(apply_async.call_args[1], {'args': [[1]], 'countdown': None})
+
+    def test_discarded(self, apply_async):
+        queue.start_request()
+        index_webapps.delay([1])
+        queue.discard_collected()
+        queue.send_collected()
+        ok_(not apply_async.called)
+
+    @override_settings(INDEXING_DEBOUNCE=5)
+    def test_debounce(self, apply_async):
+        index_webapps.delay([1, 2])
+        apply_async.assert_called_once_with(args=[[1, 2]], countdown=5)
+        # Already waiting to be indexed.
+        index_webapps.delay([1, 3])
+        eq_(apply_async.call_args[1], {'args': [[3]], 'countdown': 5})
+        # Running the task releases the ids.
+        with mock.patch('mkt.webapps.tasks.WebappIndexer.index_ids'):
+            index_webapps([1])
+        index_webapps.delay([1])
+        eq_(apply_async.call_args[1], {'args': [[1]], 'countdown': 5})
+        eq_(apply_async.call_count, 3)
+
+    @override_settings(INDEXING_DEBOUNCE=5)
+    def test_debounce_per_indexer(self, apply_async):
+        with mock.patch.object(queue, 'cache') as cache_mock:
+            cache_mock.get_many.return_value = {}
+            queue.send(index_webapps, [1], (WebappIndexer,))
+        key = cache_mock.set_many.call_args[0][0].keys()[0]
+        eq_(key, 'index:pending:%s:WebappIndexer:1' % index_webapps.name)
@@ -1,12 +1,19 @@
+import json
 from math import log10
 
+import mock
+from elasticsearch import TransportError
+from elasticsearch.helpers import BulkIndexError
+from elasticsearch.serializer import JSONSerializer
+from elasticsearch_dsl import Search
 from mock import Mock
-from nose.tools import eq_
+from nose.tools import eq_, ok_
 
 from mkt.constants.base import STATUS_REJECTED
 from mkt.site.tests import TestCase
 from mkt.site.utils import app_factory
-from mkt.search.utils import get_boost, get_popularity, get_trending
+from mkt.search.utils import (bulk_index, get_boost, get_popularity,
+                              get_trending, msearch)
 from mkt.websites.utils import website_factory
 
 
@@ -71,3 +78,96 @@ class TestSearchUtils(TestCase):
         website = website_factory()
         website.popularity.create(region=0, value=1000.0)
         eq_(get_boost(website), log10(1 + 1000) * 4)
+
+
+class TestMsearch(TestCase):
+
+    def response(self, ids):
+        return {'took': 1, 'hits': {'total': len(ids), 'hits': [
+            {'_id': str(id_), '_source': {'id': id_}} for id_ in ids]}}
+
+    def test_msearch(self):
+        es = Mock()
+        es.msearch.return_value = {'responses': [self.response([1, 2]),
+                                                 self.response([3])]}
+        first = Search().filter('term', id=1)
+        second = Search()[:11]
+        responses = msearch(es, [(['a', 'b'], first), (None, second)])
+
+        eq_(es.msearch.call_args[1]['body'], [
+            {'index': ['a', 'b']}, first.to_dict(), {}, second.to_dict()])
+        eq_([hit.id for hit in responses[0].hits], [1, 2])
+        eq_(responses[1].hits.total, 1)
+
+    def test_msearch_error(self):
+        es = Mock()
+        es.msearch.return_value = {'responses': [{'error': 'Oops'}]}
+        with self.assertRaises(TransportError):
+            msearch(es, [(None, Search())])
+
+
+class TestBulkIndex(TestCase):
+
+    def actions(self, n):
+        return ({'_index': 'apps', '_type': 'webapp', '_id': i,
+                 '_source': {'id': i}} for i in xrange(n))
+
+    def es(self, *responses):
+        es = Mock()
+        es.transport.serializer = JSONSerializer()
+        es.bulk.side_effect = responses
+        return es
+
+    def ok(self, n, status=200):
+        return {'items': [{'index': {'status': status}}] * n}
+
+    def bodies(self, es):
+        return [call[1]['body'] for call in es.bulk.call_args_list]
+
+    def test_bulk_index(self):
+        es = self.es(self.ok(3))
+        bulk_index(es, self.actions(3))
+        eq_(es.bulk.call_count, 1)
+        lines = self.bodies(es)[0].splitlines()
+        eq_(len(lines), 6)
+        eq_(json.loads(lines[0]),
+            {'index': {'_index': 'apps', '_type': 'webapp', '_id': 0}})
+        eq_(json.loads(lines[1]), {'id': 0})
+
+    def test_batches_by_size(self):
+        es = self.es(self.ok(1))
+        bulk_index(es, self.actions(1))
+        size = len(self.bodies(es)[0])
+
+        es = self.es(self.ok(2), self.ok(2), self.ok(1))
+        bulk_index(es, self.actions(5), max_bytes=size * 2)
+        eq_([len(body.splitlines()) for body in self.bodies(es)], [4, 4, 2])
+
+    def test_threads(self):
+        es = self.es(*[self.ok(1)] * 5)
+        bulk_index(es, self.actions(5), threads=3, max_bytes=1)
+        eq_(es.bulk.call_count, 5)
+
+    @mock.patch('mkt.search.utils.time.sleep')
+    def test_retry_rejected(self, sleep):
+        es = self.es({'items': [{'index': {'status': 200}},
+                                {'index': {'status': 429}}]},
+                     self.ok(1))
+        bulk_index(es, self.actions(2))
+        eq_(es.bulk.call_count, 2)
+        # Only the rejected document is sent again.
+        eq_(json.loads(self.bodies(es)[1].splitlines()[1]), {'id': 1})
+        ok_(sleep.called)
+
+    @mock.patch('mkt.search.utils.time.sleep')
+    def test_retry_overloaded(self, sleep):
+        es = self.es(TransportError(429, 'Too many requests'), self.ok(2))
+        bulk_index(es, self.actions(2))
+        eq_(es.bulk.call_count, 2)
+
+    @mock.patch('mkt.search.utils.time.sleep')
+    def test_errors(self, sleep):
+        es = self.es({'items': [{'index': {'status': 400, 'error': 'Oops'}}]})
+        with self.assertRaises(BulkIndexError):
+            bulk_index(es, self.actions(1))
+        ok_(not sleep.called)
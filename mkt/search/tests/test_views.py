@@ -7,6 +7,7 @@ from django.core.urlresolvers import reverse
 from django.db import transaction
 from django.http import QueryDict
 from django.test.client import RequestFactory
+from django.test.utils import override_settings
 
 from mock import patch
 from nose.tools import eq_, ok_
@@ -305,9 +306,10 @@ class TestSearchView(RestOAuth, ESTestCase):
         ok_('latest_version' not in obj)
         ok_('reviewer_flags' not in obj)
 
-    @patch('mkt.webapps.models.Webapp.get_excluded_region_ids')
-    def test_upsell(self, get_excluded_region_ids):
-        get_excluded_region_ids.return_value = []
+    @patch('mkt.webapps.models.get_excluded_region_ids_in_bulk')
+    def test_upsell(self, get_excluded_region_ids_in_bulk):
+        get_excluded_region_ids_in_bulk.side_effect = (
+            lambda ids: dict((id_, []) for id_ in ids))
         upsell = app_factory()
         self.make_premium(upsell)
         AddonUpsell.objects.create(free=self.webapp, premium=upsell)
@@ -902,6 +904,36 @@ class TestSearchView(RestOAuth, ESTestCase):
         eq_(res.json['objects'][0]['id'], app2.id)
         eq_(res.json['objects'][1]['id'], app1.id)
 
+    @override_settings(SEARCH_CACHE_TIMEOUT=60)
+    def test_cached(self):
+        res = self.anon.get(self.url)
+        with patch('mkt.search.utils.Search.execute') as execute:
+            cached_res = self.anon.get(self.url)
+        ok_(not execute.called)
+        eq_(cached_res.status_code, 200)
+        eq_(cached_res.json, res.json)
+
+    @override_settings(SEARCH_CACHE_TIMEOUT=60)
+    def test_cached_per_query(self):
+        self.anon.get(self.url)
+        res = self.anon.get(self.url, {'q': 'nothingmatchesthis'})
+        eq_(res.json['objects'], [])
+
+    @override_settings(SEARCH_CACHE_TIMEOUT=60)
+    def test_cache_invalidated(self):
+        self.anon.get(self.url)
+        self.webapp.update(status=mkt.STATUS_APPROVED)
+        self.refresh('webapp')
+        res = self.anon.get(self.url)
+        eq_(res.json['objects'], [])
+
+    @override_settings(SEARCH_CACHE_TIMEOUT=60)
+    def test_not_cached_authenticated(self):
+        with patch.object(SearchView, 'get_cache_key') as get_cache_key:
+            res = self.client.get(self.url)
+        eq_(res.status_code, 200)
+        ok_(not get_cache_key.called)
+
 
 class TestSearchViewFeatures(RestOAuth, ESTestCase):
     fixtures = fixture('user_2519', 'webapp_337141')
@@ -1,7 +1,17 @@
+import itertools
+import time
+import uuid
 from math import log10
+from multiprocessing.pool import ThreadPool
+from threading import BoundedSemaphore
 
+from django.conf import settings
+from django.core.cache import cache
 from django.core.exceptions import ObjectDoesNotExist
 
+from elasticsearch import TransportError
+from elasticsearch.helpers import BulkIndexError
+from elasticsearch_dsl.result import Response
 from elasticsearch_dsl.search import Search as dslSearch
 from django_statsd.clients import statsd
 
@@ -10,6 +20,24 @@ from mkt.constants.base import VALID_STATUSES
 
 BOOST_MULTIPLIER_FOR_PUBLIC_CONTENT = 4.0
 
+# The cache key holding the current generation of the indexes. Cached search
+# results include the generation in their key, so changing it whenever
+# something is written to an index or an alias is moved invalidates all of
+# them at once.
+SEARCH_GENERATION_KEY = 'search:generation'
+
+
+def get_search_generation():
+    generation = cache.get(SEARCH_GENERATION_KEY)
+    if generation is None:
+        cache.add(SEARCH_GENERATION_KEY, uuid.uuid4().hex, None)
+        generation = cache.get(SEARCH_GENERATION_KEY)
+    return generation
+
+
+def update_search_generation():
+    cache.set(SEARCH_GENERATION_KEY, uuid.uuid4().hex, None)
+
 
 class Search(dslSearch):
 
@@ -20,6 +48,139 @@ class Search(dslSearch):
             return results
 
 
+def msearch(es, searches):
+    """
+    Execute several searches with a single _msearch request to ES.
+
+    `searches` is a list of (index, search) tuples, index being an index name,
+    a list of index names or None to search all indices. Returns the list of
+    elasticsearch_dsl responses, in the same order.
+    """
+    body = []
+    for index, search in searches:
+        body.append({'index': index} if index else {})
+        body.append(search.to_dict())
+
+    with statsd.timer('search.msearch'):
+        raw = es.msearch(body=body)
+
+    responses = []
+    for res in raw['responses']:
+        if 'error' in res:
+            raise TransportError(500, res['error'])
+        statsd.timing('search.took', res['took'])
+        responses.append(Response(res))
+    return responses
+
+
+def _bulk_batches(es, actions, max_bytes):
+    """
+    Serialize bulk index actions and group them in batches of at most
+    `max_bytes`. An action bigger than that gets a batch of its own.
+    """
+    serializer = es.transport.serializer
+    batch, size = [], 0
+    for action in actions:
+        source = action.pop('_source')
+        lines = (serializer.dumps({'index': action}), serializer.dumps(source))
+        length = len(lines[0]) + len(lines[1]) + 2
+        if batch and size + length > max_bytes:
+            yield batch, size
+            batch, size = [], 0
+        batch.append(lines)
+        size += length
+    if batch:
+        yield batch, size
+
+
+def _send_bulk_batch(es, batch, size):
+    """
+    Send a batch of serialized actions with a bulk request, retrying the
+    actions ES rejected because it's overloaded. Returns the errors.
+    """
+    errors = []
+    for attempt in range(settings.ES_BULK_RETRIES + 1):
+        if attempt:
+            statsd.incr('search.bulk.retry')
+            time.sleep(0.5 * 2 ** (attempt - 1))
+        body = '\n'.join(itertools.chain.from_iterable(batch)) + '\n'
+        try:
+            with statsd.timer('search.bulk.batch'):
+                res = es.bulk(body=body)
+        except TransportError as e:
+            if e.status_code != 429:
+                raise
+            statsd.incr('search.bulk.rejected', len(batch))
+            continue
+        statsd.incr('search.bulk.bytes', size)
+
+        rejected = []
+        for lines, item in zip(batch, res['items']):
+            result = item.values()[0]
+            if result.get('status') == 429:
+                rejected.append(lines)
+            elif 'error' in result:
+                errors.append(item)
+        statsd.incr('search.bulk.docs', len(batch) - len(rejected))
+        if errors:
+            statsd.incr('search.bulk.errors', len(errors))
+        if not rejected:
+            return errors
+        statsd.incr('search.bulk.rejected', len(rejected))
+        batch = rejected
+        size = sum(len(a) + len(b) + 2 for a, b in batch)
+
+    # Still rejected after all the retries.
+    statsd.incr('search.bulk.errors', len(batch))
+    return errors + [{'index': {'status': 429, 'error': 'Rejected'}}
+                     for lines in batch]
+
+
+def bulk_index(es, actions, threads=None, max_bytes=None):
+    """
+    Send bulk index actions to ES, `actions` being any iterable.
+
+    The actions are sent in batches of at most `max_bytes` as they are
+    consumed, by `threads` threads, defaulting to settings.ES_BULK_MAX_BYTES
+    and settings.ES_BULK_THREADS. Raises BulkIndexError if some documents
+    failed to index.
+    """
+    threads = threads or settings.ES_BULK_THREADS
+    batches = _bulk_batches(es, actions,
+                            max_bytes or settings.ES_BULK_MAX_BYTES)
+    errors = []
+
+    if threads <= 1:
+        for batch, size in batches:
+            errors.extend(_send_bulk_batch(es, batch, size))
+    else:
+        # Don't serialize more batches than the threads can send, so that
+        # the memory used doesn't depend on the number of actions.
+        slots = BoundedSemaphore(threads * 2)
+
+        def send(batch, size):
+            try:
+                return _send_bulk_batch(es, batch, size)
+            finally:
+                slots.release()
+
+        pool = ThreadPool(threads)
+        results = []
+        try:
+            for batch, size in batches:
+                slots.acquire()
+                results.append(pool.apply_async(send, (batch, size)))
+        finally:
+            pool.close()
+            pool.join()
+        for result in results:
+            errors.extend(result.get())
+
+    if errors:
+        raise BulkIndexError('%i document(s) failed to index.' % len(errors),
+                             errors)
+
+
 def _property_value_by_region(obj, region=None, property=None):
     if obj.is_dummy_content_for_qa():
         # Apps and Websites set up by QA for testing should never be considered
@@ -61,15 +222,19 @@ def get_trending(obj, region=None):
     return _property_value_by_region(obj, region=region, property='trending')
 
 
-def get_boost(obj):
+def get_boost(obj, popularity=None):
     """
     Returns the boost used in Elasticsearch for this app.
 
     The boost is based on a few factors, the most important is number of
     installs. We use log10 so the boost doesn't completely overshadow any
     other boosting we do at query time.
+
+    The global popularity can be passed if it's already known.
     """
-    boost = max(log10(1 + get_popularity(obj)), 1.0)
+    if popularity is None:
+        popularity = get_popularity(obj)
+    boost = max(log10(1 + popularity), 1.0)
 
     # We give a little extra boost to approved apps.
     if obj.status in VALID_STATUSES:
@@ -1,11 +1,16 @@
 from __future__ import absolute_import
 
+import hashlib
 import json
+import time
 
+from django.conf import settings
+from django.core.cache import cache
 from django.db.transaction import non_atomic_requests
 from django.http import HttpResponse
 from django.utils.functional import lazy
 
+from django_statsd.clients import statsd
 from elasticsearch_dsl import filter as es_filter
 from rest_framework.generics import ListAPIView
 from rest_framework.permissions import AllowAny
@@ -27,7 +32,7 @@ from mkt.search.filters import (DeviceTypeFilter, HomescreenFilter,
                                 RegionFilter, SearchQueryFilter, SortingFilter,
                                 ValidAppsFilter)
 from mkt.search.serializers import DynamicSearchSerializer
-from mkt.search.utils import Search
+from mkt.search.utils import get_search_generation, Search
 from mkt.translations.helpers import truncate
 from mkt.webapps import indexers
 from mkt.webapps.serializers import (ESAppSerializer, RocketbarESAppSerializer,
@@ -51,10 +56,53 @@ class SearchView(CORSMixin, MarketplaceView, ListAPIView):
 
     serializer_class = ESAppSerializer
     form_class = ApiSearchForm
+    # Whether SearchQueryFilter uses its cheaper autocomplete mode, for
+    # search-as-you-type.
+    autocomplete = False
 
     def get_queryset(self):
         return indexers.WebappIndexer.search()
 
+    def get_cache_key(self, request):
+        """
+        Return the key of the cached results for this request. The path
+        covers the API version and the view, the query string covers the
+        query, device, feature profile, sorting and pagination parameters.
+        """
+        parts = [
+            get_search_generation(),
+            request.path,
+            request.REGION.slug,
+            getattr(request, 'LANG', ''),
+            sorted(request.query_params.lists()),
+        ]
+        return 'search:view:%s' % hashlib.md5(repr(parts)).hexdigest()
+
+    def list(self, request, *args, **kwargs):
+        # Anonymous results only depend on the request parameters, cache them
+        # for a little while. Authenticated users can see user-specific data
+        # or non-public apps.
+        if (not settings.SEARCH_CACHE_TIMEOUT or
+                request.user.is_authenticated()):
+            return super(SearchView, self).list(request, *args, **kwargs)
+
+        key = self.get_cache_key(request)
+        cached = cache.get(key)
+        if cached is not None:
+            data, took = cached
+            statsd.incr('search.view.cache.hit')
+            statsd.timing('search.view.cache.saved', took)
+            return Response(data)
+
+        statsd.incr('search.view.cache.miss')
+        start = time.time()
+        response = super(SearchView, self).list(request, *args, **kwargs)
+        if response.status_code == 200:
+            took = int((time.time() - start) * 1000)
+            cache.set(key, (response.data, took),
+                      settings.SEARCH_CACHE_TIMEOUT)
+        return response
+
     @classmethod
     def as_view(cls, **kwargs):
         # Make all search views non_atomic: they should not need the db, or
@@ -177,6 +225,7 @@ class FeaturedSearchView(SearchView):
 class SuggestionsView(SearchView):
     authentication_classes = []
     serializer_class = SuggestionsESAppSerializer
+    autocomplete = True
 
     def list(self, request, *args, **kwargs):
         query = request.GET.get('q', '')
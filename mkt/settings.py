@@ -695,6 +695,14 @@ ENABLE_API_ERROR_SERVICE = False
 ENGAGE_ROBOTS = True
 
 # ElasticSearch
+# The maximum size of the bulk requests sent to Elasticsearch when indexing,
+# in bytes.
+ES_BULK_MAX_BYTES = 5 * 1024 * 1024
+# How many times documents Elasticsearch rejects because it's overloaded are
+# sent again, waiting a bit longer each time.
+ES_BULK_RETRIES = 3
+# How many bulk requests are sent in parallel when indexing.
+ES_BULK_THREADS = 4
 # Locally we typically don't run more than 1 elasticsearch node. So we set
 # replicas to zero.
 ES_DEFAULT_NUM_REPLICAS = 0
@@ -719,6 +727,27 @@ ES_TIMEOUT = 30
 # When True include full tracebacks in JSON. This is useful for QA on preview.
 EXPOSE_VALIDATOR_TRACEBACKS = True
 
+# How long each process keeps the sets of apps excluded from each region before
+# checking memcache for changes, in seconds.
+EXCLUDED_IN_CACHE_TIMEOUT = 60
+
+# How long the responses of the feed are cached, in seconds. They are also
+# invalidated when changes to the feed are indexed. Set to 0 to disable the
+# cache.
+FEED_CACHE_TIMEOUT = 60 * 5
+
+# How long a feed request waits for another one building the same response.
+FEED_CACHE_LOCK_TIMEOUT = 5
+
+# Serve the feed items and feed elements from documents built ahead of time
+# for each region and carrier, instead of querying them on each request.
+FEED_DOCUMENTS = True
+
+# How long to wait after changes to the feed are indexed before rebuilding the
+# feed documents, in seconds, so that a batch of changes rebuilds them once.
+# The previous documents are served until then.
+FEED_DOCUMENTS_DELAY = 5
+
 # The maximum file size that is shown inside the file viewer.
 FILE_VIEWER_SIZE_LIMIT = 1048576
 
@@ -783,6 +812,13 @@ os.environ['OAUTHLIB_INSECURE_TRANSPORT'] = '1'
 GEOIP_URL = ''
 GEOIP_DEFAULT_VAL = 'restofworld'
 GEOIP_DEFAULT_TIMEOUT = .2
+# A CSV file of country IP ranges, to resolve IPs in-process instead of calling
+# the GeoIP server, which is then only used for IPs missing from the file. Rows
+# are either `start,end,country_code` or the legacy GeoIP country CSV format.
+# The file is reloaded when it changes, checked at most every
+# GEOIP_DB_CHECK_INTERVAL seconds.
+GEOIP_DB_PATH = ''
+GEOIP_DB_CHECK_INTERVAL = 60
 
 # Credentials for accessing Google Analytics stats.
 GOOGLE_ANALYTICS_CREDENTIALS = {}
@@ -842,6 +878,11 @@ IARC_V2_STORE_PASSWORD = ''  # Private.
 IARC_V2_SUBMISSION_ENDPOINT = 'https://iarcdemo.azurewebsites.net/'
 
 
+# How long apps and other indexed objects waiting to be indexed are not
+# queued again, in seconds. Indexing tasks are delayed by that much, so that
+# changes made in the meantime are indexed at once. Set to 0 to disable.
+INDEXING_DEBOUNCE = 2
+
 # True when the Django app is running from the test suite.
 IN_TEST_SUITE = False
 
@@ -946,6 +987,13 @@ MINIFY_MOZMARKET = True
 MONOLITH_SERVER = os.getenv('MONOLITH_URL', 'http://localhost:9200')
 MONOLITH_INDEX = 'time_*'
 MONOLITH_MAX_DATE_RANGE = 365
+# How many monolith records are saved with each insert, and how often, in
+# seconds, records waiting in the buffer are saved.
+MONOLITH_BATCH_SIZE = 100
+MONOLITH_FLUSH_INTERVAL = 5
+# How many monolith records can wait to be saved by each process before new
+# ones get dropped. Set to 0 to save them right away instead.
+MONOLITH_BUFFER_SIZE = 10000
 
 # The issuer for unverified Persona email addresses.
 # We only trust one issuer to grant us unverified emails.
@@ -1046,6 +1094,15 @@ RTL_LANGUAGES = ('ar', 'fa', 'fa-IR', 'he')
 # Flip this on in your local settings to disable ES tests.
 RUN_ES_TESTS = True
 
+# Whether search-as-you-type uses the autocomplete sub-fields of the indexes
+# instead of prefix and fuzzy queries. Turn this on once the indexes have been
+# rebuilt with them.
+SEARCH_AUTOCOMPLETE = False
+
+# How long the results of anonymous searches are cached, in seconds. They are
+# also invalidated whenever an index changes. Set to 0 to disable.
+SEARCH_CACHE_TIMEOUT = 60
+
 # If this is False, tasks and other jobs that send non-critical emails should
 # use a fake email backend.
 SEND_REAL_EMAIL = False
@@ -1057,6 +1114,28 @@ SENTRY_DSN = None
 # database connection, only some values are supported.
 SERVICES_DATABASE = DATABASES['default']
 
+# The size of the database connection pool of each services process, and how
+# many more connections it can open when the pool is exhausted.
+SERVICES_DATABASE_POOL_SIZE = 5
+SERVICES_DATABASE_MAX_OVERFLOW = 10
+
+# The number of threads used to check the signature of receipts when running
+# the receipt verifier under gevent.
+SERVICES_DECODE_THREADS = 4
+
+# The number of cracked receipts each receipt verifier process keeps in
+# memory, and the maximum number of seconds a receipt is kept there.
+SERVICES_RECEIPT_CACHE_SIZE = 10000
+SERVICES_RECEIPT_CACHE_TIMEOUT = 60 * 60
+# The number of seconds a receipt that failed its signature check is kept
+# there. Keep it short, the failure can come from the signing server or a key
+# being replaced rather than from the receipt.
+SERVICES_RECEIPT_CACHE_INVALID_TIMEOUT = 60
+
+# The maximum number of receipts that can be sent to the receipt verifier in
+# a single batch.
+SERVICES_VERIFY_BATCH_LIMIT = 100
+
 SHORTER_LANGUAGES = {'en': 'en-US', 'ga': 'ga-IE', 'pt': 'pt-PT',
                      'sv': 'sv-SE', 'zh': 'zh-CN'}
 
@@ -4,11 +4,14 @@ import time
 from datetime import datetime
 
 from django.conf import settings
+from django.db import connection
 from django.db.models import Q
 
 import commonware.log
 import cronjobs
+import numpy
 from celery import chord
+from django_statsd.clients import statsd
 
 import mkt
 from lib.metrics import get_monolith_client
@@ -106,16 +109,20 @@ def clean_old_signed(seconds=60 * 60):
                 private_storage.delete(full)
 
 
-def _get_installs(app_id):
+def _get_installs(app_ids):
     """
-    Calculate popularity of app for all regions and per region.
+    Calculate popularity of apps for all regions and per region, using a
+    single Monolith query for all the apps.
 
     Returns value in the format of::
 
-        {'all': <global installs>,
-         <region_slug>: <regional installs>,
+        {<app_id>: {'all': <global installs>,
+                    <region_slug>: <regional installs>,
+                    ...},
          ...}
 
+    Apps without any installs are not in the result.
+
     """
     # How many days back do we include when calculating popularity.
     POPULARITY_PERIOD = 90
@@ -144,19 +151,29 @@ def _get_installs(app_id):
         'query': {
             'filtered': {
                 'query': {'match_all': {}},
-                'filter': {'term': {'app-id': app_id}}
+                'filter': {'terms': {'app-id': list(app_ids)}}
             }
         },
         'aggregations': {
-            'popular': popular,
-            'region': {
+            'app': {
                 'terms': {
-                    'field': 'region',
-                    # Add size so we get all regions, not just the top 10.
-                    'size': len(mkt.regions.ALL_REGIONS)
+                    'field': 'app-id',
+                    # Add size so we get all apps, not just the top 10.
+                    'size': len(app_ids)
                 },
                 'aggregations': {
-                    'popular': popular
+                    'popular': popular,
+                    'region': {
+                        'terms': {
+                            'field': 'region',
+                            # Add size so we get all regions, not just the top
+                            # 10.
+                            'size': len(mkt.regions.ALL_REGIONS)
+                        },
+                        'aggregations': {
+                            'popular': popular
+                        }
+                    }
                 }
             }
         },
@@ -170,22 +187,65 @@ def _get_installs(app_id):
         return {}
 
     if 'aggregations' not in res:
-        task_log.error('No installs for app {}'.format(app_id))
+        task_log.error('No installs for apps {0}'.format(app_ids))
         return {}
 
-    results = {
-        'all': res['aggregations']['popular']['total_installs']['value']
-    }
-
-    if 'region' in res['aggregations']:
-        for regional_res in res['aggregations']['region']['buckets']:
-            region_slug = regional_res['key']
-            popular = regional_res['popular']['total_installs']['value']
-            results[region_slug] = popular
+    results = {}
+    for app_res in res['aggregations']['app']['buckets']:
+        app_results = results[int(app_res['key'])] = {
+            'all': app_res['popular']['total_installs']['value']
+        }
+        if 'region' in app_res:
+            for regional_res in app_res['region']['buckets']:
+                region_slug = regional_res['key']
+                popular = regional_res['popular']['total_installs']['value']
+                app_results[region_slug] = popular
 
     return results
 
 
+def _save_scores(model, app_ids, scores):
+    """
+    Save the scores of a chunk of apps in the table of `model`, which can be
+    `Installs` or `Trending`, using a single INSERT ... ON DUPLICATE KEY
+    UPDATE, and delete the existing rows of those apps that didn't get a
+    positive score.
+
+    `scores` is in the format returned by `_get_installs`.
+
+    Returns the ids of the apps that got at least one positive score.
+
+    """
+    # MySQL drops the microseconds, make sure the rows we just saved aren't
+    # older than `now`.
+    now = datetime.now().replace(microsecond=0)
+    regions = [('all', 0)] + [(region.slug, region.id) for region in
+                              mkt.regions.REGIONS_DICT.values()]
+
+    rows = []
+    for app_id in app_ids:
+        app_scores = scores.get(app_id, {})
+        for slug, region_id in regions:
+            value = app_scores.get(slug)
+            if value > 0:
+                rows.append((app_id, region_id, value, now, now))
+
+    if rows:
+        sql = """INSERT INTO {table} (addon_id, region, value, created,
+                                      modified)
+                 VALUES (%s, %s, %s, %s, %s)
+                 ON DUPLICATE KEY UPDATE value=VALUES(value),
+                                         modified=VALUES(modified)"""
+        cursor = connection.cursor()
+        cursor.executemany(sql.format(table=model._meta.db_table), rows)
+
+    # The value is <= 0 for all the other rows of those apps, so we can just
+    # remove them.
+    model.objects.filter(addon__in=app_ids, modified__lt=now).delete()
+
+    return sorted(set(row[0] for row in rows))
+
+
 @cronjobs.register
 @use_master
 def update_app_installs():
@@ -193,9 +253,10 @@ def update_app_installs():
     Update app install counts for all published apps.
 
     We break these into chunks so we can bulk index them. Each chunk will
-    process the apps in it and reindex them in bulk. After all the chunks are
-    processed we find records that haven't been updated and purge/reindex those
-    so we nullify their values.
+    fetch the installs of all the apps in it from Monolith in one query, save
+    them in bulk and reindex them in bulk. After all the chunks are processed
+    we find records that haven't been updated and purge/reindex those so we
+    nullify their values.
 
     """
     chunk_size = 100
@@ -205,55 +266,17 @@ def update_app_installs():
                      .values_list('id', flat=True))
 
     for chunk in chunked(ids, chunk_size):
+        t_start = time.time()
 
-        count = 0
-        times = []
-        reindex_ids = []
-
-        for app in Webapp.objects.filter(id__in=chunk).no_transforms():
-
-            reindex = False
-            count += 1
-            now = datetime.now()
-            t_start = time.time()
-
-            scores = _get_installs(app.id)
-
-            # Update global installs, then per-region installs below.
-            value = scores.get('all')
-            if value > 0:
-                reindex = True
-                installs, created = app.popularity.get_or_create(
-                    region=0, defaults={'value': value})
-                if not created:
-                    installs.update(value=value, modified=now)
-            else:
-                # The value is <= 0 so we can just ignore it.
-                app.popularity.filter(region=0).delete()
-
-            for region in mkt.regions.REGIONS_DICT.values():
-                value = scores.get(region.slug)
-                if value > 0:
-                    reindex = True
-                    installs, created = app.popularity.get_or_create(
-                        region=region.id, defaults={'value': value})
-                    if not created:
-                        installs.update(value=value, modified=now)
-                else:
-                    # The value is <= 0 so we can just ignore it.
-                    app.popularity.filter(region=region.id).delete()
-
-            if reindex:
-                reindex_ids.append(app.id)
-
-            times.append(time.time() - t_start)
+        scores = _get_installs(chunk)
+        reindex_ids = _save_scores(Installs, chunk, scores)
 
         # Now reindex the apps that actually have a popularity value.
         if reindex_ids:
             WebappIndexer.run_indexing(reindex_ids)
 
-        log.info('Installs calculated for %s apps. Avg time overall: '
-                 '%0.2fs' % (count, sum(times) / count))
+        log.info('Installs calculated for %s apps. Time overall: '
+                 '%0.2fs' % (len(chunk), time.time() - t_start))
 
     # Purge any records that were not updated.
     #
@@ -272,9 +295,33 @@ def update_app_installs():
         WebappIndexer.run_indexing(ids)
 
 
-def _get_trending(app_id):
+# How many app installs are required in the prior week to be considered
+# "trending". Adjust this as total Marketplace app installs increases.
+#
+# Note: AMO uses 1000.0 for add-ons.
+PRIOR_WEEK_INSTALL_THRESHOLD = 100.0
+
+
+def _score_trending(week1, week3):
+    """
+    Compute the trending scores from arrays of installs, all the scores of
+    all the apps being computed at once.
+
+    `week1` holds the installs of the last week and `week3` the installs of
+    the 3 weeks before, averaged per week.
+
+    """
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        scores = numpy.where(week3 > 1.0, (week1 - week3) / week3, 0.0)
+    # If last week app installs are < 100, this app isn't trending.
+    scores[week1 < PRIOR_WEEK_INSTALL_THRESHOLD] = 0.0
+    return numpy.maximum(scores, 0.0)
+
+
+def _get_trending(app_ids):
     """
-    Calculate trending for app for all regions and per region.
+    Calculate trending for apps for all regions and per region, using a
+    single Monolith query for all the apps.
 
     a = installs from 8 days ago to 1 day ago
     b = installs from 29 days ago to 9 days ago, averaged per week
@@ -282,17 +329,14 @@ def _get_trending(app_id):
 
     Returns value in the format of::
 
-        {'all': <global trending score>,
-         <region_slug>: <regional trending score>,
+        {<app_id>: {'all': <global trending score>,
+                    <region_slug>: <regional trending score>,
+                    ...},
          ...}
 
-    """
-    # How many app installs are required in the prior week to be considered
-    # "trending". Adjust this as total Marketplace app installs increases.
-    #
-    # Note: AMO uses 1000.0 for add-ons.
-    PRIOR_WEEK_INSTALL_THRESHOLD = 100.0
+    Apps that are not trending globally are not in the result.
 
+    """
     client = get_monolith_client()
 
     week1 = {
@@ -334,21 +378,31 @@ def _get_trending(app_id):
         'query': {
             'filtered': {
                 'query': {'match_all': {}},
-                'filter': {'term': {'app-id': app_id}}
+                'filter': {'terms': {'app-id': list(app_ids)}}
             }
         },
         'aggregations': {
-            'week1': week1,
-            'week3': week3,
-            'region': {
+            'app': {
                 'terms': {
-                    'field': 'region',
-                    # Add size so we get all regions, not just the top 10.
-                    'size': len(mkt.regions.ALL_REGIONS)
+                    'field': 'app-id',
+                    # Add size so we get all apps, not just the top 10.
+                    'size': len(app_ids)
                 },
                 'aggregations': {
                     'week1': week1,
-                    'week3': week3
+                    'week3': week3,
+                    'region': {
+                        'terms': {
+                            'field': 'region',
+                            # Add size so we get all regions, not just the top
+                            # 10.
+                            'size': len(mkt.regions.ALL_REGIONS)
+                        },
+                        'aggregations': {
+                            'week1': week1,
+                            'week3': week3
+                        }
+                    }
                 }
             }
         },
@@ -362,42 +416,48 @@ def _get_trending(app_id):
         return {}
 
     if 'aggregations' not in res:
-        task_log.error('No installs for app {}'.format(app_id))
+        task_log.error('No installs for apps {0}'.format(app_ids))
         return {}
 
-    def _score(week1, week3):
-        # If last week app installs are < 100, this app isn't trending.
-        if week1 < PRIOR_WEEK_INSTALL_THRESHOLD:
-            return 0.0
-
-        score = 0.0
-        if week3 > 1.0:
-            score = (week1 - week3) / week3
-        if score < 0.0:
-            score = 0.0
-        return score
-
-    # Global trending score.
-    week1 = res['aggregations']['week1']['total_installs']['value']
-    week3 = res['aggregations']['week3']['total_installs']['value'] / 3.0
-
-    if week1 < PRIOR_WEEK_INSTALL_THRESHOLD:
-        # If global installs over the last week aren't over 100, we
-        # short-circuit and return a zero-like value as this is not a trending
-        # app by definition. Since global installs aren't above 100, per-region
-        # installs won't be either.
-        return {}
-
-    results = {
-        'all': _score(week1, week3)
-    }
-
-    if 'region' in res['aggregations']:
-        for regional_res in res['aggregations']['region']['buckets']:
-            region_slug = regional_res['key']
-            week1 = regional_res['week1']['total_installs']['value']
-            week3 = regional_res['week3']['total_installs']['value'] / 3.0
-            results[region_slug] = _score(week1, week3)
+    # Build apps x regions arrays of installs, the first column being the
+    # global installs.
+    slugs = ['all'] + [region.slug for region in
+                       mkt.regions.REGIONS_DICT.values()]
+    columns = dict((slug, i) for i, slug in enumerate(slugs))
+    buckets = res['aggregations']['app']['buckets']
+    week1 = numpy.zeros((len(buckets), len(slugs)))
+    week3 = numpy.zeros((len(buckets), len(slugs)))
+    present = numpy.zeros((len(buckets), len(slugs)), dtype=bool)
+
+    apps = []
+    for row, app_res in enumerate(buckets):
+        apps.append(int(app_res['key']))
+        week1[row, 0] = app_res['week1']['total_installs']['value']
+        week3[row, 0] = app_res['week3']['total_installs']['value']
+        present[row, 0] = True
+        if 'region' in app_res:
+            for regional_res in app_res['region']['buckets']:
+                col = columns.get(regional_res['key'])
+                if col is None:
+                    continue
+                week1[row, col] = regional_res['week1']['total_installs'][
+                    'value']
+                week3[row, col] = regional_res['week3']['total_installs'][
+                    'value']
+                present[row, col] = True
+
+    scores = _score_trending(week1, week3 / 3.0)
+
+    results = {}
+    for row, app_id in enumerate(apps):
+        # If global installs over the last week aren't over the threshold,
+        # this is not a trending app by definition. Since global installs
+        # aren't above it, per-region installs won't be either.
+        if week1[row, 0] < PRIOR_WEEK_INSTALL_THRESHOLD:
+            continue
+        results[app_id] = dict(
+            (slug, float(scores[row, col])) for col, slug in enumerate(slugs)
+            if present[row, col])
 
     return results
 
@@ -409,74 +469,43 @@ def update_app_trending():
     Update trending for all published apps.
 
     We break these into chunks so we can bulk index them. Each chunk will
-    process the apps in it and reindex them in bulk. After all the chunks are
-    processed we find records that haven't been updated and purge/reindex those
-    so we nullify their values.
+    fetch the trending scores of all the apps in it from Monolith in one
+    query, save them in bulk and reindex them in bulk. After all the chunks
+    are processed we find records that haven't been updated and purge/reindex
+    those so we nullify their values.
 
     """
     chunk_size = 100
+    times = {'fetch': 0.0, 'save': 0.0, 'index': 0.0}
 
     ids = list(Webapp.objects.filter(status=mkt.STATUS_PUBLIC,
                                      disabled_by_user=False)
                      .values_list('id', flat=True))
+    count = len(ids)
 
     for chunk in chunked(ids, chunk_size):
-
-        count = 0
-        times = []
-        reindex_ids = []
-
-        for app in Webapp.objects.filter(id__in=chunk).no_transforms():
-
-            reindex = False
-            count += 1
-            now = datetime.now()
-            t_start = time.time()
-
-            scores = _get_trending(app.id)
-
-            # Update global trending, then per-region trending below.
-            value = scores.get('all')
-            if value > 0:
-                reindex = True
-                trending, created = app.trending.get_or_create(
-                    region=0, defaults={'value': value})
-                if not created:
-                    trending.update(value=value, modified=now)
-            else:
-                # The value is <= 0 so the app is not trending. Let's remove it
-                # from the trending table.
-                app.trending.filter(region=0).delete()
-
-            for region in mkt.regions.REGIONS_DICT.values():
-                value = scores.get(region.slug)
-                if value > 0:
-                    reindex = True
-                    trending, created = app.trending.get_or_create(
-                        region=region.id, defaults={'value': value})
-                    if not created:
-                        trending.update(value=value, modified=now)
-                else:
-                    # The value is <= 0 so the app is not trending.
-                    # Let's remove it from the trending table.
-                    app.trending.filter(region=region.id).delete()
-
-            times.append(time.time() - t_start)
-
-            if reindex:
-                reindex_ids.append(app.id)
+        t_start = time.time()
+        scores = _get_trending(chunk)
+        t_fetch = time.time()
+        reindex_ids = _save_scores(Trending, chunk, scores)
+        t_save = time.time()
 
         # Now reindex the apps that actually have a trending score.
         if reindex_ids:
             WebappIndexer.run_indexing(reindex_ids)
+        t_index = time.time()
 
-        log.info('Trending calculated for %s apps. Avg time overall: '
-                 '%0.2fs' % (count, sum(times) / count))
+        times['fetch'] += t_fetch - t_start
+        times['save'] += t_save - t_fetch
+        times['index'] += t_index - t_save
+        log.info('Trending calculated for %s apps. Time overall: %0.2fs'
+                 % (len(chunk), t_index - t_start))
 
     # Purge any records that were not updated.
     #
     # Note: We force update `modified` even if no data changes so any records
     # with older modified times can be purged.
+    t_start = time.time()
     now = datetime.now()
     midnight = datetime(year=now.year, month=now.month, day=now.day)
 
@@ -488,6 +517,14 @@ def update_app_trending():
 
     for ids in chunked(purged_ids, chunk_size):
         WebappIndexer.run_indexing(ids)
+    times['purge'] = time.time() - t_start
+
+    phases = []
+    for phase, seconds in sorted(times.items()):
+        statsd.timing('webapps.cron.trending.%s' % phase, seconds * 1000)
+        phases.append('%s %0.2fs' % (phase, seconds))
+    log.info('Trending calculated for %s apps. Time per phase: %s'
+             % (count, ', '.join(phases)))
 
 
 @cronjobs.register
@@ -1,7 +1,8 @@
+import json
+from collections import defaultdict
 from operator import attrgetter
 
 from django.core.urlresolvers import reverse
-from django.db.models import Min
 
 import commonware.log
 from elasticsearch_dsl import F
@@ -227,27 +228,168 @@ class WebappIndexer(BaseIndexer):
         cls.attach_language_specific_analyzers(
             mapping, ('name', 'description'))
 
+        # Add search-as-you-type sub-fields.
+        cls.attach_autocomplete_mappings(mapping, ('name',))
+
         return mapping
 
     @classmethod
-    def extract_document(cls, pk=None, obj=None):
-        """Extracts the ElasticSearch index document for this instance."""
-        from mkt.webapps.models import (AppFeatures, attach_devices,
+    def get_related_data(cls, objs):
+        """
+        Fetch everything extract_document() needs for a list of apps, in a
+        constant number of queries. Returns a dict of maps keyed by app or
+        version id, and attaches devices, prices, tags and translations to the
+        apps.
+        """
+        from mkt.reviewers.models import EscalationQueue, RereviewQueue
+        from mkt.versions.models import Version
+        from mkt.webapps.models import (AddonUpsell, AddonUser, AppFeatures,
+                                        AppManifest, attach_devices,
                                         attach_prices, attach_translations,
-                                        RatingDescriptors, RatingInteractives)
-
-        if obj is None:
-            obj = cls.get_model().objects.get(pk=pk)
+                                        ContentRating,
+                                        get_excluded_region_ids_in_bulk,
+                                        Installs, Preview, RatingDescriptors,
+                                        RatingInteractives, Trending, Webapp)
 
         # Attach everything we need to index apps.
         for transform in (attach_devices, attach_prices, attach_tags,
                           attach_translations):
-            transform([obj])
+            transform(objs)
+
+        ids = [obj.id for obj in objs]
+        related = {}
+
+        # A row that can't be parsed only fails the apps it belongs to:
+        # extract_document() raises the error stored here for them.
+        related['errors'] = {}
+
+        def parse(app_ids, func, *args):
+            try:
+                return func(*args)
+            except Exception as e:
+                for app_id in app_ids:
+                    related['errors'][app_id] = e
+
+        # Current and latest versions, with their files, features, manifests
+        # and release notes.
+        versions = {}
+        version_apps = defaultdict(set)
+        for obj in objs:
+            for version in (obj.current_version, obj.latest_version):
+                if version:
+                    versions[version.id] = version
+                    version_apps[version.id].add(obj.id)
+        Version.transformer(versions.values())
+        attach_trans_dict(Version, versions.values())
+        related['features'] = dict(
+            (features.version_id,
+             parse(version_apps[features.version_id], features.to_dict))
+            for features in AppFeatures.objects.filter(
+                version__in=versions.keys()))
+        related['manifests'] = dict(
+            (version_id,
+             parse(version_apps[version_id], json.loads, manifest)
+             if manifest else {})
+            for version_id, manifest in AppManifest.objects.filter(
+                version__in=versions.keys()).values_list('version',
+                                                         'manifest'))
+
+        # All the versions, only their ids, number and review date are used.
+        related['versions'] = defaultdict(list)
+        for app_id, version_id, number, reviewed in (
+                Version.objects.filter(addon__in=ids).no_transforms()
+                .values_list('addon', 'id', 'version', 'reviewed')):
+            related['versions'][app_id].append((version_id, number, reviewed))
+
+        related['escalations'] = dict(
+            EscalationQueue.objects.filter(addon__in=ids)
+                                   .values_list('addon', 'created'))
+        related['rereviews'] = dict(
+            RereviewQueue.objects.filter(addon__in=ids)
+                                 .values_list('addon', 'created'))
+
+        related['owners'] = defaultdict(list)
+        for app_id, user_id in AddonUser.objects.filter(
+                addon__in=ids, role=mkt.AUTHOR_ROLE_OWNER).values_list(
+                'addon', 'user'):
+            related['owners'][app_id].append(user_id)
+
+        related['previews'] = defaultdict(list)
+        for preview in Preview.objects.filter(addon__in=ids).no_transforms():
+            related['previews'][preview.addon_id].append(preview)
+
+        related['price_tiers'] = dict(
+            AddonPremium.objects.filter(addon__in=ids, price__isnull=False)
+                                .values_list('addon', 'price__name'))
+
+        related['content_ratings'] = defaultdict(list)
+        for content_rating in ContentRating.objects.filter(addon__in=ids):
+            related['content_ratings'][content_rating.addon_id].append(
+                content_rating)
+        related['descriptors'] = dict(
+            (descriptors.addon_id,
+             parse([descriptors.addon_id], descriptors.to_keys))
+            for descriptors in RatingDescriptors.objects.filter(
+                addon__in=ids))
+        related['interactives'] = dict(
+            (interactives.addon_id,
+             parse([interactives.addon_id], interactives.to_keys))
+            for interactives in RatingInteractives.objects.filter(
+                addon__in=ids))
+
+        upsells = dict(AddonUpsell.objects.filter(free__in=ids)
+                                          .values_list('free', 'premium'))
+        premiums = dict((app.id, app) for app in Webapp.objects.filter(
+            id__in=set(upsells.values())))
+        related['upsells'] = dict(
+            (app_id, premiums[premium_id])
+            for app_id, premium_id in upsells.items()
+            if premium_id in premiums)
+        related['region_exclusions'] = get_excluded_region_ids_in_bulk(
+            ids + premiums.keys())
+
+        # extract_popularity_trending_boost() only keeps the regions it needs.
+        for key, model in (('popularity', Installs), ('trending', Trending)):
+            related[key] = defaultdict(dict)
+            for app_id, region, value in model.objects.filter(
+                    addon__in=ids).values_list('addon', 'region', 'value'):
+                related[key][app_id][region] = value
+
+        return related
+
+    @classmethod
+    def extract_documents(cls, objs):
+        """
+        Extracts the ElasticSearch index documents for a list of apps,
+        fetching the related data for all of them at once.
+        """
+        objs = list(objs)
+        related = cls.get_related_data(objs)
+        return [cls.extract_document(obj.id, obj=obj, related=related)
+                for obj in objs]
+
+    @classmethod
+    def extract_document(cls, pk=None, obj=None, related=None):
+        """
+        Extracts the ElasticSearch index document for this instance.
+
+        `related` is the data returned by get_related_data() for a list of
+        apps including this one. It's fetched for this app alone if missing.
+        """
+        from mkt.webapps.models import AppFeatures
+
+        if obj is None:
+            obj = cls.get_model().objects.get(pk=pk)
+        if related is None:
+            related = cls.get_related_data([obj])
+        if obj.id in related['errors']:
+            raise related['errors'][obj.id]
 
         latest_version = obj.latest_version
         version = obj.current_version
-        features = (version.features.to_dict()
-                    if version else AppFeatures().to_dict())
+        features = related['features'].get(version.id) if version else None
+        if features is None:
+            features = AppFeatures().to_dict()
 
         try:
             status = latest_version.statuses[0][1] if latest_version else None
@@ -263,38 +405,38 @@ class WebappIndexer(BaseIndexer):
         d['app_type'] = obj.app_type_id
         d['author'] = obj.developer_name
         d['category'] = obj.categories if obj.categories else []
-        d['content_ratings'] = (obj.get_content_ratings_by_body(es=True) or
-                                None)
-        try:
-            d['content_descriptors'] = obj.rating_descriptors.to_keys()
-        except RatingDescriptors.DoesNotExist:
-            d['content_descriptors'] = []
+        content_ratings = {}
+        for content_rating in related['content_ratings'][obj.id]:
+            body = content_rating.get_body()
+            content_ratings[body.label] = {
+                'body': body.id,
+                'rating': content_rating.get_rating().id
+            }
+        d['content_ratings'] = content_ratings or None
+        d['content_descriptors'] = related['descriptors'].get(obj.id, [])
         d['current_version'] = version.version if version else None
         d['device'] = getattr(obj, 'device_ids', [])
         d['features'] = features
         d['has_public_stats'] = obj.public_stats
-        try:
-            d['interactive_elements'] = obj.rating_interactives.to_keys()
-        except RatingInteractives.DoesNotExist:
-            d['interactive_elements'] = []
+        d['interactive_elements'] = related['interactives'].get(obj.id, [])
         d['installs_allowed_from'] = (
-            version.manifest.get('installs_allowed_from', ['*'])
+            related['manifests'].get(version.id, {}).get(
+                'installs_allowed_from', ['*'])
             if version else ['*'])
         d['is_priority'] = obj.priority_review
 
-        is_escalated = obj.escalationqueue_set.exists()
-        d['is_escalated'] = is_escalated
-        d['escalation_date'] = (obj.escalationqueue_set.get().created
-                                if is_escalated else None)
-        is_rereviewed = obj.rereviewqueue_set.exists()
-        d['is_rereviewed'] = is_rereviewed
-        d['rereview_date'] = (obj.rereviewqueue_set.get().created
-                              if is_rereviewed else None)
+        d['escalation_date'] = related['escalations'].get(obj.id)
+        d['is_escalated'] = obj.id in related['escalations']
+        d['rereview_date'] = related['rereviews'].get(obj.id)
+        d['is_rereviewed'] = obj.id in related['rereviews']
 
         if latest_version:
+            manifest = related['manifests'].get(latest_version.id, {})
             d['latest_version'] = {
                 'status': status,
-                'is_privileged': latest_version.is_privileged,
+                'is_privileged': bool(
+                    obj.is_packaged and latest_version.all_files and
+                    manifest.get('type') == 'privileged'),
                 'has_editor_comment': latest_version.has_editor_comment,
                 'has_info_request': latest_version.has_info_request,
                 'nomination_date': latest_version.nomination,
@@ -312,25 +454,21 @@ class WebappIndexer(BaseIndexer):
         d['manifest_url'] = obj.get_manifest_url()
         d['package_path'] = obj.get_package_path()
         d['name_sort'] = unicode(obj.name).lower()
-        d['owners'] = [au.user.id for au in
-                       obj.addonuser_set.filter(role=mkt.AUTHOR_ROLE_OWNER)]
+        d['owners'] = related['owners'][obj.id]
 
         d['previews'] = [{'filetype': p.filetype, 'modified': p.modified,
                           'id': p.id, 'sizes': p.sizes}
-                         for p in obj.previews.all()]
-        try:
-            p = obj.addonpremium.price
-            d['price_tier'] = p.name
-        except AddonPremium.DoesNotExist:
-            d['price_tier'] = None
+                         for p in related['previews'][obj.id]]
+        d['price_tier'] = related['price_tiers'].get(obj.id)
 
         d['ratings'] = {
             'average': obj.average_rating,
             'count': obj.total_reviews,
         }
-        d['region_exclusions'] = obj.get_excluded_region_ids()
-        d['reviewed'] = obj.versions.filter(
-            deleted=False).aggregate(Min('reviewed')).get('reviewed__min')
+        d['region_exclusions'] = related['region_exclusions'][obj.id]
+        versions = related['versions'][obj.id]
+        d['reviewed'] = min([reviewed for _, _, reviewed in versions
+                             if reviewed is not None] or [None])
 
         # The default locale of the app is considered "supported" by default.
         supported_locales = [obj.default_locale]
@@ -342,20 +480,23 @@ class WebappIndexer(BaseIndexer):
 
         d['tags'] = getattr(obj, 'tags_list', [])
 
-        if obj.upsell and obj.upsell.premium.is_published():
-            upsell_obj = obj.upsell.premium
+        upsell_obj = related['upsells'].get(obj.id)
+        if upsell_obj and upsell_obj.is_published():
             d['upsell'] = {
                 'id': upsell_obj.id,
                 'app_slug': upsell_obj.app_slug,
                 'icon_url': upsell_obj.get_icon_url(128),
                 # TODO: Store all localizations of upsell.name.
                 'name': unicode(upsell_obj.name),
-                'region_exclusions': upsell_obj.get_excluded_region_ids()
+                'region_exclusions': (
+                    related['region_exclusions'][upsell_obj.id])
             }
 
-        d['versions'] = [dict(version=v.version,
-                              resource_uri=reverse_version(v))
-                         for v in obj.versions.all()]
+        d['versions'] = [
+            dict(version=number,
+                 resource_uri=reverse('version-detail',
+                                      kwargs={'pk': version_id}))
+            for version_id, number, _ in versions]
 
         # Handle localized fields.
         # This adds both the field used for search and the one with
@@ -369,14 +510,15 @@ class WebappIndexer(BaseIndexer):
             d.update(cls.extract_field_translations(obj, field))
 
         if version:
-            attach_trans_dict(version._meta.model, [version])
             d.update(cls.extract_field_translations(
                 version, 'release_notes', db_field='releasenotes_id'))
         else:
             d['release_notes_translations'] = None
 
         # Add boost, popularity, trending values.
-        d.update(cls.extract_popularity_trending_boost(obj))
+        d.update(cls.extract_popularity_trending_boost(
+            obj, trending=related['trending'][obj.id],
+            popularity=related['popularity'][obj.id]))
 
         # If the app is compatible with Firefox OS, push suggestion data in the
         # index - This will be used by RocketbarView API, which is specific to
@@ -408,6 +550,37 @@ class WebappIndexer(BaseIndexer):
         from mkt.webapps.models import Webapp
         return Webapp.with_deleted.exclude(tags__tag_text='homescreen')
 
+    @classmethod
+    def get_modified_ids(cls, since):
+        """
+        Returns the ids of the apps that changed since the given date, or
+        that have related objects stored in their documents that did.
+        """
+        from mkt.files.models import File
+        from mkt.reviewers.models import EscalationQueue, RereviewQueue
+        from mkt.versions.models import Version
+        from mkt.webapps.models import (AddonDeviceType, AddonExcludedRegion,
+                                        AddonUpsell, ContentRating, Geodata,
+                                        Installs, Preview, RatingDescriptors,
+                                        RatingInteractives, Trending)
+
+        ids = set(super(WebappIndexer, cls).get_modified_ids(since))
+        for model in (AddonDeviceType, AddonExcludedRegion, AddonPremium,
+                      ContentRating, EscalationQueue, Geodata, Installs,
+                      Preview, RatingDescriptors, RatingInteractives,
+                      RereviewQueue, Trending):
+            ids.update(model.objects.filter(modified__gte=since)
+                                    .values_list('addon', flat=True))
+        ids.update(Version.with_deleted.filter(modified__gte=since)
+                                       .values_list('addon', flat=True))
+        ids.update(File.objects.filter(modified__gte=since)
+                               .values_list('version__addon', flat=True))
+        ids.update(AddonUpsell.objects.filter(modified__gte=since)
+                                      .values_list('free', flat=True))
+        # Only keep the apps this indexer indexes.
+        return list(cls.get_indexable().filter(id__in=ids)
+                                       .values_list('id', flat=True))
+
     @classmethod
     def run_indexing(cls, ids, ES=None, index=None, **kw):
         """Override run_indexing to use app transformers."""
@@ -415,20 +588,31 @@ class WebappIndexer(BaseIndexer):
 
         log.info('Indexing %s webapps' % len(ids))
 
-        qs = Webapp.with_deleted.filter(id__in=ids)
+        objs = list(Webapp.with_deleted.filter(id__in=ids))
         ES = ES or cls.get_es()
 
-        docs = []
-        for obj in list(qs):
-            try:
-                docs.append(cls.extract_document(obj.id, obj=obj))
-            except Exception as e:
-                log.error('Failed to index webapp {0}: {1}'
-                          .format(obj.id, repr(e)),
-                          # Trying to chase down a cache-machine problem.
-                          exc_info="marketplace:" in str(e))
-
-        cls.bulk_index(docs, es=ES, index=index or cls.get_index())
+        try:
+            related = cls.get_related_data(objs)
+        except Exception as e:
+            # Don't let one app stop the others from being indexed, fetch
+            # the related data of each app on its own.
+            log.error('Failed to fetch the data of {0} webapps: {1}'
+                      .format(len(objs), repr(e)))
+            related = None
+
+        # Documents are sent to ES while the next ones are extracted.
+        def docs():
+            for obj in objs:
+                try:
+                    yield cls.extract_document(obj.id, obj=obj,
+                                               related=related)
+                except Exception as e:
+                    log.error('Failed to index webapp {0}: {1}'
+                              .format(obj.id, repr(e)),
+                              # Trying to chase down a cache-machine problem.
+                              exc_info="marketplace:" in str(e))
+
+        cls.bulk_index(docs(), es=ES, index=index or cls.get_index())
 
     @classmethod
     def filter_by_apps(cls, app_ids, queryset=None):
@@ -0,0 +1,95 @@
+import json
+import timeit
+from optparse import make_option
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.test.client import RequestFactory
+
+from rest_framework.renderers import JSONRenderer
+
+import mkt
+from mkt.search.serializers import BaseESSerializer
+from mkt.webapps.indexers import WebappIndexer
+from mkt.webapps.serializers import (ESAppFeedCollectionSerializer,
+                                     ESAppFeedSerializer, ESAppSerializer,
+                                     SimpleESAppSerializer,
+                                     SuggestionsESAppSerializer)
+
+
+class Command(BaseCommand):
+    """
+    Usage:
+
+        python manage.py benchmark_es_app_serializer [--file=hits.json]
+            [--record=hits.json] [--size=25] [--number=20] [--lang=fr]
+
+    Serializes a corpus of ES documents of free apps with the search, feed
+    and suggestions serializers, both with a fake Webapp and straight from
+    the ES data, checks that both render the same JSON and reports how long
+    each took. The corpus is read from a file recorded with
+    --record, or fetched from the apps index.
+    """
+    help = 'Benchmark serializing ES apps without fake Webapp instances.'
+    option_list = BaseCommand.option_list + (
+        make_option('--file', action='store', default=None,
+                    help='A JSON file of recorded ES documents to serialize.'),
+        make_option('--record', action='store', default=None,
+                    help='Save the ES documents fetched to this file.'),
+        make_option('--size', action='store', type='int', default=25,
+                    help='How many documents to fetch from the index.'),
+        make_option('--number', action='store', type='int', default=20,
+                    help='How many times to serialize the corpus.'),
+        make_option('--lang', action='store', default=None,
+                    help='Request a single language for translations.'),
+    )
+
+    def handle(self, *args, **kwargs):
+        if kwargs['file']:
+            with open(kwargs['file']) as f:
+                docs = json.load(f)
+        else:
+            res = WebappIndexer.get_es().search(
+                index=WebappIndexer.get_index(),
+                doc_type=WebappIndexer.get_mapping_type_name(),
+                size=kwargs['size'])
+            docs = [hit['_source'] for hit in res['hits']['hits']]
+            if kwargs['record']:
+                with open(kwargs['record'], 'w') as f:
+                    json.dump(docs, f)
+        docs = [doc for doc in docs
+                if doc.get('premium_type') not in mkt.ADDON_PREMIUMS]
+        if not docs:
+            raise CommandError('No documents of free apps to serialize.')
+
+        request = RequestFactory().get(
+            '/', {'lang': kwargs['lang']} if kwargs['lang'] else {})
+        request.user = AnonymousUser()
+        request.REGION = mkt.regions.RESTOFWORLD
+        number = kwargs['number']
+        renderer = JSONRenderer()
+
+        for serializer_class in (ESAppFeedCollectionSerializer,
+                                 ESAppFeedSerializer, ESAppSerializer,
+                                 SimpleESAppSerializer,
+                                 SuggestionsESAppSerializer):
+            serializer = serializer_class(context={'request': request})
+
+            def fake():
+                return [BaseESSerializer.to_representation(serializer, doc)
+                        for doc in docs]
+
+            def es_data():
+                return [serializer.es_data_representation(doc)
+                        for doc in docs]
+
+            if renderer.render(fake()) != renderer.render(es_data()):
+                raise CommandError('%s renders different data.' %
+                                   serializer_class.__name__)
+            fake_time = timeit.timeit(fake, number=number)
+            es_data_time = timeit.timeit(es_data, number=number)
+            self.stdout.write(
+                '%-30s fake: %.2fms  es data: %.2fms  (x%.1f) per %d docs' % (
+                    serializer_class.__name__,
+                    fake_time * 1000 / number, es_data_time * 1000 / number,
+                    fake_time / es_data_time, len(docs)))
@@ -8,6 +8,8 @@ import os
 import time
 import urlparse
 import uuid
+from array import array
+from collections import defaultdict
 
 from django.conf import settings
 from django.core.cache import cache
@@ -20,7 +22,6 @@ from django.utils.translation import trans_real as translation
 
 import commonware.log
 import waffle
-from cache_nuggets.lib import memoize, memoize_key
 from django_extensions.db.fields.json import JSONField
 from jingo.helpers import urlparams
 from jinja2.filters import do_dictsort
@@ -1651,27 +1652,8 @@ class Webapp(UUIDModelMixin, OnChangeMixin, ModelBase):
         """
         excluded = set(self.addonexcludedregion
                            .values_list('region', flat=True))
-
-        if self.is_premium():
-            all_regions = set(mkt.regions.ALL_REGION_IDS)
-            # Find every region that does not have payments supported
-            # and add that into the exclusions.
-            #
-            # All the regions that are currently paid for an app.
-            price_ids = self.get_price_region_ids()
-            if RESTOFWORLD.id in excluded or RESTOFWORLD.id not in price_ids:
-                # If the "rest of the world" is excluded or its not in the
-                # list of valid price ids then we need to exclude all
-                # countries that don't have payments.
-                excluded = excluded.union(all_regions.difference(price_ids))
-
-        geo = self.geodata
-        if geo.region_de_iarc_exclude or geo.region_de_usk_exclude:
-            excluded.add(mkt.regions.DEU.id)
-        if geo.region_br_iarc_exclude:
-            excluded.add(mkt.regions.BRA.id)
-
-        return sorted(list(excluded))
+        price_ids = self.get_price_region_ids() if self.is_premium() else None
+        return _get_excluded_region_ids(excluded, price_ids, self.geodata)
 
     def get_price_region_ids(self):
         tier = self.get_tier()
@@ -2401,12 +2383,92 @@ class AddonExcludedRegion(ModelBase):
         return mkt.regions.REGIONS_CHOICES_ID_DICT.get(self.region)
 
 
-@memoize(prefix='get_excluded_in')
-def get_excluded_in(region_id):
+def _get_excluded_region_ids(excluded, price_ids, geodata):
     """
-    Return IDs of Webapp objects excluded from a particular region or excluded
-    due to Geodata flags.
+    Return the sorted IDs of regions for which an app is excluded, from the
+    regions of its AddonExcludedRegion objects, the paid regions of its price
+    tier if the app is premium (None otherwise) and its Geodata.
     """
+    excluded = set(excluded)
+    if price_ids is not None:
+        # Find every region that does not have payments supported and add
+        # that into the exclusions.
+        if RESTOFWORLD.id in excluded or RESTOFWORLD.id not in price_ids:
+            # If the "rest of the world" is excluded or its not in the list
+            # of valid price ids then we need to exclude all countries that
+            # don't have payments.
+            excluded.update(set(mkt.regions.ALL_REGION_IDS)
+                            .difference(price_ids))
+
+    if geodata:
+        if geodata.region_de_iarc_exclude or geodata.region_de_usk_exclude:
+            excluded.add(mkt.regions.DEU.id)
+        if geodata.region_br_iarc_exclude:
+            excluded.add(mkt.regions.BRA.id)
+
+    return sorted(excluded)
+
+
+def get_excluded_region_ids_in_bulk(ids):
+    """
+    Return a dict of the IDs of regions for which each app is excluded, keyed
+    by app id, like Webapp.get_excluded_region_ids() does for a single app.
+
+    Uses a query for the apps and their price tiers, one for their excluded
+    regions, one for their Geodata and one for the paid regions of all the
+    price tiers, whatever the number of apps.
+    """
+    from mkt.prices.models import default_providers, PriceCurrency
+
+    tiers = dict(
+        (app_id, tier_id) for app_id, premium_type, tier_id in
+        Webapp.with_deleted.filter(id__in=ids).values_list(
+            'id', 'premium_type', 'addonpremium__price')
+        if premium_type in mkt.ADDON_PREMIUMS)
+
+    excluded = defaultdict(set)
+    for app_id, region in AddonExcludedRegion.objects.filter(
+            addon__in=ids).values_list('addon', 'region'):
+        excluded[app_id].add(region)
+
+    geodata = dict((geo.addon_id, geo)
+                   for geo in Geodata.objects.filter(addon__in=ids))
+
+    price_ids = defaultdict(list)
+    tier_ids = set(filter(None, tiers.values()))
+    if tier_ids:
+        for tier_id, region in PriceCurrency.objects.filter(
+                tier__in=tier_ids, provider__in=default_providers(),
+                paid=True).values_list('tier', 'region'):
+            price_ids[tier_id].append(region)
+
+    return dict(
+        (app_id, _get_excluded_region_ids(
+            excluded[app_id],
+            price_ids[tiers[app_id]] if app_id in tiers else None,
+            geodata.get(app_id)))
+        for app_id in ids)
+
+
+# The sets of apps excluded from each region are cached as sorted arrays of
+# ids, under a generation counter for each region. Changes to a single app
+# update the set of its region under a new generation instead of rebuilding
+# it. Each process also keeps the sets for EXCLUDED_IN_CACHE_TIMEOUT seconds.
+EXCLUDED_IN_KEY = 'excluded_in:%s:%s'
+EXCLUDED_IN_GENERATION_KEY = 'excluded_in:generation:%s'
+_excluded_in = {}
+
+
+def _get_excluded_in_generation(region_id):
+    key = EXCLUDED_IN_GENERATION_KEY % region_id
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, 1, None)
+        generation = cache.get(key)
+    return generation
+
+
+def _build_excluded_in(region_id):
     aers = list(AddonExcludedRegion.objects.filter(region=region_id)
                 .values_list('addon', flat=True))
 
@@ -2426,12 +2488,77 @@ def get_excluded_in(region_id):
     return set(aers + geodata_exclusions)
 
 
+def get_excluded_in(region_id):
+    """
+    Return IDs of Webapp objects excluded from a particular region or excluded
+    due to Geodata flags, as a frozenset.
+    """
+    now = time.time()
+    expires, excluded = _excluded_in.get(region_id, (0, None))
+    if expires > now:
+        return excluded
+
+    key = EXCLUDED_IN_KEY % (region_id, _get_excluded_in_generation(region_id))
+    ids = cache.get(key)
+    if ids is None:
+        ids = array('L', sorted(_build_excluded_in(region_id)))
+        cache.add(key, ids)
+    excluded = frozenset(ids)
+    _excluded_in[region_id] = (now + settings.EXCLUDED_IN_CACHE_TIMEOUT,
+                               excluded)
+    return excluded
+
+
+def update_excluded_in(region_id, add=None, remove=None):
+    """
+    Add or remove the app id `add` or `remove` to the set of apps excluded
+    from a region, or invalidate the set when neither is given.
+
+    The set is updated under a new generation. If another process changed
+    the generation in the meantime, the new one is left empty and the set is
+    rebuilt from the database when it's next used.
+    """
+    _excluded_in.pop(region_id, None)
+    generation = _get_excluded_in_generation(region_id)
+    ids = cache.get(EXCLUDED_IN_KEY % (region_id, generation))
+    try:
+        new_generation = cache.incr(EXCLUDED_IN_GENERATION_KEY % region_id)
+    except ValueError:
+        # The generation was evicted, nothing can be cached under it.
+        return
+    if ids is None or new_generation != generation + 1 or (
+            add is None and remove is None):
+        return
+    ids = set(ids)
+    if add is not None:
+        ids.add(add)
+    if remove is not None:
+        ids.discard(remove)
+    cache.set(EXCLUDED_IN_KEY % (region_id, new_generation),
+              array('L', sorted(ids)))
+
+
 @receiver(models.signals.post_save, sender=AddonExcludedRegion,
           dispatch_uid='clean_memoized_exclusions')
-def clean_memoized_exclusions(sender, **kw):
-    if not kw.get('raw'):
-        cache.delete_many([memoize_key('get_excluded_in', k)
-                           for k in mkt.regions.ALL_REGION_IDS])
+def clean_memoized_exclusions(sender, instance, **kw):
+    if kw.get('raw'):
+        return
+    if kw.get('created'):
+        update_excluded_in(instance.region, add=instance.addon_id)
+    else:
+        # The region might have changed, we don't know which one it was.
+        for region_id in mkt.regions.ALL_REGION_IDS:
+            update_excluded_in(region_id)
+
+
+@receiver(models.signals.post_delete, sender=AddonExcludedRegion,
+          dispatch_uid='clean_deleted_exclusions')
+def clean_deleted_exclusions(sender, instance, **kw):
+    if instance.region in (mkt.regions.BRA.id, mkt.regions.DEU.id):
+        # The app might still be excluded because of its Geodata.
+        update_excluded_in(instance.region)
+    else:
+        update_excluded_in(instance.region, remove=instance.addon_id)
 
 
 class IARCInfo(ModelBase):
@@ -2697,3 +2824,11 @@ class Geodata(ModelBase):
 for region in (mkt.regions.BRA, mkt.regions.DEU):
     field = models.BooleanField(default=False)
     field.contribute_to_class(Geodata, 'region_%s_iarc_exclude' % region.slug)
+
+
+@receiver(models.signals.post_save, sender=Geodata,
+          dispatch_uid='clean_geodata_exclusions')
+def clean_geodata_exclusions(sender, **kw):
+    if not kw.get('raw'):
+        for region in (mkt.regions.BRA, mkt.regions.DEU):
+            update_excluded_in(region.id)
@@ -374,6 +374,103 @@ class AppSerializer(BaseAppSerializer):
         return self.update(None, data)
 
 
+class ESVersionData(object):
+    """
+    The attributes of the current Version of a Webapp that ESAppSerializer
+    needs, taken straight from the ES data.
+    """
+
+    def __init__(self, data):
+        self._developer_name = data['author']
+        self.supported_locales = data['supported_locales']
+        self.version = data['current_version']
+        # ES stores it as release_notes, the db field is releasenotes.
+        ESTranslationSerializerField.attach_translations(
+            self, data, 'release_notes', target_name='releasenotes')
+
+
+class ESAppData(object):
+    """
+    The attributes of a Webapp that the fields listed in
+    ESAppSerializer.es_data_fields need, taken straight from the ES data.
+    """
+    icon_type = 'image/png'
+
+    # Those Webapp methods only need the attributes set below.
+    current_version = Webapp.current_version
+    get_absolute_url = Webapp.get_absolute_url.__func__
+    get_icon_dir = Webapp.get_icon_dir.__func__
+    get_icon_url = Webapp.get_icon_url.__func__
+    get_promo_img_url = Webapp.get_promo_img_url.__func__
+    get_region_ids = Webapp.get_region_ids.__func__
+    get_regions = Webapp.get_regions.__func__
+    get_url_path = Webapp.get_url_path.__func__
+    has_premium = Webapp.has_premium.__func__
+    is_premium = Webapp.is_premium.__func__
+
+    def __init__(self, data):
+        self.id = self.pk = data['id']
+        self.app_slug = data['app_slug']
+        self.categories = data['category']
+        self.default_locale = data.get('default_locale')
+        self.developer_name = data['author']
+        self.device_types = [DEVICE_TYPES[d] for d in data['device']]
+        self.icon_hash = data.get('icon_hash')
+        self.is_offline = data.get('is_offline')
+        self.is_packaged = data['app_type'] != mkt.ADDON_WEBAPP_HOSTED
+        self.manifest_url = data.get('manifest_url')
+        self.premium_type = data.get('premium_type')
+        self.promo_img_hash = data.get('promo_img_hash')
+        self.public_stats = data['has_public_stats']
+        self.status = data.get('status')
+        self.tags_list = data['tags']
+        self.tv_featured = data.get('tv_featured')
+        self._current_version = ESVersionData(data)
+        self._is_disabled = data['is_disabled']
+        self.es_data = data
+        for field_name in ('created', 'last_updated', 'modified', 'reviewed'):
+            setattr(self, field_name, es_to_datetime(data.get(field_name)))
+        for field_name in ('name', 'description', 'homepage',
+                           'support_email', 'support_url'):
+            ESTranslationSerializerField.attach_translations(
+                self, data, field_name)
+        if data.get('group_translations'):
+            ESTranslationSerializerField.attach_translations(
+                self, data, 'group')
+        else:
+            self.group_translations = None
+
+    @property
+    def all_previews(self):
+        return [Preview(id=p['id'], modified=es_to_datetime(p['modified']),
+                        filetype=p['filetype'], sizes=p.get('sizes', {}))
+                for p in self.es_data['previews']]
+
+    @property
+    def app_type(self):
+        # Like Webapp.app_type_id, deleted apps have no latest version to be
+        # privileged.
+        app_type = self.es_data['app_type']
+        if (app_type == mkt.ADDON_WEBAPP_PRIVILEGED and
+                self.status == mkt.STATUS_DELETED):
+            app_type = mkt.ADDON_WEBAPP_PACKAGED
+        return mkt.ADDON_WEBAPP_TYPES[app_type]
+
+    def get_excluded_region_ids(self):
+        return self.es_data['region_exclusions']
+
+
+class ESAppListSerializer(serializers.ListSerializer):
+    """
+    Fetches the premium info of all the premium apps in the ES data before
+    serializing them, so that their prices don't need a query for each app.
+    """
+
+    def to_representation(self, data):
+        self.child.attach_premiums(data)
+        return super(ESAppListSerializer, self).to_representation(data)
+
+
 class ESAppSerializer(BaseESSerializer, AppSerializer):
     # Fields specific to search.
     absolute_url = serializers.SerializerMethodField()
@@ -397,9 +494,27 @@ class ESAppSerializer(BaseESSerializer, AppSerializer):
     # The fields we want converted to Python date/datetimes.
     datetime_fields = ('created', 'last_updated', 'modified', 'reviewed')
 
+    # The fields that can be serialized from an ESAppData instead of the fake
+    # Webapp and related objects fake_object() builds, which is much cheaper.
+    # Serializers only using those fields take that path, except for the apps
+    # and users for which prices and user info need the database.
+    es_data_fields = frozenset([
+        'absolute_url', 'app_type', 'author', 'categories', 'content_ratings',
+        'created', 'current_version', 'default_locale', 'description',
+        'device_types', 'feature_compatibility', 'file_size', 'group',
+        'homepage', 'icon', 'icons', 'id', 'is_disabled', 'is_homescreen',
+        'is_offline', 'is_packaged', 'last_updated', 'manifest_url',
+        'modified', 'name', 'package_path', 'payment_required',
+        'premium_type', 'previews', 'price', 'price_locale', 'privacy_policy',
+        'promo_imgs', 'public_stats', 'ratings', 'regions', 'release_notes',
+        'resource_uri', 'reviewed', 'slug', 'status', 'support_email',
+        'support_url', 'supported_locales', 'tags', 'tv_featured', 'upsell',
+        'user', 'versions'])
+
     class Meta(AppSerializer.Meta):
         fields = AppSerializer.Meta.fields + ['absolute_url', 'group',
                                               'reviewed']
+        list_serializer_class = ESAppListSerializer
 
     def __init__(self, *args, **kwargs):
         super(ESAppSerializer, self).__init__(*args, **kwargs)
@@ -407,6 +522,36 @@ class ESAppSerializer(BaseESSerializer, AppSerializer):
         # Remove fields that we don't have in ES at the moment.
         self.fields.pop('upsold', None)
 
+    def to_representation(self, data):
+        data = (data._source if hasattr(data, '_source') else
+                data.get('_source', data))
+        if self.can_use_es_data(data):
+            return self.es_data_representation(data)
+        return super(ESAppSerializer, self).to_representation(data)
+
+    def can_use_es_data(self, data):
+        """
+        Whether `data` can be serialized with es_data_representation() and
+        give the same result as with a fake Webapp.
+        """
+        if not hasattr(self, '_es_data_fields_only'):
+            self._es_data_fields_only = set(self.fields) <= self.es_data_fields
+        if not self._es_data_fields_only:
+            return False
+        if (data.get('premium_type') in mkt.ADDON_PREMIUMS and
+                set(['payment_required', 'price', 'price_locale']) &
+                set(self.fields)):
+            return False
+        request = self.context.get('request')
+        if ('user' in self.fields and request and
+                request.user.is_authenticated()):
+            return False
+        return True
+
+    def es_data_representation(self, data):
+        return super(BaseESSerializer, self).to_representation(
+            ESAppData(data))
+
     def fake_object(self, data):
         """Create a fake instance of Webapp and related models from ES data."""
         is_packaged = data['app_type'] != mkt.ADDON_WEBAPP_HOSTED
@@ -469,16 +614,44 @@ class ESAppSerializer(BaseESSerializer, AppSerializer):
         # regions stored in ES instead of making SQL queries.
         obj.get_excluded_region_ids = lambda: data['region_exclusions']
 
-        # Set up payments stuff to avoid extra queries later (we'll still make
-        # some, because price info is not in ES).
+        # Set up payments stuff to avoid extra queries later. Price info is
+        # not in ES, it's fetched for all the apps serialized together if
+        # possible, see attach_premiums().
         if obj.is_premium():
-            Webapp.attach_premiums([obj])
+            premiums = self.context.get('app_premiums', {})
+            if obj.id in premiums:
+                obj._premium = premiums[obj.id]
+                if obj._premium:
+                    obj._premium.addon = obj
+            else:
+                Webapp.attach_premiums([obj])
 
         # Some methods below will need the raw data from ES, put it on obj.
         obj.es_data = data
 
         return obj
 
+    def attach_premiums(self, data):
+        """
+        Fetch the AddonPremium objects, with their price tier, of the premium
+        apps in a list of ES data with a single query, and keep them in the
+        context for fake_object(). Apps without one get None.
+        """
+        premiums = self.context.setdefault('app_premiums', {})
+        ids = set()
+        for item in data:
+            item = (item._source if hasattr(item, '_source') else
+                    item.get('_source', item))
+            if (item.get('premium_type') in mkt.ADDON_PREMIUMS and
+                    item['id'] not in premiums):
+                ids.add(item['id'])
+        if ids:
+            premiums.update(dict.fromkeys(ids))
+            premiums.update(
+                (premium.addon_id, premium) for premium in
+                AddonPremium.objects.select_related('price').filter(
+                    addon__in=ids))
+
     def create(self, data):
         return self.fake_object(data)
 
@@ -606,7 +779,7 @@ class SimpleAppSerializer(AppSerializer):
 
 class SimpleESAppSerializer(ESAppSerializer):
     class Meta(SimpleAppSerializer.Meta):
-        pass
+        list_serializer_class = ESAppListSerializer
 
 
 class SuggestionsESAppSerializer(ESAppSerializer):
@@ -27,6 +27,7 @@ from mkt.developers.models import ActivityLog
 from mkt.developers.tasks import _fetch_manifest, validator
 from mkt.files.models import FileUpload
 from mkt.reviewers.models import RereviewQueue
+from mkt.search.queue import IndexingTask
 from mkt.site.decorators import use_master
 from mkt.site.helpers import absolutify
 from mkt.site.mail import send_mail_jinja
@@ -317,7 +318,7 @@ def update_supported_locales(ids, **kw):
                 _log(app, u'Updating supported locales failed.', exc_info=True)
 
 
-@task(acks_late=True)
+@task(base=IndexingTask, acks_late=True)
 @use_master
 def index_webapps(ids, **kw):
     # DEPRECATED: call WebappIndexer.index_ids directly.
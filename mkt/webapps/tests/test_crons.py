@@ -269,7 +269,7 @@ class TestUpdateInstalls(mkt.site.tests.TestCase):
 
     @mock.patch('mkt.webapps.cron._get_installs')
     def test_installs_saved(self, _mock):
-        _mock.return_value = {'all': 12.0}
+        _mock.return_value = {self.app.id: {'all': 12.0}}
         update_app_installs()
 
         eq_(get_popularity(self.app), 12.0)
@@ -280,7 +280,7 @@ class TestUpdateInstalls(mkt.site.tests.TestCase):
                 eq_(get_popularity(self.app, region=region), 0.0)
 
         # Test running again updates the values as we'd expect.
-        _mock.return_value = {'all': 2.0}
+        _mock.return_value = {self.app.id: {'all': 2.0}}
         update_app_installs()
         eq_(get_popularity(self.app), 2.0)
         for region in mkt.regions.REGIONS_DICT.values():
@@ -291,25 +291,49 @@ class TestUpdateInstalls(mkt.site.tests.TestCase):
 
     @mock.patch('mkt.webapps.cron._get_installs')
     def test_installs_deleted(self, _mock):
-        self.app.trending.get_or_create(region=0, value=12.0)
+        self.app.popularity.get_or_create(region=0, value=12.0)
 
-        _mock.return_value = {'all': 0.0}
+        _mock.return_value = {self.app.id: {'all': 0.0}}
         update_app_installs()
 
         with self.assertRaises(Installs.DoesNotExist):
             self.app.popularity.get(region=0)
 
+    @mock.patch('mkt.webapps.cron._get_installs')
+    def test_installs_regions(self, _mock):
+        other = Webapp.objects.create(status=mkt.STATUS_PUBLIC)
+        self.app.popularity.create(region=mkt.regions.BRA.id, value=3.0)
+        self.app.popularity.create(region=mkt.regions.USA.id, value=4.0)
+
+        _mock.return_value = {self.app.id: {'all': 12.0, 'br': 5.0},
+                              other.id: {'us': 1.0}}
+        update_app_installs()
+
+        eq_(dict(self.app.popularity.values_list('region', 'value')),
+            {0: 12.0, mkt.regions.BRA.id: 5.0})
+        eq_(dict(other.popularity.values_list('region', 'value')),
+            {mkt.regions.USA.id: 1.0})
+
     @mock.patch('mkt.webapps.cron.get_monolith_client')
-    def test_get_trending(self, _mock):
+    def test_get_installs(self, _mock):
         client = mock.Mock()
         client.raw.return_value = {
             'aggregations': {
-                'popular': {'total_installs': {'value': 123}},
-                'region': {
+                'app': {
                     'buckets': [
                         {
-                            'key': 'br',
-                            'popular': {'total_installs': {'value': 12}}
+                            'key': self.app.id,
+                            'popular': {'total_installs': {'value': 123}},
+                            'region': {
+                                'buckets': [
+                                    {
+                                        'key': 'br',
+                                        'popular': {
+                                            'total_installs': {'value': 12}
+                                        }
+                                    }
+                                ]
+                            }
                         }
                     ]
                 }
@@ -317,8 +341,9 @@ class TestUpdateInstalls(mkt.site.tests.TestCase):
         }
         _mock.return_value = client
 
-        eq_(_get_installs(self.app.id)['all'], 123.0)
-        eq_(_get_installs(self.app.id)['br'], 12.0)
+        eq_(_get_installs([self.app.id]),
+            {self.app.id: {'all': 123.0, 'br': 12.0}})
+        eq_(client.raw.call_count, 1)
 
     @mock.patch('mkt.webapps.cron.get_monolith_client')
     def test_get_installs_error(self, _mock):
@@ -326,7 +351,7 @@ class TestUpdateInstalls(mkt.site.tests.TestCase):
         client.raw.side_effect = ValueError
         _mock.return_value = client
 
-        eq_(_get_installs(self.app.id), {})
+        eq_(_get_installs([self.app.id]), {})
 
 
 class TestUpdateTrending(mkt.site.tests.TestCase):
@@ -336,7 +361,7 @@ class TestUpdateTrending(mkt.site.tests.TestCase):
 
     @mock.patch('mkt.webapps.cron._get_trending')
     def test_trending_saved(self, _mock):
-        _mock.return_value = {'all': 12.0}
+        _mock.return_value = {self.app.id: {'all': 12.0}}
         update_app_trending()
 
         eq_(get_trending(self.app), 12.0)
@@ -347,7 +372,7 @@ class TestUpdateTrending(mkt.site.tests.TestCase):
                 eq_(get_trending(self.app, region=region), 0.0)
 
         # Test running again updates the values as we'd expect.
-        _mock.return_value = {'all': 2.0}
+        _mock.return_value = {self.app.id: {'all': 2.0}}
         update_app_trending()
         eq_(get_trending(self.app), 2.0)
         for region in mkt.regions.REGIONS_DICT.values():
@@ -360,37 +385,46 @@ class TestUpdateTrending(mkt.site.tests.TestCase):
     def test_trending_deleted(self, _mock):
         self.app.trending.get_or_create(region=0, value=12.0)
 
-        _mock.return_value = {'all': 0.0}
+        _mock.return_value = {self.app.id: {'all': 0.0}}
         update_app_trending()
 
         with self.assertRaises(Trending.DoesNotExist):
             self.app.trending.get(region=0)
 
+    def _app_bucket(self, week1, week3, app_id=None):
+        return {
+            'key': app_id or self.app.id,
+            'week1': {'total_installs': {'value': week1}},
+            'week3': {'total_installs': {'value': week3}},
+        }
+
     def _return_value(self, week1, week3):
         return {
             'aggregations': {
-                'week1': {'total_installs': {'value': week1}},
-                'week3': {'total_installs': {'value': week3}},
+                'app': {'buckets': [self._app_bucket(week1, week3)]}
             }
         }
 
     def _return_value_with_regions(self, week1, week3, rweek1, rweek3):
+        bucket = self._app_bucket(week1, week3)
+        bucket['region'] = {
+            'buckets': [
+                {
+                    'key': 'br',
+                    'week1': {'total_installs': {'value': rweek1}},
+                    'week3': {'total_installs': {'value': rweek3}},
+                },
+            ]
+        }
         return {
             'aggregations': {
-                'week1': {'total_installs': {'value': week1}},
-                'week3': {'total_installs': {'value': week3}},
-                'region': {
-                    'buckets': [
-                        {
-                            'key': 'br',
-                            'week1': {'total_installs': {'value': rweek1}},
-                            'week3': {'total_installs': {'value': rweek3}},
-                        },
-                    ]
-                }
+                'app': {'buckets': [bucket]}
             }
         }
 
+    def _get_trending(self):
+        return _get_trending([self.app.id]).get(self.app.id, {})
+
     @mock.patch('mkt.webapps.cron.get_monolith_client')
     def test_get_trending(self, _mock):
         client = mock.Mock()
@@ -400,7 +434,7 @@ class TestUpdateTrending(mkt.site.tests.TestCase):
         # 1st week count: 255
         # Prior 3 weeks get averaged: (255) / 3 = 85
         # (255 - 85) / 85 = 2.0
-        eq_(_get_trending(self.app.id), {'all': 2.0})
+        eq_(self._get_trending(), {'all': 2.0})
 
     @mock.patch('mkt.webapps.cron.get_monolith_client')
     def test_get_trending_threshold(self, _mock):
@@ -410,7 +444,7 @@ class TestUpdateTrending(mkt.site.tests.TestCase):
 
         # 1st week count: 99
         # 99 is less than 100 so we return {} as not trending.
-        eq_(_get_trending(self.app.id), {})
+        eq_(self._get_trending(), {})
 
     @mock.patch('mkt.webapps.cron.get_monolith_client')
     def test_get_trending_negative(self, _mock):
@@ -421,7 +455,7 @@ class TestUpdateTrending(mkt.site.tests.TestCase):
         # 1st week count: 100
         # Prior 3 week count: 1000/3 = 333.3
         # (100 - 333.3) / 333.3 = -0.7 which gets set to 0.0.
-        eq_(_get_trending(self.app.id), {'all': 0.0})
+        eq_(self._get_trending(), {'all': 0.0})
 
     @mock.patch('mkt.webapps.cron.get_monolith_client')
     def test_get_trending_regional(self, _mock):
@@ -436,9 +470,9 @@ class TestUpdateTrending(mkt.site.tests.TestCase):
         # 1st week regional count: 255
         # Prior 3 week regional count: 102/3 = 34
         # (255 - 34) / 34 = 6.5
-        eq_(_get_trending(self.app.id)['br'], 6.5)
+        eq_(self._get_trending()['br'], 6.5)
         # Make sure global trending is still correct.
-        eq_(_get_trending(self.app.id)['all'], 2.0)
+        eq_(self._get_trending()['all'], 2.0)
 
     @mock.patch('mkt.webapps.cron.get_monolith_client')
     def test_get_trending_regional_threshold(self, _mock):
@@ -450,9 +484,9 @@ class TestUpdateTrending(mkt.site.tests.TestCase):
         # 1st week regional count: 99
         # Prior 3 week regional count: 99/3 = 33
         # (99 - 33) / 33 = 2.0 but week1 isn't > 100 so we set to zero.
-        eq_(_get_trending(self.app.id)['br'], 0.0)
+        eq_(self._get_trending()['br'], 0.0)
         # Make sure global trending is still correct.
-        eq_(_get_trending(self.app.id)['all'], 2.0)
+        eq_(self._get_trending()['all'], 2.0)
 
     @mock.patch('mkt.webapps.cron.get_monolith_client')
     def test_get_trending_regional_negative(self, _mock):
@@ -464,9 +498,27 @@ class TestUpdateTrending(mkt.site.tests.TestCase):
         # 1st week regional count: 99
         # Prior 3 week regional count: 99/3 = 33
         # (99 - 33) / 33 = 2.0 but week1 isn't > 100 so we set to zero.
-        eq_(_get_trending(self.app.id)['br'], 0.0)
+        eq_(self._get_trending()['br'], 0.0)
         # Make sure global trending is still correct.
-        eq_(_get_trending(self.app.id)['all'], 2.0)
+        eq_(self._get_trending()['all'], 2.0)
+
+    @mock.patch('mkt.webapps.cron.get_monolith_client')
+    def test_get_trending_multiple_apps(self, _mock):
+        other = Webapp.objects.create(status=mkt.STATUS_PUBLIC)
+        client = mock.Mock()
+        client.raw.return_value = {
+            'aggregations': {
+                'app': {
+                    'buckets': [self._app_bucket(255, 255),
+                                self._app_bucket(99, 2, app_id=other.id)]
+                }
+            }
+        }
+        _mock.return_value = client
+
+        eq_(_get_trending([self.app.id, other.id]),
+            {self.app.id: {'all': 2.0}})
+        eq_(client.raw.call_count, 1)
 
     @mock.patch('mkt.webapps.cron.get_monolith_client')
     def test_get_trending_error(self, _mock):
@@ -474,4 +526,4 @@ class TestUpdateTrending(mkt.site.tests.TestCase):
         client.raw.side_effect = ValueError
         _mock.return_value = client
 
-        eq_(_get_trending(self.app.id), {})
+        eq_(self._get_trending(), {})
@@ -1,4 +1,6 @@
 # -*- coding: utf-8 -*-
+from datetime import datetime
+
 from django.test.utils import override_settings
 
 import json
@@ -16,7 +18,8 @@ from mkt.tags.models import Tag
 from mkt.translations.utils import to_language
 from mkt.users.models import UserProfile
 from mkt.webapps.indexers import HomescreenIndexer, WebappIndexer
-from mkt.webapps.models import AddonDeviceType, ContentRating, Webapp
+from mkt.webapps.models import (AddonDeviceType, AppManifest, ContentRating,
+                                Webapp)
 
 
 class TestWebappIndexer(TestCase):
@@ -61,6 +64,13 @@ class TestWebappIndexer(TestCase):
                   'description', 'device', 'features', 'name', 'status'):
             ok_(k in keys, 'Key %s not found in mapping properties' % k)
 
+    def test_mapping_autocomplete(self):
+        mapping = WebappIndexer.get_mapping()
+        fields = mapping['webapp']['properties']['name']['fields']
+        eq_(sorted(fields.keys()), ['autocomplete', 'raw', 'shingle'])
+        eq_(fields['autocomplete']['analyzer'], 'autocomplete')
+        ok_('autocomplete' in WebappIndexer.get_analysis()['analyzer'])
+
     def _get_doc(self):
         qs = Webapp.objects.filter(id__in=[self.app.pk])
         obj = qs[0]
@@ -92,6 +102,39 @@ class TestWebappIndexer(TestCase):
         eq_(doc['latest_version']['has_editor_comment'], False)
         eq_(doc['latest_version']['has_info_request'], False)
 
+    def test_extract_documents(self):
+        app_factory(complete=True).popularity.create(region=0, value=10.0)
+        app_factory(premium_type=mkt.ADDON_PREMIUM)
+        EscalationQueue.objects.create(addon=self.app)
+        objs = list(Webapp.objects.order_by('id'))
+        eq_(len(objs), 3)
+        docs = WebappIndexer.extract_documents(objs)
+        eq_([doc['id'] for doc in docs], [obj.id for obj in objs])
+        for obj, doc in zip(objs, docs):
+            eq_(doc, WebappIndexer.extract_document(obj.pk))
+
+    @mock.patch.object(WebappIndexer, 'bulk_index')
+    def test_run_indexing_bad_manifest(self, bulk_index):
+        app = app_factory()
+        AppManifest.objects.create(version=app.current_version,
+                                   manifest='{"name": ')
+        WebappIndexer.run_indexing([self.app.pk, app.pk])
+        # Only the app with the bad manifest is skipped.
+        docs = list(bulk_index.call_args[0][0])
+        eq_([doc['id'] for doc in docs], [self.app.pk])
+
+    def test_get_modified_ids(self):
+        since = self.days_ago(1)
+        Webapp.objects.update(modified=self.days_ago(2))
+        eq_(WebappIndexer.get_modified_ids(since), [])
+
+        # Changes to related objects count.
+        RereviewQueue.objects.create(addon=self.app)
+        eq_(WebappIndexer.get_modified_ids(since), [self.app.pk])
+        RereviewQueue.objects.update(modified=self.days_ago(2))
+        self.app.current_version.update(modified=datetime.now())
+        eq_(WebappIndexer.get_modified_ids(since), [self.app.pk])
+
     def test_extract_category(self):
         self.app.update(categories=['books'])
         obj, doc = self._get_doc()
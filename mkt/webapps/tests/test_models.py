@@ -56,8 +56,10 @@ from mkt.webapps.indexers import WebappIndexer
 from mkt.webapps.models import (AddonDeviceType, AddonExcludedRegion,
                                 AddonUpsell, AppFeatures, AppManifest,
                                 BlockedSlug, ContentRating, Geodata,
-                                get_excluded_in, IARCCert, IARCInfo, Installed,
-                                Preview, RatingDescriptors, RatingInteractives,
+                                get_excluded_in,
+                                get_excluded_region_ids_in_bulk, IARCCert,
+                                IARCInfo, Installed, Preview,
+                                RatingDescriptors, RatingInteractives,
                                 version_changed, Webapp)
 from mkt.webapps.signals import version_changed as version_changed_signal
 
@@ -234,6 +236,41 @@ class TestWebapp(WebappTestCase):
         AddonExcludedRegion.objects.create(addon=app, region=region.id)
         self.assertSetEqual(get_excluded_in(region.id), [app.id])
 
+    def test_excluded_in_updated(self):
+        app, other = self.get_app(), app_factory()
+        region = mkt.regions.USA
+        AddonExcludedRegion.objects.create(addon=app, region=region.id)
+        self.assertSetEqual(get_excluded_in(region.id), [app.id])
+        with patch('mkt.webapps.models._build_excluded_in') as build:
+            aer = AddonExcludedRegion.objects.create(addon=other,
+                                                     region=region.id)
+            self.assertSetEqual(get_excluded_in(region.id),
+                                [app.id, other.id])
+            aer.delete()
+            self.assertSetEqual(get_excluded_in(region.id), [app.id])
+        ok_(not build.called)
+
+    def test_excluded_in_geodata_deleted(self):
+        app = app_factory()
+        app._geodata.update(region_br_iarc_exclude=True)
+        aer = AddonExcludedRegion.objects.create(addon=app,
+                                                 region=mkt.regions.BRA.id)
+        self.assertSetEqual(get_excluded_in(mkt.regions.BRA.id), [app.id])
+        aer.delete()
+        self.assertSetEqual(get_excluded_in(mkt.regions.BRA.id), [app.id])
+
+    @override_settings(EXCLUDED_IN_CACHE_TIMEOUT=60)
+    @patch.dict('mkt.webapps.models._excluded_in', clear=True)
+    def test_excluded_in_process_cache(self):
+        region = mkt.regions.USA
+        get_excluded_in(region.id)
+        with patch('mkt.webapps.models.cache') as cache_mock:
+            get_excluded_in(region.id)
+        ok_(not cache_mock.get.called)
+        app = self.get_app()
+        AddonExcludedRegion.objects.create(addon=app, region=region.id)
+        self.assertSetEqual(get_excluded_in(region.id), [app.id])
+
     def test_supported_locale_property(self):
         app = self.get_app()
         eq_(app.supported_locales,
@@ -1496,6 +1533,21 @@ class TestExclusions(TestCase):
         ok_(mkt.regions.BRA.id in excluded)
         ok_(mkt.regions.DEU.id in excluded)
 
+    def test_in_bulk(self):
+        self.make_tier()
+        self.app.addonexcludedregion.create(region=mkt.regions.RESTOFWORLD.id)
+        self.geodata.update(region_br_iarc_exclude=True)
+        free = app_factory()
+        free.addonexcludedregion.create(region=mkt.regions.POL.id)
+        premium_without_tier = app_factory(premium_type=mkt.ADDON_PREMIUM)
+        apps = [self.app, free, premium_without_tier]
+        with self.assertNumQueries(4):
+            excluded = get_excluded_region_ids_in_bulk(
+                [app.id for app in apps])
+        for app in apps:
+            eq_(excluded[app.id], app.get_excluded_region_ids())
+        eq_(excluded[free.id], [mkt.regions.POL.id])
+
 
 class TestPackagedAppManifestUpdates(mkt.site.tests.TestCase):
     # Note: More extensive tests for `.update_names` are above.
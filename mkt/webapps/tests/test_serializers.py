@@ -15,16 +15,23 @@ from mkt.constants import APP_FEATURES, ratingsbodies, regions
 from mkt.constants.features import FeatureProfile
 from mkt.constants.payments import PROVIDER_REFERENCE
 from mkt.constants.regions import RESTOFWORLD
+from mkt.fireplace.serializers import FireplaceESAppSerializer
 from mkt.prices.models import PriceCurrency
 from mkt.regions.middleware import RegionMiddleware
+from mkt.reviewers.serializers import ReviewersESAppSerializer
+from mkt.search.serializers import BaseESSerializer
 from mkt.site.fixtures import fixture
+from mkt.tvplace.serializers import TVESAppSerializer
 from mkt.users.models import UserProfile
 from mkt.versions.models import Version
 from mkt.webapps.indexers import WebappIndexer
 from mkt.webapps.models import AddonDeviceType, Installed, Preview, Webapp
 from mkt.webapps.serializers import (AppFeaturesSerializer, AppSerializer,
-                                     ESAppSerializer, SimpleAppSerializer,
-                                     SimpleESAppSerializer)
+                                     ESAppFeedCollectionSerializer,
+                                     ESAppFeedSerializer, ESAppSerializer,
+                                     SimpleAppSerializer,
+                                     SimpleESAppSerializer,
+                                     SuggestionsESAppSerializer)
 
 
 class TestAppFeaturesSerializer(BaseOAuth):
@@ -730,6 +737,18 @@ class TestESAppSerializer(mkt.site.tests.ESTestCase):
         res = self.serialize()
         eq_(res['author'], '')
 
+    @mock.patch.object(Webapp, 'attach_premiums')
+    def test_premiums_in_bulk(self, attach_premiums):
+        self.make_premium(self.app, price='0.99')
+        self.refresh('webapp')
+        hits = WebappIndexer.search().filter(
+            'term', id=self.app.pk).execute().hits
+        res = ESAppSerializer(hits, many=True,
+                              context={'request': self.request}).data
+        eq_(res[0]['price'], '0.99')
+        eq_(res[0]['payment_required'], True)
+        ok_(not attach_premiums.called)
+
     def test_feed_collection_group(self):
         app = WebappIndexer.search().filter(
             'term', id=self.app.pk).execute().hits[0]
@@ -751,6 +770,69 @@ class TestESAppSerializer(mkt.site.tests.ESTestCase):
         eq_(res['feature_compatibility'], None)
 
 
+class TestESAppSerializerESData(mkt.site.tests.ESTestCase):
+    fixtures = fixture('webapp_337141')
+
+    def setUp(self):
+        self.app = Webapp.objects.get(pk=337141)
+        self.app.description = {'en-US': u'Description', 'fr': u'Déscription'}
+        self.app.promo_img_hash = 'fakehash'
+        self.app.save()
+        Preview.objects.create(filetype='image/png', addon=self.app,
+                               position=0)
+        self.refresh('webapp')
+        self.data = WebappIndexer.search().filter(
+            'term', id=self.app.pk).execute().hits[0]
+        self.data['group_translations'] = [{'lang': 'en-US',
+                                            'string': 'My Group'}]
+
+    def get_request(self, api_version=1, **params):
+        request = RequestFactory().get('/', params)
+        request.API_VERSION = api_version
+        request.REGION = mkt.regions.USA
+        request.user = AnonymousUser()
+        return request
+
+    def test_same_data(self):
+        for request in (self.get_request(), self.get_request(lang='fr'),
+                        self.get_request(api_version=2)):
+            for serializer_class in (ESAppFeedCollectionSerializer,
+                                     ESAppFeedSerializer, ESAppSerializer,
+                                     FireplaceESAppSerializer,
+                                     SimpleESAppSerializer,
+                                     SuggestionsESAppSerializer,
+                                     TVESAppSerializer):
+                serializer = serializer_class(context={'request': request})
+                ok_(serializer.can_use_es_data(self.data))
+                eq_(serializer.es_data_representation(self.data),
+                    BaseESSerializer.to_representation(serializer, self.data))
+
+    def test_same_data_privileged_deleted(self):
+        self.data['app_type'] = mkt.ADDON_WEBAPP_PRIVILEGED
+        self.data['status'] = mkt.STATUS_DELETED
+        serializer = ESAppSerializer(context={'request': self.get_request()})
+        res = serializer.es_data_representation(self.data)
+        eq_(res['app_type'], 'packaged')
+        eq_(res, BaseESSerializer.to_representation(serializer, self.data))
+
+    @mock.patch.object(ESAppSerializer, 'fake_object')
+    def test_no_fake_object(self, fake_object):
+        serializer = ESAppSerializer(context={'request': self.get_request()})
+        eq_(serializer.to_representation(self.data)['id'], self.app.pk)
+        ok_(not fake_object.called)
+
+    def test_fake_object(self):
+        request = self.get_request()
+        ok_(not ReviewersESAppSerializer(context={'request': request})
+            .can_use_es_data(self.data))
+        serializer = ESAppSerializer(context={'request': request})
+        self.data['premium_type'] = mkt.ADDON_PREMIUM
+        ok_(not serializer.can_use_es_data(self.data))
+        self.data['premium_type'] = mkt.ADDON_FREE
+        request.user = UserProfile.objects.create(email='a@example.com')
+        ok_(not serializer.can_use_es_data(self.data))
+
+
 class TestSimpleESAppSerializer(mkt.site.tests.ESTestCase):
     fixtures = fixture('webapp_337141')
 
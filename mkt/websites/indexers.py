@@ -128,6 +128,10 @@ class WebsiteIndexer(BaseIndexer):
         cls.attach_language_specific_analyzers(
             mapping, cls.fields_with_language_analyzers)
 
+        # Add search-as-you-type sub-fields.
+        cls.attach_autocomplete_mappings(
+            mapping, ('name', 'short_name', 'title'))
+
         return mapping
 
     @classmethod
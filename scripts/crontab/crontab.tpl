@@ -12,6 +12,8 @@ HOME=/tmp
 # Once per hour.
 20 * * * * %(z_cron)s addon_last_updated
 50 * * * * %(z_cron)s cleanup_extracted_file
+40 * * * * %(z_cron)s build_feed_documents --settings=settings_local_mkt
+55 * * * * %(django)s reindex --incremental --settings=settings_local_mkt
 
 # Twice per day.
 25 17,5 * * * %(z_cron)s hide_disabled_files
@@ -16,6 +16,7 @@ import sys  # noqa
 
 import MySQLdb as mysql  # noqa
 import sqlalchemy.pool as pool  # noqa
+from django_statsd.clients import statsd  # noqa
 
 from django.utils import importlib  # noqa
 settings = importlib.import_module(settingmodule)
@@ -33,7 +34,19 @@ def getconn():
                          passwd=db['PASSWORD'], db=db['NAME'])
 
 
-mypool = pool.QueuePool(getconn, max_overflow=10, pool_size=5, recycle=300)
+mypool = pool.QueuePool(getconn,
+                        max_overflow=settings.SERVICES_DATABASE_MAX_OVERFLOW,
+                        pool_size=settings.SERVICES_DATABASE_POOL_SIZE,
+                        recycle=300)
+
+
+def connect():
+    """
+    Returns a connection from the pool, timing how long we had to wait for
+    it.
+    """
+    with statsd.timer('services.pool.connect'):
+        return mypool.connect()
 
 
 def log_configure():
@@ -1,5 +1,10 @@
 import calendar
+import copy
+import hashlib
 import json
+import os
+import threading
+from collections import OrderedDict
 from datetime import datetime
 import sys
 from time import gmtime, time
@@ -18,8 +23,8 @@ from lib.utils import static_url
 from services.utils import settings
 
 from utils import (CONTRIB_CHARGEBACK, CONTRIB_NO_CHARGE, CONTRIB_PURCHASE,
-                   CONTRIB_REFUND, log_configure, log_exception, log_info,
-                   mypool)
+                   CONTRIB_REFUND, connect, log_configure, log_exception,
+                   log_info)
 
 # Go configure the log.
 log_configure()
@@ -30,6 +35,7 @@ import receipts  # noqa
 status_codes = {
     200: '200 OK',
     204: '204 OK',
+    400: '400 Bad Request',
     405: '405 Method Not Allowed',
     500: '500 Internal Server Error',
 }
@@ -60,16 +66,17 @@ class Verify:
         # This is so the unit tests can override the connection.
         self.conn, self.cursor = None, None
 
+        # When verifying a batch, the purchases are looked up for all the
+        # receipts at once and stored here, see BatchVerify.
+        self.purchases = None
+
     def check_full(self):
         """
         This is the default that verify will use, this will
         do the entire stack of checks.
         """
-        receipt_domain = urlparse(static_url('WEBAPPS_RECEIPT_URL')).netloc
         try:
-            self.decoded = self.decode()
-            self.check_type('purchase-receipt')
-            self.check_url(receipt_domain)
+            self.check_receipt()
             self.check_purchase()
         except InvalidReceipt, err:
             return self.invalid(str(err))
@@ -78,6 +85,16 @@ class Verify:
 
         return self.ok_or_expired()
 
+    def check_receipt(self):
+        """
+        Decodes the receipt and does all the checks of check_full that
+        don't need the database.
+        """
+        receipt_domain = urlparse(static_url('WEBAPPS_RECEIPT_URL')).netloc
+        self.decoded = self.decode()
+        self.check_type('purchase-receipt')
+        self.check_url(receipt_domain)
+
     def check_without_purchase(self):
         """
         This is what the developer and reviewer receipts do, we aren't
@@ -223,7 +240,7 @@ class Verify:
         Django ORM.
         """
         if not self.cursor:
-            self.conn = mypool.connect()
+            self.conn = connect()
             self.cursor = self.conn.cursor()
 
     def check_purchase(self):
@@ -240,15 +257,7 @@ class Verify:
         """
         Verifies that the inapp has been purchased.
         """
-        self.setup_db()
-        sql = """SELECT i.guid, c.type FROM stats_contributions c
-                 JOIN inapp_products i ON i.id=c.inapp_product_id
-                 WHERE c.id = %(contribution_id)s LIMIT 1;"""
-        self.cursor.execute(
-            sql,
-            {'contribution_id': self.get_contribution_id()}
-        )
-        result = self.cursor.fetchone()
+        result = self.get_purchase_inapp()
         if not result:
             log_info('Invalid in-app receipt, no purchase')
             raise InvalidReceipt('NO_PURCHASE')
@@ -257,6 +266,22 @@ class Verify:
         self.check_purchase_type(purchase_type)
         self.check_inapp_product(contribution_inapp_id)
 
+    def get_purchase_inapp(self):
+        """
+        Returns the (inapp guid, contribution type) for the contribution in
+        the receipt, or None.
+        """
+        contribution_id = self.get_contribution_id()
+        if self.purchases is not None:
+            return self.purchases['inapp'].get(contribution_id)
+
+        self.setup_db()
+        sql = """SELECT i.guid, c.type FROM stats_contributions c
+                 JOIN inapp_products i ON i.id=c.inapp_product_id
+                 WHERE c.id = %(contribution_id)s LIMIT 1;"""
+        self.cursor.execute(sql, {'contribution_id': contribution_id})
+        return self.cursor.fetchone()
+
     def check_inapp_product(self, contribution_inapp_id):
         if contribution_inapp_id != self.get_inapp_id():
             log_info('Invalid receipt, inapp_id does not match')
@@ -266,19 +291,29 @@ class Verify:
         """
         Verifies that the app has been purchased by the user.
         """
-        self.setup_db()
-        sql = """SELECT type FROM addon_purchase
-                 WHERE addon_id = %(app_id)s
-                 AND uuid = %(uuid)s LIMIT 1;"""
-        self.cursor.execute(sql, {'app_id': self.get_app_id(),
-                                  'uuid': self.get_user()})
-        result = self.cursor.fetchone()
+        result = self.get_purchase_app()
         if not result:
             log_info('Invalid app receipt, no purchase')
             raise InvalidReceipt('NO_PURCHASE')
 
         self.check_purchase_type(result[0])
 
+    def get_purchase_app(self):
+        """
+        Returns the (purchase type,) for the app and user in the receipt,
+        or None.
+        """
+        app_id, uuid = self.get_app_id(), self.get_user()
+        if self.purchases is not None:
+            return self.purchases['app'].get((app_id, uuid))
+
+        self.setup_db()
+        sql = """SELECT type FROM addon_purchase
+                 WHERE addon_id = %(app_id)s
+                 AND uuid = %(uuid)s LIMIT 1;"""
+        self.cursor.execute(sql, {'app_id': app_id, 'uuid': uuid})
+        return self.cursor.fetchone()
+
     def check_purchase_type(self, purchase_type):
         """
         Verifies that the purchase type is of a valid type.
@@ -356,6 +391,99 @@ class Verify:
         return {'status': 'expired'}
 
 
+class BatchVerify:
+    """
+    Verifies a list of receipts in one go. All the receipts are decoded and
+    checked first, then the purchases of all the remaining receipts are
+    looked up with one query for apps and one for inapps.
+    """
+
+    def __init__(self, receipt_list, environ):
+        self.verifiers = [Verify(receipt, environ)
+                          for receipt in receipt_list]
+
+        # This is so the unit tests can override the connection.
+        self.conn, self.cursor = None, None
+
+    def setup_db(self):
+        if not self.cursor:
+            self.conn = connect()
+            self.cursor = self.conn.cursor()
+
+    def check_full(self):
+        """
+        Returns a list of results, in the same order as the receipts, each
+        being what Verify.check_full would have returned for that receipt.
+        """
+        results = [None] * len(self.verifiers)
+        apps, contributions = set(), set()
+        for k, verifier in enumerate(self.verifiers):
+            try:
+                verifier.check_receipt()
+                if 'contrib' in verifier.get_storedata():
+                    contributions.add(verifier.get_contribution_id())
+                else:
+                    apps.add((verifier.get_app_id(), verifier.get_user()))
+            except InvalidReceipt, err:
+                results[k] = verifier.invalid(str(err))
+
+        purchases = {'app': self.get_purchases_app(apps),
+                     'inapp': self.get_purchases_inapp(contributions)}
+
+        for k, verifier in enumerate(self.verifiers):
+            if results[k] is not None:
+                continue
+            verifier.purchases = purchases
+            try:
+                verifier.check_purchase()
+            except InvalidReceipt, err:
+                results[k] = verifier.invalid(str(err))
+            except RefundedReceipt:
+                results[k] = verifier.refund()
+            else:
+                results[k] = verifier.ok_or_expired()
+
+        return results
+
+    def get_purchases_app(self, apps):
+        """
+        Returns a dict of (app id, uuid): (purchase type,) for the purchases
+        matching the (app id, uuid) pairs in apps.
+        """
+        if not apps:
+            return {}
+
+        self.setup_db()
+        app_ids, uuids = zip(*apps)
+        sql = """SELECT addon_id, uuid, type FROM addon_purchase
+                 WHERE addon_id IN %(app_ids)s
+                 AND uuid IN %(uuids)s;"""
+        self.cursor.execute(sql, {'app_ids': tuple(set(app_ids)),
+                                  'uuids': tuple(set(uuids))})
+        purchases = {}
+        for app_id, uuid, purchase_type in self.cursor.fetchall():
+            if (app_id, uuid) in apps:
+                purchases.setdefault((app_id, uuid), (purchase_type,))
+        return purchases
+
+    def get_purchases_inapp(self, contributions):
+        """
+        Returns a dict of contribution id: (inapp guid, contribution type)
+        for the contribution ids in contributions.
+        """
+        if not contributions:
+            return {}
+
+        self.setup_db()
+        sql = """SELECT c.id, i.guid, c.type FROM stats_contributions c
+                 JOIN inapp_products i ON i.id=c.inapp_product_id
+                 WHERE c.id IN %(contribution_ids)s;"""
+        self.cursor.execute(sql, {'contribution_ids': tuple(contributions)})
+        return dict((contribution_id, (guid, purchase_type))
+                    for contribution_id, guid, purchase_type
+                    in self.cursor.fetchall())
+
+
 def get_headers(length):
     return [('Access-Control-Allow-Origin', '*'),
             ('Access-Control-Allow-Methods', 'POST'),
@@ -366,17 +494,174 @@ def get_headers(length):
             ('Last-Modified', format_date_time(time()))]
 
 
+class ReceiptCache(object):
+    """
+    A bounded, in-process LRU cache of the result of cracking receipts. Only
+    the signature checks are cached, the purchase checks are still done on
+    every request.
+
+    Entries are keyed by a digest of the receipt and store a tuple of
+    (signature is valid, decoded receipt). Entries expire when the receipt
+    expires, or after `timeout` seconds, whichever comes first. Receipts that
+    failed the signature check are only kept for
+    `SERVICES_RECEIPT_CACHE_INVALID_TIMEOUT` seconds.
+    """
+
+    def __init__(self, size, timeout):
+        self.size = size
+        self.timeout = timeout
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def key(self, receipt):
+        return hashlib.sha256(receipt).hexdigest()
+
+    def get(self, receipt):
+        key = self.key(receipt)
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry is None:
+                return None
+            expires, verdict = entry
+            if expires <= time():
+                return None
+            # Put it back at the end, as the most recently used.
+            self.entries[key] = entry
+        return verdict
+
+    def set(self, receipt, verdict, expires=None):
+        now = time()
+        if expires is None:
+            expires = now + self.timeout
+        expires = min(expires, now + self.timeout)
+        if expires <= now or not self.size:
+            return
+        key = self.key(receipt)
+        with self.lock:
+            self.entries.pop(key, None)
+            self.entries[key] = (expires, verdict)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+receipt_cache = ReceiptCache(settings.SERVICES_RECEIPT_CACHE_SIZE,
+                             settings.SERVICES_RECEIPT_CACHE_TIMEOUT)
+
+
+class KeyRegistry(object):
+    """
+    Holds what is needed to crack receipts, so that it's only loaded once per
+    process rather than on every request:
+
+    * the receipt verifier used with the signing server, which also keeps
+      the certificates it fetched from the issuers.
+    * the RSA key used without the signing server, which is reloaded if the
+      key file changes.
+
+    Call `reload` to throw all of that away, for example on SIGHUP.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reload()
+
+    def reload(self):
+        with self.lock:
+            self._verifier, self._issuers = None, None
+            self._key, self._key_file = None, None
+        receipt_cache.clear()
+
+    def verifier(self):
+        issuers = list(settings.SIGNING_VALID_ISSUERS)
+        with self.lock:
+            if self._verifier is None or self._issuers != issuers:
+                self._verifier = certs.ReceiptVerifier(valid_issuers=issuers)
+                self._issuers = issuers
+            return self._verifier
+
+    def key(self):
+        path = settings.WEBAPPS_RECEIPT_KEY
+        key_file = (path, os.stat(path).st_mtime)
+        with self.lock:
+            if self._key is not None and self._key_file == key_file:
+                return self._key
+        key = jwt.rsa_load(path)
+        with self.lock:
+            changed = (self._key_file is not None and
+                       self._key_file != key_file)
+            self._key, self._key_file = key, key_file
+        if changed:
+            log_info('Receipt key changed, reloaded {path}'.format(path=path))
+            receipt_cache.clear()
+        return key
+
+
+key_registry = KeyRegistry()
+
+# A thread pool to run the signature checks in, so they don't block the
+# event loop. Only set by the gevent entry point, see
+# wsgi/receiptverify_gevent.py.
+threadpool = None
+
+
+def offload(func, *args, **kwargs):
+    """
+    Calls func, in the thread pool if there is one. Use this for the CPU
+    bound signature checks. func runs in a real thread, any I/O it does (the
+    receipt verifier fetching the certificates of a new issuer) goes through
+    the gevent hub of that thread and doesn't block the event loop either.
+    """
+    if threadpool is None:
+        return func(*args, **kwargs)
+    return threadpool.apply(func, args, kwargs)
+
+
 def decode_receipt(receipt):
+    """
+    Cracks the receipt, using the receipt cache to avoid checking the
+    signature of the same receipt over and over again.
+    """
+    verdict = receipt_cache.get(receipt)
+    if verdict is not None:
+        statsd.incr('services.decode.cache.hit')
+        valid, raw = verdict
+        if not valid:
+            raise VerificationError()
+        # The receipt gets altered when it has expired, don't let that
+        # leak into the cache.
+        return copy.deepcopy(raw)
+
+    statsd.incr('services.decode.cache.miss')
+    try:
+        raw = crack_receipt(receipt)
+    except VerificationError:
+        timeout = settings.SERVICES_RECEIPT_CACHE_INVALID_TIMEOUT
+        receipt_cache.set(receipt, (False, None), time() + timeout)
+        raise
+
+    try:
+        expires = int(raw.get('exp', 0))
+    except (AttributeError, TypeError, ValueError):
+        # Leave it to the verifier to deal with that.
+        return raw
+    receipt_cache.set(receipt, (True, copy.deepcopy(raw)), expires)
+    return raw
+
+
+def crack_receipt(receipt):
     """
     Cracks the receipt using the private key. This will probably change
     to using the cert at some point, especially when we get the HSM.
     """
     with statsd.timer('services.decode'):
         if settings.SIGNING_SERVER_ACTIVE:
-            verifier = certs.ReceiptVerifier(
-                valid_issuers=settings.SIGNING_VALID_ISSUERS)
+            verifier = key_registry.verifier()
             try:
-                result = verifier.verify(receipt)
+                result = offload(verifier.verify, receipt)
             except ExpiredSignatureError:
                 # Until we can do something meaningful with this, just ignore.
                 return jwt.decode(receipt.split('~')[1], verify=False)
@@ -384,9 +669,9 @@ def decode_receipt(receipt):
                 raise VerificationError()
             return jwt.decode(receipt.split('~')[1], verify=False)
         else:
-            key = jwt.rsa_load(settings.WEBAPPS_RECEIPT_KEY)
-            raw = jwt.decode(receipt, key,
-                             algorithms=settings.SUPPORTED_JWT_ALGORITHMS)
+            key = key_registry.key()
+            raw = offload(jwt.decode, receipt, key,
+                          algorithms=settings.SUPPORTED_JWT_ALGORITHMS)
     return raw
 
 
@@ -399,7 +684,7 @@ def status_check(environ):
         return 500, 'SIGNING_SERVER_ACTIVE is not set'
 
     try:
-        conn = mypool.connect()
+        conn = connect()
         cursor = conn.cursor()
         cursor.execute('SELECT id FROM users_install ORDER BY id DESC LIMIT 1')
     except Exception, err:
@@ -412,6 +697,8 @@ def receipt_check(environ):
     output = ''
     with statsd.timer('services.verify'):
         data = environ['wsgi.input'].read()
+        if data.lstrip().startswith('['):
+            return batch_receipt_check(data, environ)
         try:
             verify = Verify(data, environ)
             return 200, json.dumps(verify.check_full())
@@ -421,6 +708,39 @@ def receipt_check(environ):
     return output
 
 
+def batch_receipt_check(data, environ):
+    """
+    Verifies a JSON list of receipts and returns a JSON list of results.
+    """
+    try:
+        receipt_list = json.loads(data)
+    except ValueError:
+        log_info('Batch of receipts is not valid JSON')
+        return 400, ''
+
+    if (not isinstance(receipt_list, list) or
+            len(receipt_list) > settings.SERVICES_VERIFY_BATCH_LIMIT or
+            not all(isinstance(receipt, basestring)
+                    for receipt in receipt_list)):
+        log_info('Invalid batch of receipts')
+        return 400, ''
+
+    try:
+        receipt_list = [receipt.encode('ascii') for receipt in receipt_list]
+    except UnicodeError:
+        log_info('Invalid receipt in batch of receipts')
+        return 400, ''
+
+    with statsd.timer('services.verify.batch'):
+        statsd.incr('services.verify.batch.receipts', len(receipt_list))
+        try:
+            verify = BatchVerify(receipt_list, environ)
+            return 200, json.dumps(verify.check_full())
+        except:
+            log_exception('<batch>')
+            return 500, ''
+
+
 def application(environ, start_response):
     body = ''
     path = environ.get('PATH_INFO', '')
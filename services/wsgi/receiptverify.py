@@ -1,4 +1,5 @@
 import os
+import signal
 import site
 
 wsgidir = os.path.dirname(__file__)
@@ -6,4 +7,14 @@ for path in ['../', '../..']:
     site.addsitedir(os.path.abspath(os.path.join(wsgidir, path)))
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mkt.settings')
-from verify import application  # noqa
+from verify import application, key_registry  # noqa
+
+
+def post_worker_init(worker):
+    """
+    Gunicorn hook, this file is used as its config. Reload the receipt keys
+    and certificates when a worker gets SIGHUP. This can't be done when the
+    file is loaded: that happens in the arbiter, which uses SIGHUP itself,
+    and the workers reset the handler when they start.
+    """
+    signal.signal(signal.SIGHUP, lambda signum, frame: key_registry.reload())
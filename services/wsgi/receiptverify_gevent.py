@@ -0,0 +1,39 @@
+"""
+Runs the receipt verifier under gevent, so that a single process can serve a
+lot of concurrent requests. Use it with the gevent worker of gunicorn::
+
+    gunicorn -k gevent -c wsgi/receiptverify_gevent.py verify:application
+
+The responses are the same as the ones of wsgi/receiptverify.py.
+"""
+from gevent import monkey
+monkey.patch_all()
+
+# MySQLdb blocks the event loop, PyMySQL is pure python and so uses the
+# patched sockets. This has to be done before services.utils is imported.
+import pymysql  # noqa
+pymysql.install_as_MySQLdb()
+
+import os  # noqa
+import signal  # noqa
+import site  # noqa
+
+from gevent.threadpool import ThreadPool  # noqa
+
+wsgidir = os.path.dirname(__file__)
+for path in ['../', '../..']:
+    site.addsitedir(os.path.abspath(os.path.join(wsgidir, path)))
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mkt.settings')
+import verify  # noqa
+from verify import application, key_registry  # noqa
+
+
+def post_worker_init(worker):
+    """
+    Check the signatures in real threads of the worker, they are CPU bound.
+    Reload the receipt keys and certificates when a worker gets SIGHUP, see
+    wsgi/receiptverify.py.
+    """
+    verify.threadpool = ThreadPool(verify.settings.SERVICES_DECODE_THREADS)
+    signal.signal(signal.SIGHUP, lambda signum, frame: key_registry.reload())
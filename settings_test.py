@@ -54,15 +54,27 @@ CELERY_ALWAYS_EAGER = True
 DEBUG = False
 DEBUG_PROPAGATE_EXCEPTIONS = False
 EMAIL_BACKEND = 'django.core.mail.backends.locmem.EmailBackend'
+# Tests expect region exclusions to change right away.
+EXCLUDED_IN_CACHE_TIMEOUT = 0
+ES_BULK_THREADS = 1
 ES_DEFAULT_NUM_REPLICAS = 0
 # See the following URL on why we set num_shards to 1 for tests:
 # http://www.elasticsearch.org/guide/en/elasticsearch/guide/current/relevance-is-broken.html
 ES_DEFAULT_NUM_SHARDS = 1
+# Most feed tests change things that don't invalidate the feed cache between
+# requests, the tests of the cache turn it back on.
+FEED_CACHE_TIMEOUT = 0
+# Same for the feed documents, they would be rebuilt on every feed change.
+FEED_DOCUMENTS = False
 IARC_MOCK = True
 IARC_V2_STORE_ID = 'dummy-store-id'
 IARC_V2_STORE_PASSWORD = 'dummy-store-password'
+# Tests expect things to be indexed right away.
+INDEXING_DEBOUNCE = 0
 IN_TEST_SUITE = True
 INSTALLED_APPS += ('mkt.translations.tests.testapp',)
+# Tests expect monolith records to be saved right away.
+MONOLITH_BUFFER_SIZE = 0
 PASSWORD_HASHERS = (
     'django.contrib.auth.hashers.MD5PasswordHasher',
 )
@@ -70,6 +82,8 @@ PAYMENT_PROVIDERS = ['bango', 'reference']
 # This is a precaution in case something isn't mocked right.
 PRE_GENERATE_APK_URL = 'http://you-should-never-load-this.com/'
 RUN_ES_TESTS = True
+# Like the feed cache, the tests of the search results cache turn it back on.
+SEARCH_CACHE_TIMEOUT = 0
 SEND_REAL_EMAIL = True
 SITE_URL = 'http://testserver'
 STATIC_URL = SITE_URL + '/'